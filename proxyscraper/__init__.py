@@ -0,0 +1,40 @@
+"""Headless proxy harvesting and checking engine
+
+Names are imported on first use, so importing a light submodule (the
+filters or the store, say) does not pull in aiohttp and the engine.
+"""
+import importlib
+
+_EXPORTS = {
+    "DEFAULT_SOURCES": "config",
+    "EngineCallbacks": "engine",
+    "EngineConfig": "config",
+    "ProxyEngine": "engine",
+    "ProxyExtractor": "extract",
+    "ProxyFilter": "filters",
+    "ProxyRecord": "records",
+    "ProxyStore": "store",
+    "ResultIndex": "filters",
+    "export_proxies": "export",
+    "export_store": "export",
+    "extract_proxies": "extract",
+    "format_address": "records",
+    "pack_address": "records",
+    "parse_address": "records",
+    "unpack_address": "records",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
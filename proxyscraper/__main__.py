@@ -0,0 +1,235 @@
+"""Command line entry point: python -m proxyscraper"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from .config import BACKOFF_MODES, DEFAULT_JUDGES, GATEWAY_ROTATIONS, PROXY_TYPES, EngineConfig
+from .daemon import ProxyDaemon
+from .engine import EngineCallbacks, ProxyEngine
+from .export import check_export_path, export_proxies
+from .filters import ProxyFilter
+from .sharding import use_uvloop
+
+logger = logging.getLogger("proxyscraper")
+
+
+def build_parser():
+    defaults = EngineConfig()
+    parser = argparse.ArgumentParser(prog="python -m proxyscraper",
+                                     description="Harvest and validate proxies without the GUI")
+    parser.add_argument("-t", "--type", default=defaults.proxy_type, choices=PROXY_TYPES,
+                        help="protocol to check; auto and all detect it per proxy (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout,
+                        help="request timeout of a check in seconds (default: %(default)s)")
+    parser.add_argument("--connect-timeout", type=float, default=defaults.connect_timeout,
+                        help="TCP connect timeout in seconds (default: %(default)s)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="probe each address with a TCP connect before the HTTP check")
+    parser.add_argument("--prefilter-concurrency", type=int, default=defaults.prefilter_concurrency,
+                        help="concurrent connect probes (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=defaults.max_threads,
+                        help="maximum concurrent checks (default: %(default)s)")
+    parser.add_argument("--min-threads", type=int, default=defaults.min_threads,
+                        help="concurrent checks to start from and never go below (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=defaults.processes,
+                        help="worker processes to shard checks across, 0 for one per CPU core "
+                             "(default: %(default)s)")
+    parser.add_argument("--fixed-threads", dest="adaptive", action="store_false",
+                        help="always run --threads checks instead of adapting to the network")
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size,
+                        help="sources fetched per batch (default: %(default)s)")
+    parser.add_argument("--rate-limit", type=int, default=defaults.rate_limit,
+                        help="source requests per second (default: %(default)s)")
+    parser.add_argument("--no-pipeline", dest="pipeline", action="store_false",
+                        help="finish the whole harvest before checking starts")
+    parser.add_argument("--allow-private", action="store_true",
+                        help="keep private, loopback and reserved addresses (for local testing)")
+    parser.add_argument("--judge", action="append", dest="judges", metavar="URL",
+                        help="header-echo URL requested through the proxies; repeat for a pool. "
+                             "Run `python -m proxyscraper.judge` for a local one "
+                             f"(default: {' '.join(defaults.judge_urls)})")
+    parser.add_argument("--egress-ip", default=defaults.egress_ip,
+                        help="our address as the judge sees it (default: ask the judge once per run)")
+    parser.add_argument("--geoip", default=defaults.geoip_db,
+                        help="compiled GeoIP database, or '' to disable (default: %(default)s)")
+    parser.add_argument("--geoip-csv", default=defaults.geoip_csv,
+                        help="IP range CSV to build --geoip from (default: bundled sample)")
+    parser.add_argument("--db", default=defaults.db_path,
+                        help="SQLite database path, or '' to disable (default: %(default)s)")
+    parser.add_argument("--no-recheck-known", dest="recheck_known", action="store_false",
+                        help="do not re-check the database's last valid proxies first")
+    parser.add_argument("--cache", default=defaults.cache_file,
+                        help="source cache file, or '' to disable (default: %(default)s)")
+    parser.add_argument("--cache-ttl", type=int, default=defaults.cache_ttl,
+                        help="seconds a cached source list stays usable (default: %(default)s)")
+    parser.add_argument("--backoff", default=defaults.backoff_mode, choices=BACKOFF_MODES,
+                        help="what to do with addresses that failed recently: skip them, "
+                             "check them last, or ignore the history (default: %(default)s)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run until interrupted: re-harvest sources and re-check the pool "
+                             "on their own schedules")
+    parser.add_argument("--source-interval", type=float, default=defaults.source_interval,
+                        help="daemon: shortest re-harvest interval of a source in seconds "
+                             "(default: %(default)s)")
+    parser.add_argument("--recheck-interval", type=float, default=defaults.recheck_interval,
+                        help="daemon: seconds before a fast, reliable proxy is re-checked "
+                             "(default: %(default)s)")
+    parser.add_argument("--recheck-max", type=float, default=defaults.recheck_max,
+                        help="daemon: longest wait before any proxy is re-checked (default: %(default)s)")
+    parser.add_argument("--evict-failures", type=int, default=defaults.evict_failures,
+                        help="daemon: failed checks in a row that remove a proxy (default: %(default)s)")
+    parser.add_argument("--api-port", type=int, default=defaults.api_port,
+                        help="daemon: serve the pool query API on this port, 0 to disable "
+                             "(default: %(default)s)")
+    parser.add_argument("--api-host", default=defaults.api_host,
+                        help="address for --api-port (default: %(default)s)")
+    parser.add_argument("--api-socket", default=defaults.api_socket,
+                        help="daemon: also serve the pool query API on this Unix socket")
+    parser.add_argument("--gateway-port", type=int, default=defaults.gateway_port,
+                        help="daemon: run a rotating HTTP proxy over the pool on this port, "
+                             "0 to disable (default: %(default)s)")
+    parser.add_argument("--gateway-host", default=defaults.gateway_host,
+                        help="address for --gateway-port (default: %(default)s)")
+    parser.add_argument("--gateway-rotation", default=defaults.gateway_rotation,
+                        choices=GATEWAY_ROTATIONS,
+                        help="gateway: new upstream for every request, or per session "
+                             "(default: %(default)s)")
+    parser.add_argument("--gateway-retries", type=int, default=defaults.gateway_retries,
+                        help="gateway: other upstreams to try when one fails (default: %(default)s)")
+    parser.add_argument("--metrics-port", type=int, default=defaults.metrics_port,
+                        help="serve Prometheus metrics at http://HOST:PORT/metrics, 0 to disable "
+                             "(default: %(default)s)")
+    parser.add_argument("--metrics-host", default=defaults.metrics_host,
+                        help="address for --metrics-port (default: %(default)s)")
+    parser.add_argument("--metrics-file", default=defaults.metrics_file,
+                        help="rewrite a JSON metrics snapshot to this file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=defaults.metrics_interval,
+                        help="seconds between --metrics-file snapshots (default: %(default)s)")
+    parser.add_argument("--sources", metavar="FILE",
+                        help="file with one source URL per line (default: built-in list)")
+    parser.add_argument("--country", default="",
+                        help="only output these countries, comma separated (e.g. US,DE)")
+    parser.add_argument("--anonymity", default="all",
+                        help="only output these anonymity levels, comma separated")
+    parser.add_argument("--speed", default="all",
+                        help="only output these speed categories, comma separated")
+    parser.add_argument("--min-latency", type=int, help="minimum response time in ms")
+    parser.add_argument("--max-latency", type=int, help="maximum response time in ms")
+    parser.add_argument("-o", "--output", metavar="FILE",
+                        help="export valid proxies (.txt, .json, .ndjson, .csv or packed .bin, "
+                             "optionally .gz or .zst compressed)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only log warnings")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log debug output")
+    return parser
+
+
+def config_from_args(args):
+    config = EngineConfig(
+        proxy_type=args.type,
+        timeout=args.timeout,
+        connect_timeout=args.connect_timeout,
+        prefilter=args.prefilter,
+        prefilter_concurrency=args.prefilter_concurrency,
+        adaptive=args.adaptive,
+        min_threads=args.min_threads,
+        max_threads=args.threads,
+        processes=args.processes or os.cpu_count() or 1,
+        batch_size=args.batch_size,
+        rate_limit=args.rate_limit,
+        judge_urls=args.judges or list(DEFAULT_JUDGES),
+        egress_ip=args.egress_ip,
+        geoip_db=args.geoip,
+        geoip_csv=args.geoip_csv,
+        pipeline=args.pipeline,
+        allow_private=args.allow_private,
+        db_path=args.db,
+        recheck_known=args.recheck_known,
+        source_interval=args.source_interval,
+        recheck_interval=args.recheck_interval,
+        recheck_max=args.recheck_max,
+        evict_failures=args.evict_failures,
+        api_host=args.api_host,
+        api_port=args.api_port,
+        api_socket=args.api_socket,
+        gateway_host=args.gateway_host,
+        gateway_port=args.gateway_port,
+        gateway_rotation=args.gateway_rotation,
+        gateway_retries=args.gateway_retries,
+        cache_file=args.cache,
+        cache_ttl=args.cache_ttl,
+        backoff_mode=args.backoff,
+        metrics_host=args.metrics_host,
+        metrics_port=args.metrics_port,
+        metrics_file=args.metrics_file,
+        metrics_interval=args.metrics_interval,
+    )
+    if args.sources:
+        with open(args.sources) as f:
+            config.sources = [line.strip() for line in f
+                              if line.strip() and not line.startswith('#')]
+    return config.validate()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        config = config_from_args(args)
+        output_filter = ProxyFilter.parse(args.country, args.anonymity, args.speed,
+                                          args.min_latency, args.max_latency)
+        if args.output:
+            check_export_path(args.output)
+    except (OSError, ValueError) as e:
+        logger.error("Configuration error: %s", e)
+        return 2
+
+    callbacks = EngineCallbacks(
+        on_harvest_progress=lambda done, total, harvested: logger.info(
+            "Harvest %d/%d sources, %d proxies", done, total, harvested),
+        on_check_progress=lambda done, total: (
+            logger.info("Checked %d/%d", done, total) if done % 500 == 0 or done == total else None),
+    )
+    if (config.api_port or config.api_socket) and not args.daemon:
+        logger.warning("The pool API is only served in --daemon mode; "
+                       "use `python -m proxyscraper.pool` to serve the database")
+    if config.gateway_port and not args.daemon:
+        logger.warning("The proxy gateway only runs in --daemon mode; "
+                       "use `python -m proxyscraper.gateway` to rotate through the database")
+    store = config.create_store() if config.db_path else None
+    if args.daemon:
+        # Progress lines make no sense without an end; the daemon logs a status line instead
+        engine = ProxyDaemon(config, EngineCallbacks(), store)
+    else:
+        engine = ProxyEngine(config, callbacks, store)
+    if use_uvloop():
+        logger.debug("Using uvloop")
+    try:
+        valid = asyncio.run(engine.run())
+    except KeyboardInterrupt:
+        engine.stop()
+        valid = engine.valid_proxies() if args.daemon else engine.checked_proxies
+    finally:
+        if store is not None:
+            store.close()
+
+    valid = (proxy for proxy in valid if output_filter.matches(proxy))
+
+    if args.output:
+        try:
+            count = export_proxies(valid, args.output)
+        except OSError as e:
+            logger.error("Export to %s failed: %s", args.output, e)
+            return 1
+        logger.info("Exported %d proxies to %s", count, args.output)
+    else:
+        for proxy in valid:
+            print(f"{proxy['ip']}:{proxy['port']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
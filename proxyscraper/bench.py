@@ -0,0 +1,432 @@
+"""Offline benchmarks: python -m proxyscraper.bench [-o results.json]
+
+Everything runs against local stand-ins, so results only depend on the
+machine and the code:
+
+- list-source HTTP servers serving large synthetic proxy lists,
+- a farm of fake HTTP (with CONNECT), SOCKS4 and SOCKS5 proxies, each
+  port with its own latency, and a share of ports that fail or blackhole
+  connections. Working proxies answer the check request themselves in
+  the judge's echo format, so the farm measures the checker rather than
+  a relay,
+- the local judge (judge.py) for judge probes.
+
+Measured: parse rate, harvest throughput, checks per second per protocol,
+database write rate, filter latency and the UI update channel rate. The
+results are written as JSON for comparing versions.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+from .config import EngineConfig
+from .engine import ProxyEngine
+from .extract import CHUNK_SIZE, ProxyExtractor
+from .filters import ProxyFilter, ResultIndex
+from .judge import start_judge
+from .records import ProxyRecord, address_array, pack_address
+from .store import ProxyStore
+from .updates import UpdateChannel
+
+logger = logging.getLogger(__name__)
+
+BENCH_VERSION = 1
+FARM_KINDS = ("http", "socks4", "socks5")
+COUNTRIES = ("US", "DE", "FR", "GB", "NL", "BR", "JP", "CN", "RU", "IN")
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def synthetic_list(count, seed):
+    """A proxy list mixing the formats sources use, with public addresses only"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        ip = f"45.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+        port = rng.choice((80, 3128, 8080, 1080, rng.randrange(1024, 65536)))
+        style = i % 10
+        if style < 7:
+            lines.append(f"{ip}:{port}")
+        elif style < 9:
+            lines.append(f"{ip},{port},HTTP,{rng.choice(COUNTRIES)}")
+        else:
+            lines.append(f'{{"ip": "{ip}", "port": {port}}},')
+    return ("\n".join(lines) + "\n").encode('ascii')
+
+
+# Stand-ins
+class FakeProxy:
+    """One farm port: speaks kind, then behaves as behavior ("ok", "fail" or "blackhole")
+
+    With keep_alive, a connection (or tunnel) answers requests until the
+    client asks to close it.
+    """
+
+    def __init__(self, kind, behavior, latency, keep_alive=False):
+        self.kind = kind
+        self.behavior = behavior
+        self.latency = latency
+        self.keep_alive = keep_alive
+        self.origin = f"198.51.100.{random.randrange(1, 255)}"
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            if self.behavior == "blackhole":
+                await reader.read()  # hold the connection until the client gives up
+                return
+            if self.behavior == "fail":
+                return
+            if self.kind == "socks5":
+                await self._socks5(reader, writer)
+                head = await reader.readuntil(b'\r\n\r\n')
+            elif self.kind == "socks4":
+                await self._socks4(reader, writer)
+                head = await reader.readuntil(b'\r\n\r\n')
+            else:
+                head = await reader.readuntil(b'\r\n\r\n')
+                if head.startswith(b'CONNECT '):
+                    writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+                    head = await reader.readuntil(b'\r\n\r\n')
+                elif not head.startswith(b'GET '):
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+                    return
+            while await self._answer(writer, head):
+                head = await reader.readuntil(b'\r\n\r\n')
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.transport.abort()
+
+    async def _socks5(self, reader, writer):
+        version, methods = await reader.readexactly(2)
+        await reader.readexactly(methods)
+        if version != 5:
+            raise asyncio.IncompleteReadError(b'', None)
+        writer.write(b'\x05\x00')
+        _, _, _, address_type = await reader.readexactly(4)
+        if address_type == 1:
+            await reader.readexactly(4)
+        elif address_type == 3:
+            await reader.readexactly((await reader.readexactly(1))[0])
+        else:
+            await reader.readexactly(16)
+        await reader.readexactly(2)
+        writer.write(b'\x05\x00\x00\x01' + bytes(6))
+
+    async def _socks4(self, reader, writer):
+        version = (await reader.readexactly(1))[0]
+        if version != 4:
+            writer.write(b'\x00\x5b' + bytes(6))
+            raise asyncio.IncompleteReadError(b'', None)
+        request = await reader.readexactly(7)
+        await reader.readuntil(b'\x00')
+        if request[3:6] == b'\x00\x00\x00':
+            await reader.readuntil(b'\x00')  # SOCKS4a host name
+        writer.write(b'\x00\x5a' + bytes(6))
+
+    async def _answer(self, writer, head):
+        """Answer one request; returns whether the connection stays open"""
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        headers = {}
+        for line in head.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            if name:
+                headers[name.strip()] = value.strip()
+        keep_alive = self.keep_alive and b'connection: close' not in head.lower()
+        body = json.dumps({'origin': self.origin, 'headers': headers}).encode('ascii')
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                     b'Content-Length: ' + str(len(body)).encode('ascii') +
+                     (b'\r\nConnection: keep-alive' if keep_alive else b'\r\nConnection: close') +
+                     b'\r\n\r\n' + body)
+        await writer.drain()
+        return keep_alive
+
+
+async def start_farm(ports_per_kind, latency_ms=50, fail_rate=0.1, blackhole_rate=0.05, seed=1,
+                     keep_alive=False):
+    """Start the proxy farm; returns (servers, {kind: [(address, behavior, FakeProxy)]})"""
+    rng = random.Random(seed)
+    servers = []
+    farm = {}
+    for kind in FARM_KINDS:
+        farm[kind] = []
+        for _ in range(ports_per_kind):
+            roll = rng.random()
+            behavior = ("blackhole" if roll < blackhole_rate
+                        else "fail" if roll < blackhole_rate + fail_rate else "ok")
+            latency = rng.lognormvariate(0, 0.5) * latency_ms / 1000
+            proxy = FakeProxy(kind, behavior, latency, keep_alive)
+            server = await asyncio.start_server(proxy.handle, "127.0.0.1", 0, backlog=1024)
+            servers.append(server)
+            port = server.sockets[0].getsockname()[1]
+            farm[kind].append((pack_address("127.0.0.1", port), behavior, proxy))
+    return servers, farm
+
+
+async def start_sources(count, lines, seed=1):
+    """Serve count synthetic lists of lines entries; returns (runner, URLs)"""
+    bodies = [synthetic_list(lines, seed + i) for i in range(count)]
+    app = web.Application()
+
+    async def source(request):
+        return web.Response(body=bodies[int(request.match_info['index'])],
+                            content_type='text/plain')
+
+    app.router.add_get('/source/{index}.txt', source)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, [f"http://127.0.0.1:{port}/source/{i}.txt" for i in range(count)]
+
+
+# Benchmarks
+def bench_parse(megabytes):
+    data = synthetic_list(int(megabytes * 1024 * 1024 / 22), seed=7)
+    extractor = ProxyExtractor()
+    found = 0
+    started = time.perf_counter()
+    for offset in range(0, len(data), CHUNK_SIZE):
+        found += len(extractor.feed(data[offset:offset + CHUNK_SIZE]))
+    found += len(extractor.close())
+    elapsed = time.perf_counter() - started
+    return {'bytes': len(data), 'addresses': found, 'seconds': round(elapsed, 4),
+            'mb_per_second': round(len(data) / elapsed / 1e6, 2),
+            'addresses_per_second': round(found / elapsed)}
+
+
+async def bench_harvest(workdir, sources, lines):
+    runner, urls = await start_sources(sources, lines)
+    try:
+        config = base_config(workdir, sources=urls, batch_size=len(urls), rate_limit=1000)
+        engine = ProxyEngine(config)
+        engine.is_running = True
+        started = time.perf_counter()
+        harvested = await engine.harvest()
+        elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+    return {'sources': sources, 'lines_per_source': lines, 'unique': len(harvested),
+            'seconds': round(elapsed, 3),
+            'addresses_per_second': round(sources * lines / elapsed)}
+
+
+async def bench_check(workdir, farm, proxy_type, checks, judge_url, timeout, max_threads):
+    if proxy_type == "auto":
+        pool = [entry for kind in FARM_KINDS for entry in farm[kind]]
+    else:
+        pool = farm["http" if proxy_type == "https" else proxy_type]
+    addresses = address_array(pool[i % len(pool)][0] for i in range(checks))
+    expected = sum(1 for i in range(checks) if pool[i % len(pool)][1] == "ok")
+
+    config = base_config(workdir, proxy_type=proxy_type, judge_urls=[judge_url],
+                         egress_ip="203.0.113.1", timeout=timeout, connect_timeout=timeout / 2,
+                         max_threads=max_threads)
+    engine = ProxyEngine(config)
+    engine.is_running = True
+    started = time.perf_counter()
+    valid = await engine.check(addresses)
+    elapsed = time.perf_counter() - started
+    latencies = [record.response_time for record in valid]
+    return {'checks': checks, 'valid': len(valid), 'expected_valid': expected,
+            'seconds': round(elapsed, 3), 'checks_per_second': round(checks / elapsed, 1),
+            'latency_p50_ms': _percentile(latencies, 0.5),
+            'latency_p99_ms': _percentile(latencies, 0.99),
+            'final_concurrency': engine.limiter.limit if engine.limiter else None}
+
+
+def _synthetic_records(count, seed=3):
+    rng = random.Random(seed)
+    now = time.time()
+    return [ProxyRecord(pack_address(f"45.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+                                     rng.randrange(1024, 65536)),
+                        latency, "fast" if latency < 500 else "medium" if latency < 2000 else "slow",
+                        rng.choice(COUNTRIES), rng.choice(("elite", "anonymous", "transparent")),
+                        rng.choice(("HTTP", "SOCKS4", "SOCKS5")), now)
+            for latency in (int(rng.lognormvariate(6, 1)) for _ in range(count))]
+
+
+def bench_db(workdir, rows):
+    records = _synthetic_records(rows)
+    store = ProxyStore(os.path.join(workdir, "bench.sqlite"))
+    try:
+        started = time.perf_counter()
+        for record in records:
+            store.store_proxy(record)
+        store.flush()
+        stored = time.perf_counter() - started
+        started = time.perf_counter()
+        for record in records:
+            store.record_failure(record.addr)
+        store.flush()
+        failed = time.perf_counter() - started
+    finally:
+        store.close()
+    return {'rows': rows, 'upserts_per_second': round(rows / stored),
+            'failures_per_second': round(rows / failed)}
+
+
+def bench_filter(rows, repeats=20):
+    index = ResultIndex()
+    for record in _synthetic_records(rows):
+        index.add(record)
+    filters = {
+        'country': ProxyFilter.parse("US", "all", "all"),
+        'country_anonymity': ProxyFilter.parse("US, DE", "elite", "all"),
+        'speed_latency': ProxyFilter.parse("", "all", "fast, medium", 100, 800),
+        'everything': ProxyFilter(),
+    }
+    results = {'rows': rows}
+    for name, proxy_filter in filters.items():
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            matched = len(index.query(proxy_filter))
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {'matched': matched, 'median_ms': round(statistics.median(timings), 3)}
+    return results
+
+
+def bench_updates(rows, tick=0.05):
+    """Rows/s through the UpdateChannel with a consumer draining on the UI tick"""
+    channel = UpdateChannel()
+    records = _synthetic_records(min(rows, 10000))
+    delivered = 0
+    drain_times = []
+    done = threading.Event()
+
+    def consume():
+        nonlocal delivered
+        while True:
+            finished = done.wait(tick)
+            started = time.perf_counter()
+            batch = channel.drain()
+            drain_times.append((time.perf_counter() - started) * 1000)
+            delivered += len(batch.rows)
+            if finished:
+                return
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    started = time.perf_counter()
+    for i in range(rows):
+        channel.post_row(records[i % len(records)])
+        channel.post_progress("checking", i, rows)
+    done.set()
+    consumer.join()
+    elapsed = time.perf_counter() - started
+    return {'rows': rows, 'delivered': delivered, 'rows_per_second': round(rows / elapsed),
+            'drain_max_ms': round(max(drain_times), 3)}
+
+
+def base_config(workdir, **overrides):
+    settings = dict(cache_file="", db_path="", geoip_db=os.path.join(workdir, "geoip.bin"))
+    settings.update(overrides)
+    return EngineConfig(**settings).validate()
+
+
+async def run_benchmarks(args, workdir):
+    results = {}
+    selected = set(args.only.split(',')) if args.only else None
+
+    def wanted(name):
+        return selected is None or name in selected
+
+    if wanted('parse'):
+        results['parse'] = bench_parse(args.parse_mb)
+    if wanted('harvest'):
+        results['harvest'] = await bench_harvest(workdir, args.sources, args.lines)
+    if wanted('check'):
+        judge_runner, judge_url = await start_judge()
+        servers, farm = await start_farm(args.farm, args.latency, args.fail_rate, args.blackhole_rate)
+        try:
+            results['check'] = {}
+            for proxy_type in ("http", "https", "socks4", "socks5", "auto"):
+                results['check'][proxy_type] = await bench_check(
+                    workdir, farm, proxy_type, args.checks, judge_url, args.timeout, args.threads)
+        finally:
+            for server in servers:
+                server.close()
+            await judge_runner.cleanup()
+    if wanted('db'):
+        results['db'] = await asyncio.to_thread(bench_db, workdir, args.rows)
+    if wanted('filter'):
+        results['filter'] = bench_filter(args.rows)
+    if wanted('updates'):
+        results['updates'] = await asyncio.to_thread(bench_updates, args.rows)
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m proxyscraper.bench",
+                                     description="Benchmark the engine against local stand-ins")
+    parser.add_argument("-o", "--output", default="bench_results.json",
+                        help="JSON results file (default: %(default)s)")
+    parser.add_argument("--only", help="comma separated subset of: parse,harvest,check,db,filter,updates")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--parse-mb", type=float, default=20, help="megabytes parsed (default: %(default)s)")
+    parser.add_argument("--sources", type=int, default=20, help="list sources served (default: %(default)s)")
+    parser.add_argument("--lines", type=int, default=50000, help="entries per source (default: %(default)s)")
+    parser.add_argument("--farm", type=int, default=100, help="fake proxies per protocol (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=50, help="median proxy latency in ms (default: %(default)s)")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="share of failing proxies (default: %(default)s)")
+    parser.add_argument("--blackhole-rate", type=float, default=0.05,
+                        help="share of proxies that never answer (default: %(default)s)")
+    parser.add_argument("--checks", type=int, default=5000, help="checks per protocol (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=500, help="max concurrent checks (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=2, help="check timeout in seconds (default: %(default)s)")
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="rows for the db, filter and update benchmarks (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.quick:
+        args.parse_mb, args.sources, args.lines = 2, 5, 5000
+        args.farm, args.checks, args.rows = 20, 500, 10000
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    with tempfile.TemporaryDirectory(prefix="proxyscraper-bench-") as workdir:
+        started = time.time()
+        results = asyncio.run(run_benchmarks(args, workdir))
+    report = {
+        'bench_version': BENCH_VERSION,
+        'started_at': started,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pointer_bits': struct.calcsize('P') * 8,
+        'settings': {name: value for name, value in vars(args).items() if name != 'output'},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
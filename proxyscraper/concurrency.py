@@ -0,0 +1,189 @@
+"""Adaptive (AIMD) limit on the number of in-flight checks
+
+The limit starts at the floor and doubles every interval while it is the
+bottleneck (slow start), then grows additively. It is cut
+multiplicatively when the run shows signs of local congestion: file
+descriptors running out, event-loop lag, a connect error rate above its
+healthy baseline, or latencies drifting above their healthy baseline.
+Dead proxies fail at a steady rate, so only a rise over the baseline
+counts as congestion.
+"""
+import asyncio
+import errno
+import logging
+import statistics
+from collections import deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Descriptors kept free for the database, source fetches, logging and the UI
+FD_RESERVE = 64
+
+
+def descriptor_limit(wanted=None):
+    """Usable RLIMIT_NOFILE, raised towards wanted when the hard limit allows; None if unknown"""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if wanted is not None and soft != resource.RLIM_INFINITY and soft < wanted:
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError) as e:
+            logger.debug("Could not raise the descriptor limit to %d: %s", target, e)
+    return None if soft == resource.RLIM_INFINITY else soft
+
+
+class AdaptiveLimiter:
+    """Counting semaphore whose limit follows observed check outcomes
+
+    Checks report their outcome with record_success / record_failure; run()
+    re-evaluates the limit every interval seconds. A limiter created with
+    adaptive=False is a plain semaphore fixed at the ceiling.
+    """
+
+    def __init__(self, floor, ceiling, adaptive=True, interval=0.5, increase=5,
+                 decrease=0.7, lag_threshold=0.1, error_margin=0.15, drift_ratio=1.5,
+                 min_samples=20):
+        self.ceiling = max(1, ceiling)
+        self.floor = max(1, min(floor, self.ceiling))
+        self.adaptive = adaptive
+        self.limit = self.floor if adaptive else self.ceiling
+        self.interval = interval
+        self.increase = increase
+        self.decrease = decrease
+        self.lag_threshold = lag_threshold
+        self.error_margin = error_margin
+        self.drift_ratio = drift_ratio
+        self.min_samples = min_samples
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.decreases = 0
+        self._waiters = deque()
+        self._slow_start = True
+        self._baseline_errors = None
+        self._baseline_latency = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._attempts = 0
+        self._connect_errors = 0
+        self._latencies = []
+        self._exhausted = False
+        self._peak = self.in_flight
+
+    # Semaphore
+    async def acquire(self):
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()  # pass the slot we were given on
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+        self._peak = max(self._peak, self.in_flight)
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def _wake(self):
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    # Feedback
+    def record_success(self, latency_ms):
+        self._attempts += 1
+        self._latencies.append(latency_ms)
+
+    def record_failure(self, error=None):
+        self._attempts += 1
+        if isinstance(error, OSError):
+            if error.errno in (errno.EMFILE, errno.ENFILE):
+                self._exhausted = True
+            else:
+                self._connect_errors += 1
+
+    async def run(self, on_change=None):
+        """Adjust the limit every interval; awaits on_change(limit) when it moves"""
+        if not self.adaptive:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.loop_lag = max(0.0, loop.time() - started - self.interval)
+            previous = self.limit
+            self.adjust()
+            if self.limit != previous and on_change is not None:
+                await on_change(self.limit)
+
+    def adjust(self):
+        """Apply one AIMD step from the outcomes seen since the last call"""
+        reason = self._congestion()
+        if reason:
+            if self._exhausted:
+                # Never climb back to where descriptors ran out
+                self.ceiling = max(self.floor, int(self._peak * 0.9))
+            self.limit = max(self.floor, min(self.ceiling, int(self.limit * self.decrease)))
+            self._slow_start = False
+            self.decreases += 1
+            logger.debug("Concurrency cut to %d: %s", self.limit, reason)
+        else:
+            self._update_baselines()
+            if self._peak >= self.limit:
+                grown = self.limit * 2 if self._slow_start else self.limit + self.increase
+                self.limit = min(self.ceiling, grown)
+        self._reset_window()
+        self._wake()
+
+    def _congestion(self):
+        if self._exhausted:
+            return "file descriptors exhausted"
+        if self.loop_lag > self.lag_threshold:
+            return f"event loop lag {self.loop_lag * 1000:.0f}ms"
+        if self._attempts < self.min_samples:
+            return None
+        error_rate = self._connect_errors / self._attempts
+        if self._baseline_errors is not None and error_rate > self._baseline_errors + self.error_margin:
+            return f"connect errors at {error_rate:.0%} (baseline {self._baseline_errors:.0%})"
+        if len(self._latencies) >= self.min_samples // 4 and self._baseline_latency:
+            latency = statistics.median(self._latencies)
+            if latency > self._baseline_latency * self.drift_ratio:
+                return f"median latency {latency:.0f}ms (baseline {self._baseline_latency:.0f}ms)"
+        return None
+
+    def _update_baselines(self):
+        # Only healthy windows feed the baselines, so congestion never becomes the norm
+        if self._attempts >= self.min_samples:
+            error_rate = self._connect_errors / self._attempts
+            self._baseline_errors = _blend(self._baseline_errors, error_rate)
+        if len(self._latencies) >= self.min_samples // 4:
+            self._baseline_latency = _blend(self._baseline_latency, statistics.median(self._latencies))
+
+
+def _blend(baseline, value, weight=0.2):
+    return value if baseline is None else baseline * (1 - weight) + value * weight
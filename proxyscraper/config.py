@@ -0,0 +1,136 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from .geoip import SAMPLE_CSV
+from .store import ProxyStore
+
+DEFAULT_SOURCES = [
+    "https://raw.githubusercontent.com/oxylabs/free-proxy-list/master/list.txt",
+    "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt",
+    "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/https.txt",
+    "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks4.txt",
+    "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks5.txt",
+    "https://raw.githubusercontent.com/clarketm/proxy-list/master/proxy-list-raw.txt",
+    "https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/http.txt",
+    "https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks4.txt",
+    "https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks5.txt",
+    "https://raw.githubusercontent.com/proxifly/free-proxy-list/main/proxies/all/data.txt",
+    "https://raw.githubusercontent.com/ShiftyTR/Proxy-List/master/proxy.txt",
+    "https://raw.githubusercontent.com/vakhov/fresh-proxy-list/master/http.txt",
+    "https://raw.githubusercontent.com/vakhov/fresh-proxy-list/master/https.txt",
+    "https://raw.githubusercontent.com/vakhov/fresh-proxy-list/master/socks5.txt",
+    "https://api.proxyscrape.com/v2/?request=getproxies&protocol=http&timeout=10000&country=all",
+    "https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks4&timeout=10000&country=all",
+    "https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks5&timeout=10000&country=all",
+    "https://www.proxy-list.download/api/v1/get?type=http",
+    "https://www.proxy-list.download/api/v1/get?type=https",
+    "https://www.proxy-list.download/api/v1/get?type=socks4",
+    "https://www.proxy-list.download/api/v1/get?type=socks5",
+]
+
+DEFAULT_JUDGES = (
+    "http://httpbin.org/get",
+    "http://httpbingo.org/get",
+)
+
+PROXY_TYPES = ("http", "https", "socks4", "socks5", "auto", "all")
+# Types that detect each proxy's protocol instead of assuming one
+AUTO_TYPES = ("auto", "all")
+BACKOFF_MODES = ("skip", "defer", "off")
+GATEWAY_ROTATIONS = ("request", "session")
+
+
+@dataclass
+class EngineConfig:
+    """Settings for a harvest/check run"""
+    proxy_type: str = "http"
+    timeout: float = 5
+    connect_timeout: float = 3
+    # With adaptive set, concurrency moves between min_threads and max_threads
+    # (and never beyond the open-file limit)
+    adaptive: bool = True
+    min_threads: int = 10
+    max_threads: int = 500
+    # Above 1, checks are sharded across this many worker processes
+    processes: int = 1
+    batch_size: int = 10
+    rate_limit: int = 5
+    source_timeout: int = 10
+    pipeline: bool = True
+    queue_size: int = 5000
+    prefilter: bool = False
+    prefilter_concurrency: int = 500
+    allow_private: bool = False
+    cache_file: str = "proxy_cache.json"
+    cache_ttl: int = 3600
+    cache_max_addresses: int = 2_000_000
+    backoff_mode: str = "skip"
+    backoff_base: int = 600
+    backoff_max: int = 86400
+    # Judges must echo the request's origin and headers (see judge.py)
+    judge_urls: List[str] = field(default_factory=lambda: list(DEFAULT_JUDGES))
+    judge_probe_interval: float = 60
+    # Address the judge sees without a proxy; detected once per run when empty
+    egress_ip: str = ""
+    # Compiled GeoIP ranges; rebuilt from geoip_csv when missing or older
+    geoip_db: str = "geoip.bin"
+    geoip_csv: str = SAMPLE_CSV
+    db_path: str = "proxy_db.sqlite"
+    # Re-check the proxies that passed their last check before newly harvested ones
+    recheck_known: bool = True
+    # Continuous mode (daemon.py): shortest re-harvest interval of a source, how soon a
+    # fast and reliable proxy is re-checked and the longest any proxy waits, and how many
+    # failed checks in a row remove a proxy from the pool
+    source_interval: float = 600
+    recheck_interval: float = 300
+    recheck_max: float = 21600
+    evict_failures: int = 3
+    # Daemon pool query API (pool.py) on a TCP port and/or a Unix socket; 0 and "" disable them
+    api_host: str = "127.0.0.1"
+    api_port: int = 0
+    api_socket: str = ""
+    # Daemon rotating proxy gateway (gateway.py), 0 disables it: a new upstream for every
+    # request or per session, and how many other upstreams to try when one fails
+    gateway_host: str = "127.0.0.1"
+    gateway_port: int = 0
+    gateway_rotation: str = "request"
+    gateway_retries: int = 2
+    # Prometheus/JSON metrics endpoint (0 disables it) and periodic JSON snapshot file
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    metrics_file: str = ""
+    metrics_interval: float = 10
+    sources: List[str] = field(default_factory=lambda: list(DEFAULT_SOURCES))
+
+    def __post_init__(self):
+        self.proxy_type = self.proxy_type.lower()
+
+    def create_store(self):
+        """ProxyStore for db_path using this config's backoff settings"""
+        return ProxyStore(self.db_path, backoff_base=self.backoff_base,
+                          backoff_max=self.backoff_max)
+
+    def validate(self):
+        """Raise ValueError if any setting is out of range"""
+        if self.proxy_type not in PROXY_TYPES:
+            raise ValueError(f"Unknown proxy type: {self.proxy_type}")
+        if self.backoff_mode not in BACKOFF_MODES:
+            raise ValueError(f"Unknown backoff mode: {self.backoff_mode}")
+        if self.gateway_rotation not in GATEWAY_ROTATIONS:
+            raise ValueError(f"Unknown gateway rotation: {self.gateway_rotation}")
+        if self.gateway_retries < 0:
+            raise ValueError("Gateway retries must not be negative")
+        numbers = (self.timeout, self.connect_timeout, self.min_threads, self.max_threads,
+                   self.processes, self.batch_size, self.rate_limit, self.source_timeout,
+                   self.queue_size, self.prefilter_concurrency, self.cache_ttl,
+                   self.cache_max_addresses, self.backoff_base, self.backoff_max,
+                   self.judge_probe_interval, self.metrics_interval, self.source_interval,
+                   self.recheck_interval, self.recheck_max, self.evict_failures)
+        if any(value <= 0 for value in numbers):
+            raise ValueError("All values must be positive")
+        for port in (self.metrics_port, self.api_port, self.gateway_port):
+            if not 0 <= port <= 65535:
+                raise ValueError(f"Invalid port: {port}")
+        if not self.judge_urls:
+            raise ValueError("At least one judge URL is required")
+        return self
@@ -0,0 +1,334 @@
+"""Continuous mode: keep a pool of valid proxies fresh indefinitely
+
+ProxyDaemon runs one long-lived ProxyEngine.check_stream and feeds it
+from two schedules:
+
+- Sources. Every source is re-fetched on its own interval, and only the
+  addresses that were not in its previous list are checked, so an
+  unchanged source costs one (usually conditional) request. The interval
+  halves after a fetch that brought new addresses and doubles after one
+  that did not, between source_interval and SOURCE_BACKOFF times that.
+- The pool. Every valid proxy is re-checked when it falls due: its last
+  check plus recheck_interval, stretched by its latency, by a low success
+  rate and by failures in a row, capped at recheck_max. A proxy that
+  fails evict_failures checks in a row leaves the pool and the database.
+
+Addresses still backing off after failed checks (store.py) are skipped or
+checked last as config.backoff_mode says, like in a one-shot run; the
+backed-off set is reloaded every BACKOFF_REFRESH seconds.
+
+Both schedules are heaps, so the work done depends on what falls due
+(the churn), not on the size of the pool.
+
+The pool can be served by the query API (pool.py) and used through the
+rotating proxy gateway (gateway.py); failures reported by either are
+re-checked right away.
+"""
+import asyncio
+import heapq
+import inspect
+import logging
+import time
+from dataclasses import replace
+
+import aiohttp
+
+from .engine import EngineCallbacks, ProxyEngine, source_matches_type
+from .gateway import ProxyGateway
+from .pool import WeightedPool, serve_pool
+from .records import address_array
+from .source_cache import SourceCache
+from .store import SUCCESS_DECAY
+
+logger = logging.getLogger(__name__)
+
+# A quiet source is fetched at most this many times less often than source_interval
+SOURCE_BACKOFF = 16
+STATUS_INTERVAL = 60
+BACKOFF_REFRESH = 300
+
+
+class PoolEntry:
+    """A proxy in the pool and its check history"""
+    __slots__ = ('record', 'success', 'failures', 'due')
+
+    def __init__(self, record, success=1.0):
+        self.record = record
+        self.success = success
+        self.failures = 0
+        self.due = 0.0
+
+
+class SourceState:
+    __slots__ = ('interval', 'addresses')
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.addresses = address_array()
+
+
+def recheck_delay(entry, interval, ceiling):
+    """Seconds until entry's next check: soon for fast, reliable proxies, rarely for flaky ones"""
+    delay = interval * (1 + entry.record.response_time / 1000) / max(entry.success, 0.1)
+    return min(ceiling, delay * (1 << min(entry.failures, 16)))
+
+
+class ProxyDaemon:
+    """Harvests and re-checks forever, keeping pool (packed address -> PoolEntry) current
+
+    Functions in listeners are called with ("added" | "updated" | "evicted",
+    entry) on the event loop whenever the pool changes. With config.api_port
+    or config.api_socket the pool is also served by the query API, and with
+    config.gateway_port requests can be sent through it by the gateway.
+    """
+
+    def __init__(self, config=None, callbacks=None, store=None):
+        callbacks = callbacks or EngineCallbacks()
+        self._user_on_checked = callbacks.on_checked
+        self.engine = ProxyEngine(config, replace(callbacks, on_checked=self._on_checked), store)
+        self.config = self.engine.config
+        self.store = store
+        self.pool = {}
+        self.listeners = []
+        self.added = 0
+        self.updated = 0
+        self.evicted = 0
+        self._due = []          # (due, addr) heap; stale pairs are skipped when popped
+        self._sources = []      # (due, url) heap
+        self._source_state = {}
+        self._pending = set()   # addresses queued or being checked
+        self._wakeup = None
+        self._backoff_loaded_at = 0.0
+        self.weighted_pool = None
+        self.gateway = None
+
+    def stop(self):
+        """Stop the daemon; safe to call from any thread"""
+        self.engine.stop()
+
+    async def run(self):
+        """Run until stop() or cancellation; returns the valid proxies in the pool"""
+        engine = self.engine
+        config = self.config
+        engine.is_running = True
+        engine._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        exporters = await engine._start_metrics()
+        queue = asyncio.Queue(maxsize=config.queue_size)
+        cache = None
+        api = None
+        tasks = []
+        try:
+            if config.api_port or config.api_socket or config.gateway_port:
+                self.weighted_pool = WeightedPool()
+                self.weighted_pool.on_report = self._on_report
+                self.listeners.append(self.weighted_pool.on_daemon_event)
+            if config.api_port or config.api_socket:
+                api = await serve_pool(self.weighted_pool, config.api_host, config.api_port,
+                                       config.api_socket)
+            if config.gateway_port:
+                self.gateway = ProxyGateway(self.weighted_pool, rotation=config.gateway_rotation,
+                                            retries=config.gateway_retries,
+                                            connect_timeout=config.connect_timeout)
+                await self.gateway.start(config.gateway_host, config.gateway_port)
+            await self._load_pool()
+            await self._refresh_backoff()
+            if config.cache_file:
+                cache = SourceCache(config.cache_file, config.cache_ttl, config.cache_max_addresses)
+                await asyncio.to_thread(cache.load)
+            now = time.time()
+            for url in config.sources:
+                if source_matches_type(url, config.proxy_type):
+                    self._source_state[url] = SourceState(config.source_interval)
+                    heapq.heappush(self._sources, (now, url))
+
+            tasks = [engine._track(self._schedule_checks(queue)),
+                     engine._track(self._report())]
+            if self._sources:
+                tasks.append(engine._track(self._harvest_sources(queue, cache)))
+            await engine.check_stream(queue, collect=False)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if cache is not None:
+                try:
+                    await asyncio.to_thread(cache.save)
+                except OSError as e:
+                    logger.warning("Could not save source cache %s: %s", cache.path, e)
+            if api is not None:
+                await api.cleanup()
+            if self.gateway is not None:
+                await self.gateway.close()
+            engine.is_running = False
+            engine._loop = None
+            await engine._stop_metrics(*exporters)
+        return self.valid_proxies()
+
+    def valid_proxies(self):
+        return [entry.record for entry in self.pool.values()]
+
+    # Pool
+    async def _load_pool(self):
+        if self.store is None or not self.config.recheck_known:
+            return
+
+        def load():
+            return [record for batch in self.store.known_good() for record in batch]
+
+        for record in await asyncio.to_thread(load):
+            entry = self.pool[record.addr] = PoolEntry(record)
+            self._schedule(entry, record.checked_at)
+            self._notify("added", entry)
+        logger.info("Loaded %d proxies that were valid last time", len(self.pool))
+
+    def _schedule(self, entry, checked_at):
+        config = self.config
+        entry.due = checked_at + recheck_delay(entry, config.recheck_interval, config.recheck_max)
+        earliest = self._due[0][0] if self._due else None
+        heapq.heappush(self._due, (entry.due, entry.record.addr))
+        if earliest is None or entry.due < earliest:
+            self._wakeup.set()
+
+    async def _on_checked(self, addr, result):
+        self._pending.discard(addr)
+        entry = self.pool.get(addr)
+        if result is not None:
+            if entry is None:
+                entry = self.pool[addr] = PoolEntry(result)
+                self.added += 1
+                event = "added"
+            else:
+                entry.record = result
+                entry.success = entry.success * SUCCESS_DECAY + (1 - SUCCESS_DECAY)
+                entry.failures = 0
+                self.updated += 1
+                event = "updated"
+            self._schedule(entry, result.checked_at)
+            self._notify(event, entry)
+        elif entry is not None:
+            entry.failures += 1
+            entry.success *= SUCCESS_DECAY
+            if entry.failures >= self.config.evict_failures:
+                del self.pool[addr]
+                if self.store is not None:
+                    self.store.remove_proxy(addr)
+                self.evicted += 1
+                self._notify("evicted", entry)
+            else:
+                self._schedule(entry, time.time())
+                self._notify("updated", entry)
+
+        if self._user_on_checked is not None:
+            outcome = self._user_on_checked(addr, result)
+            if inspect.isawaitable(outcome):
+                await outcome
+
+    def recheck_soon(self, addr):
+        """Move a pooled proxy's next check forward to now"""
+        entry = self.pool.get(addr)
+        if entry is None or addr in self._pending:
+            return
+        entry.due = time.time()
+        heapq.heappush(self._due, (entry.due, addr))
+        self._wakeup.set()
+
+    def _on_report(self, addr, ok):
+        if not ok:
+            self.recheck_soon(addr)
+
+    def _notify(self, event, entry):
+        for listener in self.listeners:
+            try:
+                listener(event, entry)
+            except Exception:
+                logger.exception("Pool listener failed")
+
+    async def _schedule_checks(self, queue):
+        """Queue every pool entry as it falls due"""
+        while True:
+            while self._due and self._due[0][0] <= time.time():
+                due, addr = heapq.heappop(self._due)
+                entry = self.pool.get(addr)
+                if entry is None or entry.due != due or addr in self._pending:
+                    continue  # evicted or rescheduled since
+                self._pending.add(addr)
+                await queue.put(addr)
+            self._wakeup.clear()
+            timeout = self._due[0][0] - time.time() if self._due else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # Sources
+    async def _harvest_sources(self, queue, cache):
+        config = self.config
+        semaphore = asyncio.Semaphore(config.rate_limit)
+        connector = aiohttp.TCPConnector(limit=config.max_threads, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            while True:
+                delay = self._sources[0][0] - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                if time.time() - self._backoff_loaded_at >= BACKOFF_REFRESH:
+                    await self._refresh_backoff()
+                due = []
+                while self._sources and self._sources[0][0] <= time.time():
+                    due.append(heapq.heappop(self._sources)[1])
+                await asyncio.gather(*(self._refresh_source(session, semaphore, cache, url, queue)
+                                       for url in due))
+                if cache is not None:
+                    try:
+                        await asyncio.to_thread(cache.save)
+                    except OSError as e:
+                        logger.warning("Could not save source cache %s: %s", cache.path, e)
+
+    async def _refresh_backoff(self):
+        await self.engine._load_backoff()
+        self._backoff_loaded_at = time.time()
+
+    async def _refresh_source(self, session, semaphore, cache, url, queue):
+        """Fetch url and queue the addresses it did not list last time"""
+        state = self._source_state[url]
+        parsed = address_array()
+
+        async def collect(addresses):
+            parsed.extend(addresses)
+
+        await self.engine.fetch_with_semaphore(semaphore, session, url, collect, cache)
+        queued = 0
+        # An empty answer is most likely an outage; keep comparing against the last list
+        if parsed:
+            previous = set(state.addresses)
+            current = sorted(set(parsed))
+            new = [addr for addr in current
+                   if addr not in previous and addr not in self.pool and addr not in self._pending]
+            fresh, deferred = self.engine._partition(new)
+            skipped = set(new).difference(fresh, deferred)
+            # Skipped addresses count as unseen, so they are looked at again once their backoff ends
+            state.addresses = address_array(addr for addr in current if addr not in skipped)
+            for addr in fresh + deferred:
+                self._pending.add(addr)
+                await queue.put(addr)
+                queued += 1
+        self.engine.scraped_count += queued
+
+        base = self.config.source_interval
+        if queued:
+            state.interval = max(base, state.interval / 2)
+        else:
+            state.interval = min(base * SOURCE_BACKOFF, state.interval * 2)
+        heapq.heappush(self._sources, (time.time() + state.interval, url))
+        logger.debug("Source %s: %d new addresses, next fetch in %.0fs", url, queued, state.interval)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            logger.info("Pool: %d valid (%d added, %d re-checked, %d evicted), %d checks queued",
+                        len(self.pool), self.added, self.updated, self.evicted, len(self._pending))
+            if self.gateway is not None:
+                stats = self.gateway.stats()
+                logger.info("Gateway: %d requests, %d tunnels, %d retries, %d unserved",
+                            stats['requests'], stats['tunnels'], stats['retries'], stats['unserved'])
@@ -0,0 +1,757 @@
+import asyncio
+import inspect
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .concurrency import FD_RESERVE, AdaptiveLimiter, descriptor_limit
+from .config import AUTO_TYPES, EngineConfig
+from .extract import CHUNK_SIZE, ProxyExtractor
+from .geoip import UNKNOWN_COUNTRY, GeoDatabase
+from .judges import JUDGE_ERROR_STATUSES, JudgePool
+from .metrics import Metrics, failure_stage, serve_metrics, write_snapshots
+from .protocols import ProxyProtocolError, detect_protocol, fetch_through_tunnel
+from .records import AddressSet, ProxyRecord, address_array, unpack_address
+from .sharding import RESULT, SHARD_BATCH, STATUS_DONE, decode_result, shard_config, spawn_shard
+from .source_cache import SourceCache
+from .store import ProxyStore
+
+logger = logging.getLogger(__name__)
+
+STORE_FLUSH_TIMEOUT = 10  # seconds to wait for the last results to be committed
+
+@dataclass
+class EngineCallbacks:
+    """Optional hooks called by the engine; each may be a function or a coroutine function
+
+    on_harvest_progress(completed_sources, total_sources, harvested)
+    on_check_started(total)
+    on_check_progress(completed, total)
+    on_proxy(proxy_data)
+    on_checked(addr, proxy_data or None)   every check result, failures included
+    on_concurrency(limit, ceiling)
+    on_finished(valid_proxies)
+    """
+    on_harvest_progress: Optional[Callable] = None
+    on_check_started: Optional[Callable] = None
+    on_check_progress: Optional[Callable] = None
+    on_proxy: Optional[Callable] = None
+    on_checked: Optional[Callable] = None
+    on_concurrency: Optional[Callable] = None
+    on_finished: Optional[Callable] = None
+
+
+def categorize_proxy_by_speed(response_time):
+    """Categorize by speed"""
+    if response_time < 500:
+        return "fast"
+    elif response_time < 2000:
+        return "medium"
+    else:
+        return "slow"
+
+
+# Request headers that give away that a proxy forwarded the request
+REVEALING_HEADERS = frozenset((
+    'via', 'forwarded', 'forwarded-for', 'x-forwarded', 'x-forwarded-for', 'x-forwarded-host',
+    'x-real-ip', 'client-ip', 'x-client-ip', 'x-originating-ip', 'x-proxy-id',
+    'proxy-connection', 'proxy-agent', 'x-bluecoat-via', 'cache-control-via',
+))
+IP_PATTERN = re.compile(r'(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])')
+
+
+def parse_judge_response(body):
+    """Return (origin IPs, request headers or None) echoed by a judge
+
+    Understands httpbin-style JSON ({"origin": ..., "headers": {...}}) and
+    azenv-style "REMOTE_ADDR = ..." / "HTTP_VIA = ..." text. Header names
+    are lowercased; None means the judge does not echo headers.
+    """
+    text = body.decode('utf-8', 'replace') if isinstance(body, bytes) else body
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        headers = data.get('headers')
+        if isinstance(headers, dict):
+            headers = {str(name).lower(): str(value) for name, value in headers.items()}
+        else:
+            headers = None
+        return set(IP_PATTERN.findall(str(data.get('origin', '')))), headers
+
+    origins = set()
+    headers = {}
+    for line in text.splitlines():
+        name, separator, value = line.partition('=')
+        if not separator:
+            continue
+        name = name.strip().upper()
+        if name == 'REMOTE_ADDR':
+            origins.update(IP_PATTERN.findall(value))
+        elif name.startswith('HTTP_'):
+            headers[name[5:].lower().replace('_', '-')] = value.strip()
+    return origins, headers if headers else None
+
+
+def judge_origins(body):
+    return parse_judge_response(body)[0]
+
+
+def detect_anonymity_level(body, real_ip=None):
+    """Classify a proxy from the judge response it fetched
+
+    transparent: our real address is visible to the judge;
+    anonymous: hidden, but headers show a proxy was used (or the judge
+    does not echo headers, so that cannot be ruled out);
+    elite: hidden, and no proxy headers reached the judge.
+    """
+    origins, headers = parse_judge_response(body)
+    if not origins and headers is None:
+        return "unknown"
+    if real_ip and (real_ip in origins
+                    or any(real_ip in value for value in (headers or {}).values())):
+        return "transparent"
+    if headers is None or REVEALING_HEADERS & headers.keys():
+        return "anonymous"
+    return "elite"
+
+
+def detect_country(addr, geoip=None):
+    """Country code of a packed address from the offline GeoIP database"""
+    if geoip is None:
+        return UNKNOWN_COUNTRY
+    return geoip.country(addr >> 16)
+
+
+SOURCE_TYPE_PATTERN = re.compile(r'socks5|socks4|https|http')
+
+
+def determine_proxy_type_from_source(url):
+    """Protocol a source URL advertises in its path or query, or None for mixed lists"""
+    parts = urlsplit(url)
+    match = SOURCE_TYPE_PATTERN.search(f"{parts.path}?{parts.query}".lower())
+    return match.group(0) if match else None
+
+
+def source_matches_type(url, selected_type):
+    """False if the source only lists proxies of a protocol other than selected_type"""
+    if selected_type in AUTO_TYPES:
+        return True
+    source_type = determine_proxy_type_from_source(url)
+    return source_type is None or source_type == selected_type
+
+
+class ProxyEngine:
+    """Headless harvest -> check -> store pipeline"""
+
+    def __init__(self, config=None, callbacks=None, store=None):
+        self.config = (config or EngineConfig()).validate()
+        self.callbacks = callbacks or EngineCallbacks()
+        self.store = store
+        self.is_running = False
+        self.is_paused = False
+        self.proxy_list = address_array()
+        self.checked_proxies = []
+        self.scraped_count = 0
+        self.checked_count = 0
+        self.skipped_count = 0
+        self.unreachable_count = 0
+        self.limiter = None
+        self.geoip = None
+        self.judges = None
+        self.real_ip = self.config.egress_ip or None
+        self.metrics = Metrics()
+        if isinstance(store, ProxyStore):
+            # Only the writer thread updates this counter
+            store.on_commit = lambda count: self.metrics.inc('stored', count)
+        self._backed_off = set()
+        self._loop = None
+        self._tasks = set()
+
+    # Control
+    def stop(self):
+        """Stop the run; safe to call from any thread"""
+        self.is_running = False
+        self.is_paused = False
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._cancel_tasks)
+
+    def _cancel_tasks(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _track(self, coro):
+        """Create a task that stop() will cancel"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def pause(self):
+        self.is_paused = True
+
+    def resume(self):
+        self.is_paused = False
+
+    async def _emit(self, name, *args):
+        callback = getattr(self.callbacks, name)
+        if callback is None:
+            return
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
+
+    async def _wait_if_paused(self):
+        while self.is_paused and self.is_running:
+            await asyncio.sleep(0.1)
+
+    # Pipeline
+    async def run(self):
+        """Harvest and check; streams harvested proxies into the checker when config.pipeline is set"""
+        self.is_running = True
+        self.is_paused = False
+        self.proxy_list = address_array()
+        self.checked_proxies = []
+        self.scraped_count = 0
+        self.checked_count = 0
+        self.skipped_count = 0
+        self.real_ip = self.config.egress_ip or None
+        self._loop = asyncio.get_running_loop()
+        exporters = await self._start_metrics()
+        try:
+            await self._load_backoff()
+            known = await self._load_known()
+            if self.config.pipeline:
+                await self._run_pipelined(known)
+            else:
+                self.proxy_list = await self.harvest()
+                known_set = set(known)
+                fresh, deferred = self._partition(
+                    proxy for proxy in self.proxy_list if proxy not in known_set)
+                if self.is_running and (known or fresh or deferred):
+                    await self.check(address_array(list(known) + fresh + deferred))
+        finally:
+            self.is_running = False
+            self._loop = None
+            if isinstance(self.store, ProxyStore):
+                # Commit the last batch so the final metrics count it as stored
+                await asyncio.to_thread(self.store.flush, STORE_FLUSH_TIMEOUT)
+            await self._stop_metrics(*exporters)
+            await self._emit('on_finished', self.checked_proxies)
+        return self.checked_proxies
+
+    async def _start_metrics(self):
+        """Start loop lag sampling and the configured exporters; returns (runner, tasks)"""
+        config = self.config
+        tasks = [asyncio.create_task(self.metrics.watch_loop())]
+        if config.metrics_file:
+            tasks.append(asyncio.create_task(
+                write_snapshots(self.metrics, config.metrics_file, config.metrics_interval)))
+        runner = None
+        if config.metrics_port:
+            try:
+                runner = await serve_metrics(self.metrics, config.metrics_host, config.metrics_port)
+            except OSError as e:
+                logger.warning("Could not serve metrics on port %d: %s", config.metrics_port, e)
+        return runner, tasks
+
+    async def _stop_metrics(self, runner, tasks):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if runner is not None:
+            await runner.cleanup()
+
+    async def _load_backoff(self):
+        self._backed_off = set()
+        if self.store is None or self.config.backoff_mode == "off":
+            return
+        self._backed_off = await asyncio.to_thread(self.store.backed_off_addresses)
+        if self._backed_off:
+            logger.info("%d addresses are backing off after recent failures", len(self._backed_off))
+
+    async def _load_known(self):
+        """Addresses that passed their last check, best first, to re-check before new ones"""
+        if self.store is None or not self.config.recheck_known:
+            return address_array()
+        known = await asyncio.to_thread(self.store.known_good_addresses)
+        if known:
+            logger.info("Re-checking %d proxies that were valid last time first", len(known))
+        return known
+
+    def _partition(self, proxies):
+        """Split proxies into (check now, check last) using the failure backoff"""
+        if not self._backed_off:
+            return list(proxies), []
+        fresh, deferred = [], []
+        for proxy in proxies:
+            (deferred if proxy in self._backed_off else fresh).append(proxy)
+        if self.config.backoff_mode == "skip":
+            self.skipped_count += len(deferred)
+            deferred = []
+        return fresh, deferred
+
+    async def _run_pipelined(self, known=()):
+        queue = asyncio.Queue(maxsize=self.config.queue_size)
+        known_set = set(known)
+        deferred = []
+
+        async def feed(proxies):
+            fresh, later = self._partition(proxy for proxy in proxies if proxy not in known_set)
+            deferred.extend(later)
+            for proxy in fresh:
+                await queue.put(proxy)
+
+        async def produce():
+            for proxy in known:
+                await queue.put(proxy)
+            try:
+                self.proxy_list = await self.harvest(on_proxies=feed)
+            except Exception as e:
+                logger.error("Harvest failed: %s", e)
+            # Recently failed addresses go last, once everything new has been queued
+            for proxy in deferred:
+                await queue.put(proxy)
+            await queue.put(None)
+
+        producer = self._track(produce())
+        try:
+            await self.check_stream(queue)
+        finally:
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    async def harvest(self, on_proxies=None):
+        """Fetch every source and return the de-duplicated proxy list
+
+        Sources are parsed while they download, so a slow source never holds
+        up the others. If on_proxies is given it is awaited with the new (not
+        yet seen) proxies of every parsed chunk. Proxies are packed addresses
+        (see records.pack_address).
+        """
+        config = self.config
+        # Lists dedicated to another protocol would only produce failed checks
+        proxy_sources = [url for url in config.sources if source_matches_type(url, config.proxy_type)]
+        total_sources = len(proxy_sources)
+        # About 8 bytes per address; the list is only built once harvesting is done
+        scraped_proxies = AddressSet()
+        batch_size = config.batch_size
+        rate_limit = config.rate_limit
+        completed_sources = 0
+        cache = None
+        if config.cache_file:
+            cache = SourceCache(config.cache_file, config.cache_ttl, config.cache_max_addresses)
+            await asyncio.to_thread(cache.load)
+
+        semaphore = asyncio.Semaphore(rate_limit)
+        connector = aiohttp.TCPConnector(limit=config.max_threads, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector) as session:
+
+            async def add_proxies(addresses):
+                new_proxies = scraped_proxies.add_new(addresses)
+                self.scraped_count = len(scraped_proxies)
+                self.metrics.inc('deduped', len(new_proxies))
+                if on_proxies is not None and new_proxies and self.is_running:
+                    await on_proxies(new_proxies)
+
+            async def harvest_source(url):
+                nonlocal completed_sources
+                await self.fetch_with_semaphore(semaphore, session, url, add_proxies, cache)
+                completed_sources += 1
+                await self._emit('on_harvest_progress', completed_sources, total_sources,
+                                 self.scraped_count)
+
+            tasks = []
+            try:
+                for i in range(0, total_sources, batch_size):
+                    if not self.is_running:
+                        break
+                    await self._wait_if_paused()
+
+                    batch = proxy_sources[i:i+batch_size]
+                    tasks.extend(self._track(harvest_source(url)) for url in batch)
+                    await asyncio.sleep(1.0 / rate_limit)
+
+                await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        if cache is not None:
+            try:
+                await asyncio.to_thread(cache.save)
+            except OSError as e:
+                logger.warning("Could not save source cache %s: %s", cache.path, e)
+            logger.info("Source cache: %d not modified, %d downloaded", cache.hits, cache.misses)
+        logger.info("Harvested %d proxies from %d sources", len(scraped_proxies), total_sources)
+        return scraped_proxies.pop_array()
+
+    async def fetch_with_semaphore(self, semaphore, session, url, on_proxies, cache=None):
+        """Stream URL with rate limiting, awaiting on_proxies with each parsed chunk
+
+        With a SourceCache the request is conditional, and a 304 answer
+        replays the addresses parsed last time.
+        """
+        async with semaphore:
+            extractor = ProxyExtractor(self.config.allow_private)
+            headers = cache.conditional_headers(url) if cache is not None else {}
+            metrics = self.metrics
+            started = time.monotonic()
+            try:
+                async with session.get(
+                        url, headers=headers,
+                        timeout=aiohttp.ClientTimeout(total=self.config.source_timeout)) as response:
+                    if response.status == 304 and cache is not None and cache.get(url) is not None:
+                        addresses = cache.revalidated(url)
+                        metrics.inc('fetched')
+                        metrics.inc('parsed', len(addresses))
+                        await on_proxies(addresses)
+                        logger.debug("Source %s not modified, using cached list", url)
+                    elif response.status == 200:
+                        parsed = address_array() if cache is not None else None
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            addresses = extractor.feed(chunk)
+                            metrics.inc('parsed', len(addresses))
+                            if parsed is not None:
+                                parsed.extend(addresses)
+                            if addresses:
+                                await on_proxies(addresses)
+                        addresses = extractor.close()
+                        metrics.inc('parsed', len(addresses))
+                        metrics.inc('fetched')
+                        metrics.observe('source_fetch_ms', (time.monotonic() - started) * 1000)
+                        if parsed is not None:
+                            parsed.extend(addresses)
+                            cache.put(url, response.headers.get('ETag'),
+                                      response.headers.get('Last-Modified'), parsed)
+                        if addresses:
+                            await on_proxies(addresses)
+            except Exception as e:
+                logger.debug("Source %s failed: %s", url, e)
+            if extractor.rejected:
+                logger.debug("Source %s: dropped %d invalid or reserved addresses", url, extractor.rejected)
+
+    async def check(self, proxies):
+        """Check proxies and return the valid ones"""
+        total_proxies = len(proxies)
+        if total_proxies == 0:
+            return []
+
+        queue = asyncio.Queue(maxsize=self.config.queue_size)
+
+        async def feed():
+            for proxy in proxies:
+                await queue.put(proxy)
+            await queue.put(None)
+
+        feeder = self._track(feed())
+        try:
+            return await self.check_stream(queue, total_proxies)
+        finally:
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+
+    async def check_stream(self, queue, total=None, collect=True):
+        """Check proxies taken from queue until a None sentinel arrives
+
+        A pool of workers drains the queue, so memory use does not depend on
+        how many proxies pass through (unless collect keeps every valid
+        one in checked_proxies). How many checks are in flight is set
+        by an AdaptiveLimiter between min_threads and max_threads (fixed at
+        max_threads without config.adaptive). Without a total the progress
+        total follows the harvest count.
+
+        With config.prefilter a first pool of prefilter_concurrency workers
+        only tries a TCP connect within connect_timeout; addresses that
+        accept the connection are passed on to the HTTP check workers.
+        """
+        config = self.config
+        completed = 0
+        self.unreachable_count = 0
+        if self.geoip is None and config.geoip_db:
+            self.geoip = await asyncio.to_thread(GeoDatabase.open, config.geoip_db,
+                                                 config.geoip_csv or None)
+        self.judges = JudgePool(config.judge_urls, probe_interval=config.judge_probe_interval)
+        await self.judges.probe_all(judge_origins)
+        if self.real_ip is None:
+            self.real_ip = self._egress_address()
+        await self._emit('on_check_started', total or 0)
+
+        metrics = self.metrics
+        metrics.set_gauge('queue_depth', queue.qsize, queue="input")
+
+        async def record(proxy, result):
+            nonlocal completed
+            metrics.inc('checked')
+            if result:
+                if collect:
+                    self.checked_proxies.append(result)
+                metrics.inc('valid')
+                metrics.observe('check_latency_ms', result.response_time)
+                if self.store is not None:
+                    self.store.store_proxy(result)
+                await self._emit('on_proxy', result)
+            elif self.store is not None:
+                self.store.record_failure(proxy)
+            await self._emit('on_checked', proxy, result)
+
+            completed += 1
+            self.checked_count = completed
+            await self._emit('on_check_progress', completed,
+                             total or max(self.scraped_count - self.skipped_count, completed))
+
+        async def next_proxy(source):
+            await self._wait_if_paused()
+            proxy = await source.get()
+            if proxy is None:
+                # Leave the sentinel for the other workers
+                source.put_nowait(None)
+            return proxy
+
+        if config.processes > 1:
+            await self._check_sharded(queue, next_proxy, record)
+            self._log_check_summary()
+            return self.checked_proxies
+
+        limiter = self.limiter = self._create_limiter()
+        metrics.set_gauge('checks_in_flight', lambda: limiter.in_flight)
+        metrics.set_gauge('concurrency_limit', lambda: limiter.limit)
+        await self._emit('on_concurrency', limiter.limit, limiter.ceiling)
+
+        async def probe_worker(source, sink):
+            while self.is_running:
+                proxy = await next_proxy(source)
+                if proxy is None:
+                    return
+                if await self.probe_connect(proxy):
+                    await sink.put(proxy)
+                else:
+                    self.unreachable_count += 1
+                    await record(proxy, None)
+
+        async def check_worker(session, source):
+            while self.is_running:
+                proxy = await next_proxy(source)
+                if proxy is None:
+                    return
+                async with limiter:
+                    result = await self.check_proxy_enhanced(session, proxy, config.timeout)
+                await record(proxy, result)
+
+        async def concurrency_changed(limit):
+            await self._emit('on_concurrency', limit, limiter.ceiling)
+
+        tasks = [self._track(limiter.run(concurrency_changed)),
+                 self._track(self.judges.run(judge_origins))]
+        check_source = queue
+        if config.prefilter:
+            check_source = asyncio.Queue(maxsize=config.queue_size)
+            metrics.set_gauge('queue_depth', check_source.qsize, queue="connected")
+            probes = [self._track(probe_worker(queue, check_source))
+                      for _ in range(config.prefilter_concurrency)]
+
+            async def close_check_source():
+                await asyncio.gather(*probes, return_exceptions=True)
+                await check_source.put(None)
+
+            tasks.extend(probes)
+            tasks.append(self._track(close_check_source()))
+
+        connector = aiohttp.TCPConnector(limit=limiter.ceiling)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            workers = [self._track(check_worker(session, check_source))
+                       for _ in range(limiter.ceiling)]
+            tasks.extend(workers)
+            try:
+                await asyncio.gather(*workers, return_exceptions=True)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._log_check_summary()
+        if config.adaptive:
+            logger.info("Concurrency ended at %d of %d after %d cuts",
+                        limiter.limit, limiter.ceiling, limiter.decreases)
+        return self.checked_proxies
+
+    def _log_check_summary(self):
+        logger.info("Checked %d proxies, %d valid, %d unreachable, %d skipped while backing off",
+                    self.checked_count, len(self.checked_proxies), self.unreachable_count,
+                    self.skipped_count)
+
+    async def _check_sharded(self, queue, next_proxy, record):
+        """Spread the queue over config.processes shard processes (see sharding)"""
+        config = self.config
+        child_config = replace(shard_config(config, config.processes), egress_ip=self.real_ip or "")
+        shards = []
+        outstanding = []
+        # Shards count their own failure reasons and send the totals when they finish
+        self.metrics.set_gauge('shard_backlog', lambda: sum(outstanding))
+
+        async def read_results(index, process):
+            while True:
+                try:
+                    data = await process.stdout.readexactly(RESULT.size)
+                except asyncio.IncompleteReadError:
+                    break
+                status, addr, result, summary = decode_result(data)
+                if status == STATUS_DONE:
+                    self.unreachable_count += summary.pop('unreachable')
+                    for stage, count in summary.items():
+                        self.metrics.inc(stage, count)
+                    continue
+                outstanding[index] -= 1
+                await record(addr, result)
+            if outstanding[index]:
+                logger.warning("Shard %d exited with %d addresses unchecked",
+                               index, outstanding[index])
+
+        async def distribute():
+            done = False
+            while not done and self.is_running:
+                batch = address_array()
+                proxy = await next_proxy(queue)
+                while proxy is not None:
+                    batch.append(proxy)
+                    if len(batch) >= SHARD_BATCH or queue.empty():
+                        break
+                    proxy = queue.get_nowait()
+                done = proxy is None
+                if batch:
+                    # The least loaded shard gets the batch
+                    index = min(range(len(shards)), key=outstanding.__getitem__)
+                    outstanding[index] += len(batch)
+                    shards[index].stdin.write(batch.tobytes())
+                    await shards[index].stdin.drain()
+            for process in shards:
+                process.stdin.close()
+
+        tasks = []
+        try:
+            for _ in range(config.processes):
+                shards.append(await spawn_shard(child_config))
+                outstanding.append(0)
+            readers = [self._track(read_results(index, process))
+                       for index, process in enumerate(shards)]
+            tasks.extend(readers)
+            tasks.append(self._track(distribute()))
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for process in shards:
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+
+    def _create_limiter(self):
+        config = self.config
+        ceiling = config.max_threads
+        reserved = FD_RESERVE + (config.prefilter_concurrency if config.prefilter else 0)
+        fd_limit = descriptor_limit(ceiling + reserved)
+        if fd_limit is not None and fd_limit - reserved < ceiling:
+            ceiling = max(1, fd_limit - reserved)
+            logger.warning("Open-file limit of %d caps concurrent checks at %d", fd_limit, ceiling)
+        return AdaptiveLimiter(config.min_threads, ceiling, adaptive=config.adaptive)
+
+    async def probe_connect(self, addr):
+        """True if addr accepts a TCP connection within connect_timeout"""
+        ip, port = unpack_address(addr)
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port),
+                                               self.config.connect_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.metrics.inc(failure_stage(e))
+            return False
+        writer.transport.abort()
+        return True
+
+    async def check_proxy_enhanced(self, session, addr, timeout):
+        """Check a packed address with the configured protocol
+
+        HTTP proxies are checked with a plain proxied request; HTTPS (CONNECT),
+        SOCKS4 and SOCKS5 proxies through a raw tunnel. In auto mode the
+        protocol is first detected with one probe round-trip, and only the
+        detected protocol is checked.
+        """
+        config = self.config
+        try:
+            ip, port = unpack_address(addr)
+            protocol = config.proxy_type
+            if protocol in AUTO_TYPES:
+                protocol = await detect_protocol(ip, port, config.connect_timeout, timeout)
+                if protocol is None:
+                    raise ProxyProtocolError("No known proxy protocol")
+
+            judge = None
+            for _ in range(2):
+                judge = self.judges.acquire(exclude=judge)
+                status = None
+                try:
+                    start_time = time.time()
+                    if protocol == "http":
+                        status, body = await self._fetch_http(session, judge.url, ip, port, timeout)
+                    else:
+                        status, _, body = await asyncio.wait_for(
+                            fetch_through_tunnel(protocol, ip, port, judge.url, config.connect_timeout),
+                            timeout)
+                    elapsed = int((time.time() - start_time) * 1000)
+                finally:
+                    self.judges.release(judge, status)
+                if status not in JUDGE_ERROR_STATUSES:
+                    break
+                # The judge refused, not the proxy: fail over to another judge once
+            if status == 200:
+                if self.limiter is not None:
+                    self.limiter.record_success(elapsed)
+                # The judge's own latency is not the proxy's fault
+                judge_time = judge.latency_ms
+                response_time = max(1, elapsed - judge_time)
+
+                return ProxyRecord(
+                    addr,
+                    response_time,
+                    categorize_proxy_by_speed(response_time),
+                    detect_country(addr, self.geoip),
+                    detect_anonymity_level(body, self.real_ip),
+                    protocol.upper(),
+                    time.time(),
+                    judge_time,
+                )
+            error = None
+        except Exception as e:
+            error = e
+        self.metrics.inc(failure_stage(error))
+        if self.limiter is not None:
+            self.limiter.record_failure(error)
+        return None
+
+    async def _fetch_http(self, session, url, ip, port, timeout):
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=self.config.connect_timeout)
+        async with session.get(url,
+                               proxy=f"http://{ip}:{port}",
+                               timeout=client_timeout) as response:
+            return response.status, await response.read()
+
+    def _egress_address(self):
+        """Our address as the judges see it without a proxy; None if unknown"""
+        origins = self.judges.origins()
+        if len(origins) != 1:
+            logger.warning("Judges reported %s as our address, transparent proxies will not be "
+                           "recognised", ", ".join(sorted(origins)) or "nothing")
+            return None
+        real_ip = origins.pop()
+        logger.info("Egress address is %s", real_ip)
+        return real_ip
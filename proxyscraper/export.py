@@ -0,0 +1,273 @@
+"""Streaming, atomic proxy exports
+
+The format is picked from the file name:
+
+    .txt             ip:port lines (also any unknown extension)
+    .json            a JSON array of proxy objects, one per line
+    .ndjson, .jsonl  one JSON object per line
+    .csv             a header row, then one row per proxy
+    .bin             packed addresses, 6 bytes per proxy: the IPv4 address
+                     then the port, both big-endian (see load_packed)
+
+and a trailing .gz or .zst compresses any of them (zstd needs the
+zstandard package). Proxies are encoded a batch at a time as they are
+read, so exporting the database (export_store) never holds more than one
+batch in memory, and progress(done, total) is called after every batch.
+The file is written under a temporary name next to the target and
+renamed over it when complete, so readers never see a partial export.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import secrets
+import sys
+from contextlib import contextmanager
+from itertools import islice
+
+from .records import ProxyRecord, address_array, format_address, pack_address
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+EXTENSIONS = {
+    '.txt': "txt",
+    '.json': "json",
+    '.ndjson': "ndjson",
+    '.jsonl': "ndjson",
+    '.csv': "csv",
+    '.bin': "bin",
+}
+COMPRESSIONS = {'.gz': "gzip", '.zst': "zstd"}
+PACKED_SIZE = 6
+
+
+def _umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Mode open() gives new files; tempfile.mkstemp creates them 0600. Read once, at import,
+# because reading the umask briefly clears it for every thread
+FILE_MODE = 0o666 & ~_umask()
+
+
+def _as_dict(proxy):
+    return proxy.to_dict() if isinstance(proxy, ProxyRecord) else proxy
+
+
+def _addr(proxy):
+    return proxy.addr if isinstance(proxy, ProxyRecord) else pack_address(proxy['ip'], proxy['port'])
+
+
+def export_format(file_path):
+    """(format, compression) for file_path; compression is "gzip", "zstd" or None"""
+    root, extension = os.path.splitext(file_path.lower())
+    compression = COMPRESSIONS.get(extension)
+    if compression is not None:
+        extension = os.path.splitext(root)[1]
+    return EXTENSIONS.get(extension, "txt"), compression
+
+
+def check_export_path(file_path):
+    """Raise ValueError if file_path names a format this installation cannot write"""
+    if export_format(file_path)[1] == "zstd":
+        _zstandard()
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd compression needs the zstandard package") from None
+    return zstandard
+
+
+@contextmanager
+def _atomic_output(file_path, compression):
+    """Binary stream whose data replaces file_path only once the block completes"""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    tmp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with open(tmp_path, 'xb') as raw:
+            if compression == "gzip":
+                stream = gzip.GzipFile(filename=name[:-3], mode='wb', fileobj=raw, compresslevel=6)
+            elif compression == "zstd":
+                stream = _zstandard().ZstdCompressor().stream_writer(raw, closefd=False)
+            else:
+                stream = raw
+            yield stream
+            if stream is not raw:
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_txt(f, batches):
+    for batch in batches:
+        f.write(''.join(f"{format_address(_addr(proxy))}\n" for proxy in batch))
+        yield len(batch)
+
+
+def _write_ndjson(f, batches):
+    for batch in batches:
+        f.write(''.join(json.dumps(_as_dict(proxy)) + '\n' for proxy in batch))
+        yield len(batch)
+
+
+def _write_json(f, batches):
+    f.write('[')
+    separator = '\n  '
+    for batch in batches:
+        for proxy in batch:
+            f.write(separator + json.dumps(_as_dict(proxy)))
+            separator = ',\n  '
+        yield len(batch)
+    f.write('\n]\n' if separator != '\n  ' else ']\n')
+
+
+def _write_csv(f, batches):
+    writer = None
+    for batch in batches:
+        if batch and writer is None:
+            writer = csv.DictWriter(f, fieldnames=list(_as_dict(batch[0]).keys()))
+            writer.writeheader()
+        if batch:
+            writer.writerows(_as_dict(proxy) for proxy in batch)
+        yield len(batch)
+
+
+def _write_bin(f, batches):
+    for batch in batches:
+        f.write(b''.join(_addr(proxy).to_bytes(PACKED_SIZE, 'big') for proxy in batch))
+        yield len(batch)
+
+
+WRITERS = {
+    "txt": _write_txt,
+    "json": _write_json,
+    "ndjson": _write_ndjson,
+    "csv": _write_csv,
+    "bin": _write_bin,
+}
+
+
+def export_batches(batches, file_path, progress=None, total=None):
+    """Write an iterable of proxy lists to file_path atomically; returns the number written
+
+    progress, if given, is called with (written, total) after every batch.
+    """
+    fmt, compression = export_format(file_path)
+    written = 0
+    with _atomic_output(file_path, compression) as out:
+        f = out if fmt == "bin" else io.TextIOWrapper(out, encoding='utf-8', newline='')
+        for count in WRITERS[fmt](f, batches):
+            written += count
+            if progress is not None:
+                progress(written, total)
+        if f is not out:
+            f.flush()
+            f.detach()
+    return written
+
+
+def _batched(proxies, size):
+    iterator = iter(proxies)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def export_proxies(proxies, file_path, progress=None):
+    """Write proxies (ProxyRecords or dicts, any iterable) to file_path; returns the number written"""
+    total = len(proxies) if hasattr(proxies, '__len__') else None
+    return export_batches(_batched(proxies, BATCH_SIZE), file_path, progress, total)
+
+
+def export_store(store, file_path, proxy_filter=None, progress=None):
+    """Stream the store's valid proxies (best first) matching proxy_filter to file_path
+
+    Safe to run on any thread. progress is called with (proxies read,
+    proxies in the database); returns the number written.
+    """
+    total = store.count_proxies()
+    read = 0
+
+    def batches():
+        nonlocal read
+        for batch in store.known_good(BATCH_SIZE):
+            read += len(batch)
+            if proxy_filter is not None and not proxy_filter.is_empty():
+                batch = [record for record in batch if proxy_filter.matches(record)]
+            yield batch
+
+    report = None if progress is None else lambda written, _: progress(read, total)
+    return export_batches(batches(), file_path, report)
+
+
+def load_packed(file_path):
+    """Packed addresses from a .bin export, decompressing .gz and .zst"""
+    _, compression = export_format(file_path)
+    with open(file_path, 'rb') as f:
+        if compression == "gzip":
+            data = gzip.decompress(f.read())
+        elif compression == "zstd":
+            data = _zstandard().ZstdDecompressor().stream_reader(f).readall()
+        else:
+            data = f.read()
+    if len(data) % PACKED_SIZE:
+        raise ValueError(f"{file_path} is not a packed address file")
+    return address_array(int.from_bytes(data[i:i + PACKED_SIZE], 'big')
+                         for i in range(0, len(data), PACKED_SIZE))
+
+
+def main(argv=None):
+    from .filters import ProxyFilter
+    from .store import ProxyStore
+
+    parser = argparse.ArgumentParser(prog="python -m proxyscraper.export",
+                                     description="Export the valid proxies stored in the database")
+    parser.add_argument("output", help="file to write; the format follows the extension: .txt, "
+                                       ".json, .ndjson, .csv or .bin, optionally with .gz or .zst")
+    parser.add_argument("--db", default="proxy_db.sqlite", help="SQLite database (default: %(default)s)")
+    parser.add_argument("--country", default="", help="only these countries, comma separated")
+    parser.add_argument("--anonymity", default="all", help="only these anonymity levels, comma separated")
+    parser.add_argument("--speed", default="all", help="only these speed categories, comma separated")
+    parser.add_argument("--min-latency", type=int, help="minimum response time in ms")
+    parser.add_argument("--max-latency", type=int, help="maximum response time in ms")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        proxy_filter = ProxyFilter.parse(args.country, args.anonymity, args.speed,
+                                         args.min_latency, args.max_latency)
+        check_export_path(args.output)
+    except ValueError as e:
+        parser.error(str(e))
+    if not os.path.exists(args.db):
+        parser.error(f"no database at {args.db}")
+    store = ProxyStore(args.db)
+    try:
+        count = export_store(store, args.output, proxy_filter, lambda read, total: logger.info(
+            "Exported %d/%d", read, total))
+    except OSError as e:
+        logger.error("Export failed: %s", e)
+        return 1
+    finally:
+        store.close()
+    logger.info("Exported %d proxies to %s", count, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Streaming ip:port extraction from raw source bytes
+
+Handles plain "ip:port" lists, CSV/whitespace separated "ip,port" rows
+and JSON objects with "ip"/"host" and "port" keys, in either key order.
+Matches that straddle chunk boundaries are carried over to the next
+chunk, so a response can be parsed while it downloads.
+"""
+import re
+
+_OCTET = rb'(\d{1,3})'
+_IP = _OCTET + rb'\.' + _OCTET + rb'\.' + _OCTET + rb'\.' + _OCTET
+_PORT = rb'(\d{1,5})'
+
+# Every alternative is bounded, so no match is longer than MAX_MATCH bytes
+PROXY_BYTES_PATTERN = re.compile(
+    rb'(?<![\d.])' + _IP + rb'(?:'
+    rb':'                                                           # 1.2.3.4:80
+    rb'|"?[ \t]{0,4}[,;\t ][ \t]{0,4}"?'                            # 1.2.3.4,80  "1.2.3.4","80"
+    rb'|"[ \t]{0,4},[ \t\r\n]{0,8}"port"[ \t]{0,4}:[ \t]{0,4}"?'    # "ip": "1.2.3.4", "port": 80
+    rb')' + _PORT + rb'(?![\d.])'
+    rb'|"port"[ \t]{0,4}:[ \t]{0,4}"?' + _PORT + rb'"?[ \t]{0,4},[ \t\r\n]{0,8}'
+    rb'"(?:ip|host|address)"[ \t]{0,4}:[ \t]{0,4}"' + _IP + rb'"'   # "port": 80, "ip": "1.2.3.4"
+)
+MAX_MATCH = 96
+CHUNK_SIZE = 64 * 1024
+
+# (network, prefix length) blocks that are never usable public proxies
+RESERVED_NETWORKS = (
+    ("0.0.0.0", 8), ("10.0.0.0", 8), ("100.64.0.0", 10), ("127.0.0.0", 8),
+    ("169.254.0.0", 16), ("172.16.0.0", 12), ("192.0.0.0", 24), ("192.0.2.0", 24),
+    ("192.88.99.0", 24), ("192.168.0.0", 16), ("198.18.0.0", 15), ("198.51.100.0", 24),
+    ("203.0.113.0", 24), ("224.0.0.0", 4), ("240.0.0.0", 4),
+)
+
+
+def _network(address, prefix):
+    value = 0
+    for octet in address.split('.'):
+        value = (value << 8) | int(octet)
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    return value & mask, mask
+
+
+_RESERVED = tuple(_network(address, prefix) for address, prefix in RESERVED_NETWORKS)
+
+
+def is_reserved(ip_value):
+    """True if the 32-bit address is private, loopback, multicast or otherwise reserved"""
+    return any(ip_value & mask == network for network, mask in _RESERVED)
+
+
+def _number(digits):
+    # Leading zeros make an octet ambiguous (octal in some parsers) - reject them
+    if len(digits) > 1 and digits[0] == 48:
+        return -1
+    return int(digits)
+
+
+class ProxyExtractor:
+    """Incremental extractor that turns source bytes into packed addresses"""
+
+    def __init__(self, allow_private=False):
+        self.allow_private = allow_private
+        self._buffer = b''
+        self._pos = 0
+        self.rejected = 0
+
+    def feed(self, chunk):
+        """Parse the next chunk and return the packed addresses completed so far"""
+        buffer = self._buffer + chunk
+        # A match starting before limit is guaranteed to be complete
+        limit = len(buffer) - MAX_MATCH
+        pos = self._pos
+        addresses = []
+        for match in PROXY_BYTES_PATTERN.finditer(buffer, pos):
+            if match.start() >= limit:
+                break
+            pos = match.end()
+            self._accept(match, addresses)
+
+        resume = max(pos, limit, 0)
+        keep = max(0, resume - 1)  # one byte of context for the lookbehind
+        self._buffer = buffer[keep:]
+        self._pos = resume - keep
+        return addresses
+
+    def close(self):
+        """Flush whatever is left at the end of the stream"""
+        addresses = []
+        for match in PROXY_BYTES_PATTERN.finditer(self._buffer, self._pos):
+            self._accept(match, addresses)
+        self._buffer = b''
+        self._pos = 0
+        return addresses
+
+    def _accept(self, match, addresses):
+        groups = match.groups()
+        if groups[0] is not None:
+            octets, port = groups[0:4], groups[4]
+        else:
+            port, octets = groups[5], groups[6:10]
+
+        values = [_number(octet) for octet in octets]
+        port = _number(port)
+        if min(values) < 0 or max(values) > 255 or not 0 < port <= 0xFFFF:
+            self.rejected += 1
+            return
+        ip_value = (values[0] << 24) | (values[1] << 16) | (values[2] << 8) | values[3]
+        if not self.allow_private and is_reserved(ip_value):
+            self.rejected += 1
+            return
+        addresses.append((ip_value << 16) | port)
+
+
+def extract_proxies(data, allow_private=False):
+    """Extract packed addresses from a complete bytes/str body"""
+    if isinstance(data, str):
+        data = data.encode('utf-8', 'replace')
+    extractor = ProxyExtractor(allow_private)
+    return extractor.feed(data) + extractor.close()
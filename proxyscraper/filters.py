@@ -0,0 +1,171 @@
+import logging
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKET_MS = 100
+INDEXED_FIELDS = ('country', 'anonymity', 'category')
+
+
+def _split_values(text, normalize):
+    values = {normalize(v) for v in re.split(r'[,\s]+', text or '') if v}
+    values.discard('ALL' if normalize is str.upper else 'all')
+    return frozenset(values)
+
+
+def _parse_latency(text):
+    text = str(text).strip() if text is not None else ''
+    if not text:
+        return None
+    value = int(text)
+    if value < 0:
+        raise ValueError("Latency bounds must not be negative")
+    return value
+
+
+@dataclass(frozen=True)
+class ProxyFilter:
+    """Filter criteria; an empty set means any value"""
+    countries: FrozenSet[str] = frozenset()
+    anonymity: FrozenSet[str] = frozenset()
+    speeds: FrozenSet[str] = frozenset()
+    min_latency: Optional[int] = None
+    max_latency: Optional[int] = None
+
+    @classmethod
+    def parse(cls, country="", anonymity="all", speed="all", min_latency=None, max_latency=None):
+        """Build a filter from comma separated text values (e.g. "US, DE")"""
+        return cls(
+            countries=_split_values(country, str.upper),
+            anonymity=_split_values(anonymity, str.lower),
+            speeds=_split_values(speed, str.lower),
+            min_latency=_parse_latency(min_latency),
+            max_latency=_parse_latency(max_latency),
+        )
+
+    def is_empty(self):
+        return not (self.countries or self.anonymity or self.speeds
+                    or self.min_latency is not None or self.max_latency is not None)
+
+    def matches(self, proxy):
+        """Check a single proxy against the filter"""
+        if self.countries and proxy.get('country', '').upper() not in self.countries:
+            logger.debug("Country filter failed for %s:%s", proxy['ip'], proxy['port'])
+            return False
+        if self.anonymity and proxy.get('anonymity', '') not in self.anonymity:
+            logger.debug("Anonymity filter failed for %s:%s", proxy['ip'], proxy['port'])
+            return False
+        if self.speeds and proxy.get('category', '').lower() not in self.speeds:
+            logger.debug("Speed filter failed for %s:%s", proxy['ip'], proxy['port'])
+            return False
+        response_time = proxy.get('response_time', 0)
+        if self.min_latency is not None and response_time < self.min_latency:
+            return False
+        if self.max_latency is not None and response_time > self.max_latency:
+            return False
+        return True
+
+    def describe(self):
+        """Human readable summary of each criterion"""
+        def join(values):
+            return ", ".join(sorted(values)) or "All"
+        if self.min_latency is None and self.max_latency is None:
+            latency = "Any"
+        else:
+            latency = f"{self.min_latency or 0}-{self.max_latency if self.max_latency is not None else '∞'}ms"
+        return {
+            'country': join(self.countries),
+            'anonymity': join(self.anonymity),
+            'speed': join(self.speeds),
+            'latency': latency,
+        }
+
+
+class ResultIndex:
+    """Validated proxies with secondary indexes on country, anonymity, speed category and latency
+
+    Records keep their insertion order; queries intersect the index sets
+    instead of scanning every record. Safe to add from one thread while
+    another queries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+        self._indexes = {name: defaultdict(set) for name in INDEXED_FIELDS}
+        self._latency = defaultdict(set)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(list(self.records))
+
+    def add(self, proxy):
+        """Index a proxy and return its record id"""
+        with self._lock:
+            record_id = len(self.records)
+            self.records.append(proxy)
+            for name, index in self._indexes.items():
+                index[self._key(name, proxy.get(name, ''))].add(record_id)
+            self._latency[proxy.get('response_time', 0) // LATENCY_BUCKET_MS].add(record_id)
+            return record_id
+
+    def clear(self):
+        with self._lock:
+            # Cleared in place so callers holding a reference to records see it too
+            self.records.clear()
+            for index in self._indexes.values():
+                index.clear()
+            self._latency.clear()
+
+    def count(self, field, value):
+        with self._lock:
+            return len(self._indexes[field].get(self._key(field, value), ()))
+
+    def value_counts(self, field):
+        """Mapping of every indexed value of field to its record count"""
+        with self._lock:
+            return {value: len(ids) for value, ids in self._indexes[field].items() if ids}
+
+    def query(self, proxy_filter):
+        """Return the records matching proxy_filter, in insertion order"""
+        with self._lock:
+            if proxy_filter.is_empty():
+                return list(self.records)
+
+            candidates = []
+            for name, values in (('country', proxy_filter.countries),
+                                 ('anonymity', proxy_filter.anonymity),
+                                 ('category', proxy_filter.speeds)):
+                if values:
+                    index = self._indexes[name]
+                    candidates.append(set().union(*(index.get(v, ()) for v in values)))
+
+            low, high = proxy_filter.min_latency, proxy_filter.max_latency
+            if low is not None or high is not None:
+                first = (low or 0) // LATENCY_BUCKET_MS
+                last = high // LATENCY_BUCKET_MS if high is not None else None
+                # Walk the buckets that exist, not the range: a bound can be arbitrarily large
+                candidates.append(set().union(*(ids for bucket, ids in self._latency.items()
+                                                if first <= bucket and (last is None or bucket <= last))))
+
+            candidates.sort(key=len)
+            ids = candidates[0].intersection(*candidates[1:])
+            records = [self.records[i] for i in sorted(ids)]
+
+        if low is not None or high is not None:
+            # Buckets are coarse; trim the edges exactly
+            records = [p for p in records
+                       if (low is None or p['response_time'] >= low)
+                       and (high is None or p['response_time'] <= high)]
+        logger.debug("Filter %s matched %d of %d proxies", proxy_filter, len(records), len(self.records))
+        return records
+
+    @staticmethod
+    def _key(field, value):
+        return str(value).upper() if field == 'country' else str(value).lower()
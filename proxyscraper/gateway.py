@@ -0,0 +1,613 @@
+"""Rotating forward proxy over the validated pool
+
+ProxyGateway is an HTTP proxy (CONNECT tunnels and plain absolute-URL
+requests) that sends every client request through a proxy picked from a
+WeightedPool, so any client that can use one proxy can use the pool:
+
+- Rotation. With rotation "request" every tunnel and every request gets
+  its own pick; with "session" the requests of a session keep their proxy
+  for session_ttl seconds after the last use. The session is the client
+  connection, or a name the client chooses: the user name of its proxy
+  URL (http://NAME:x@host:port) or the X-Proxy-Session header. A named
+  session is honoured in either mode.
+- Retries. An upstream that cannot be reached, refuses the handshake or
+  fails before the response head arrives is reported to the pool and the
+  request is tried on another one, up to retries times. Nothing has been
+  sent to the client at that point, so retries are transparent.
+- Keep-alive. Upstream connections of plain requests go back to an idle
+  pool after the response: per proxy for HTTP proxies, per proxy and
+  target host for tunnels through SOCKS and HTTPS proxies. CONNECT goes
+  through proxies of every type.
+- Feedback. Every attempt is reported to the pool: failures suspend the
+  proxy (and with the daemon, queue a re-check), successes refresh its
+  latency, so picks follow what the gateway actually sees.
+
+Request bodies are read whole (up to MAX_BODY) so they can be replayed on
+a retry; response bodies are streamed.
+
+Run `python -m proxyscraper.gateway` to rotate through the proxies stored
+in the database; `python -m proxyscraper --daemon --gateway-port P` uses
+the daemon's live pool.
+"""
+import argparse
+import asyncio
+import base64
+import logging
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from .config import GATEWAY_ROTATIONS
+from .filters import ProxyFilter
+from .pool import WeightedPool, follow_store
+from .protocols import ProxyProtocolError, _status_code, open_tunnel
+
+logger = logging.getLogger(__name__)
+
+SESSION_HEADER = "X-Proxy-Session"
+# Handshake used to open a tunnel through each proxy type. HTTP proxies get
+# CONNECT too; one that refuses it is reported and the next upstream tried
+TUNNEL_PROTOCOLS = {"HTTP": "https", "HTTPS": "https", "SOCKS4": "socks4", "SOCKS5": "socks5"}
+# Proxy types that take plain requests in absolute form instead of through a tunnel
+DIRECT_TYPES = frozenset(("HTTP",))
+# Never forwarded: they describe one hop, not the request
+HOP_HEADERS = frozenset(('connection', 'proxy-connection', 'keep-alive', 'proxy-authorization',
+                         'proxy-authenticate', 'te', 'trailer', 'transfer-encoding', 'upgrade',
+                         'expect', SESSION_HEADER.lower()))
+MAX_BODY = 16 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+CLIENT_IDLE = 60
+IDLE_PER_KEY = 4
+MAX_IDLE = 1024
+SWEEP_INTERVAL = 15
+# Errors that mean the upstream (not the client) failed
+UPSTREAM_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                   asyncio.LimitOverrunError, ProxyProtocolError, ValueError)
+RELAY_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError)
+
+
+async def _open_tunnel(record, host, port, connect_timeout):
+    protocol = TUNNEL_PROTOCOLS.get(record.type)
+    if protocol is None:
+        # e.g. "ALL" rows written by old versions; reported like any upstream failure
+        raise ProxyProtocolError(f"no tunnel handshake for proxy type {record.type!r}")
+    return await open_tunnel(protocol, record.ip, record.port, host, port, connect_timeout)
+
+
+def parse_head(head):
+    """(first line, [(name, value)]) of an HTTP/1.x message head"""
+    lines = head.decode('latin-1').split('\r\n')
+    headers = []
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+
+def header(headers, name):
+    """First value of header name (case-insensitive), or None"""
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def keeps_alive(version, headers):
+    """Whether an HTTP/1.x message lets its connection stay open"""
+    tokens = (header(headers, 'connection') or header(headers, 'proxy-connection') or '').lower()
+    if version == 'HTTP/1.1':
+        return 'close' not in tokens
+    return 'keep-alive' in tokens
+
+
+def forwardable(headers):
+    """headers without the hop-by-hop ones, including those named in Connection"""
+    named = {token.strip().lower() for token in (header(headers, 'connection') or '').split(',')}
+    return [(name, value) for name, value in headers
+            if name.lower() not in HOP_HEADERS and name.lower() not in named]
+
+
+def session_name(headers):
+    """Session the client asked for by header or proxy user name, or None"""
+    name = header(headers, SESSION_HEADER)
+    if name:
+        return name
+    credentials = header(headers, 'proxy-authorization') or ''
+    scheme, _, token = credentials.partition(' ')
+    if scheme.lower() == 'basic':
+        try:
+            user = base64.b64decode(token.strip()).decode('utf-8').partition(':')[0]
+        except ValueError:
+            return None
+        return user or None
+    return None
+
+
+def split_target(target, default_port):
+    """(host, port) of a host[:port] authority; raises ValueError"""
+    parts = urlsplit(f"//{target}")
+    if not parts.hostname:
+        raise ValueError(f"Bad target: {target}")
+    return parts.hostname, parts.port or default_port
+
+
+def response_length(method, status, headers):
+    """Body length of a response: a byte count, "chunked", or None (until close)"""
+    if method == 'HEAD' or status < 200 or status in (204, 304):
+        return 0
+    if 'chunked' in (header(headers, 'transfer-encoding') or '').lower():
+        return "chunked"
+    length = header(headers, 'content-length')
+    return int(length) if length is not None else None
+
+
+async def read_body(reader, headers):
+    """Whole request body, de-chunked; raises ValueError when malformed or over MAX_BODY"""
+    if 'chunked' in (header(headers, 'transfer-encoding') or '').lower():
+        body = bytearray()
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                while await reader.readuntil(b'\r\n') != b'\r\n':
+                    pass  # trailers
+                return bytes(body)
+            if len(body) + size > MAX_BODY:
+                raise ValueError("Request body too large")
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+    length = header(headers, 'content-length')
+    if length is None:
+        return b''
+    length = int(length)
+    if not 0 <= length <= MAX_BODY:
+        raise ValueError("Request body too large")
+    return await reader.readexactly(length)
+
+
+async def _relay_exact(reader, writer, length, timeout):
+    while length > 0:
+        data = await asyncio.wait_for(reader.read(min(length, CHUNK_SIZE)), timeout)
+        if not data:
+            raise asyncio.IncompleteReadError(b'', length)
+        writer.write(data)
+        length -= len(data)
+        await writer.drain()
+
+
+async def _relay_chunked(reader, writer, timeout):
+    while True:
+        line = await asyncio.wait_for(reader.readuntil(b'\r\n'), timeout)
+        writer.write(line)
+        size = int(line.split(b';')[0], 16)
+        if size == 0:
+            while line != b'\r\n':
+                line = await asyncio.wait_for(reader.readuntil(b'\r\n'), timeout)
+                writer.write(line)
+            await writer.drain()
+            return
+        await _relay_exact(reader, writer, size + 2, timeout)
+
+
+async def _relay_until_eof(reader, writer, timeout):
+    while data := await asyncio.wait_for(reader.read(CHUNK_SIZE), timeout):
+        writer.write(data)
+        await writer.drain()
+
+
+async def _pipe(reader, writer):
+    try:
+        while data := await reader.read(CHUNK_SIZE):
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except OSError:
+        writer.transport.abort()
+
+
+class IdleConnections:
+    """Open upstream connections waiting for their next request, by key"""
+
+    def __init__(self, per_key=IDLE_PER_KEY, limit=MAX_IDLE, idle_timeout=30):
+        self.per_key = per_key
+        self.limit = limit
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def get(self, key):
+        """A live idle connection for key as (reader, writer), or None"""
+        connections = self._idle.get(key)
+        now = time.monotonic()
+        while connections:
+            reader, writer, since = connections.pop()
+            self._count -= 1
+            if now - since < self.idle_timeout and not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.transport.abort()
+        self._idle.pop(key, None)
+        return None
+
+    def put(self, key, reader, writer):
+        connections = self._idle.setdefault(key, [])
+        if len(connections) >= self.per_key or self._count >= self.limit:
+            writer.transport.abort()
+            return
+        connections.append((reader, writer, time.monotonic()))
+        self._count += 1
+
+    def sweep(self):
+        """Close the connections idle for longer than idle_timeout"""
+        expired = time.monotonic() - self.idle_timeout
+        for key, connections in list(self._idle.items()):
+            live = [entry for entry in connections
+                    if entry[2] > expired and not entry[1].is_closing() and not entry[0].at_eof()]
+            for entry in connections:
+                if entry not in live:
+                    entry[1].transport.abort()
+            self._count -= len(connections) - len(live)
+            if live:
+                self._idle[key] = live
+            else:
+                del self._idle[key]
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer, _ in connections:
+                writer.transport.abort()
+        self._idle.clear()
+        self._count = 0
+
+
+class ProxyGateway:
+    """HTTP proxy server forwarding each request through a proxy picked from pool"""
+
+    def __init__(self, pool, proxy_filter=None, types=frozenset(), rotation="request", retries=2,
+                 connect_timeout=5, timeout=30, session_ttl=600):
+        if rotation not in GATEWAY_ROTATIONS:
+            raise ValueError(f"Unknown rotation: {rotation}")
+        self.pool = pool
+        self.proxy_filter = proxy_filter or ProxyFilter()
+        self.types = frozenset(types)
+        self.rotation = rotation
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.session_ttl = session_ttl
+        self.requests = 0
+        self.tunnels = 0
+        self.retried = 0
+        self.upstream_failures = 0
+        self.unserved = 0
+        self.opened = 0
+        self.reused = 0
+        self._idle = IdleConnections()
+        self._sessions = {}     # session -> (record, expires)
+        self._clients = set()
+        self._server = None
+        self._sweeper = None
+
+    async def start(self, host="127.0.0.1", port=8888):
+        """Listen on host:port (0 picks a free port); returns the asyncio server"""
+        self._server = await asyncio.start_server(self._handle, host, port, backlog=1024)
+        self._sweeper = asyncio.create_task(self._sweep())
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info("Rotating proxy gateway at http://%s:%d", host, port)
+        return self._server
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._sweeper.cancel()
+        self._server.close()
+        for writer in list(self._clients):
+            writer.transport.abort()
+        await self._server.wait_closed()
+        self._idle.close()
+        self._server = None
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'tunnels': self.tunnels,
+            'retries': self.retried,
+            'upstream_failures': self.upstream_failures,
+            'unserved': self.unserved,
+            'connections_opened': self.opened,
+            'connections_reused': self.reused,
+            'idle_connections': len(self._idle),
+            'sessions': len(self._sessions),
+        }
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self._idle.sweep()
+            now = time.monotonic()
+            for session, (_, expires) in list(self._sessions.items()):
+                if expires <= now:
+                    del self._sessions[session]
+
+    # Upstream choice
+    def _choose(self, session, types, tried):
+        """The session's proxy if still usable, else a fresh pick outside tried"""
+        now = time.monotonic()
+        if session is not None:
+            pinned = self._sessions.get(session)
+            if pinned is not None:
+                record, expires = pinned
+                if (expires > now and record.addr not in tried
+                        and (not types or record.type in types)
+                        and self.pool.available(record.addr)):
+                    self._sessions[session] = (record, now + self.session_ttl)
+                    return record
+        for record in self.pool.pick(self.proxy_filter, types, len(tried) + 1):
+            if record.addr not in tried:
+                if session is not None:
+                    self._sessions[session] = (record, now + self.session_ttl)
+                return record
+        return None
+
+    def _failed(self, record, session, tried, error):
+        tried.add(record.addr)
+        self.upstream_failures += 1
+        self.pool.report(record.addr, False)
+        if session is not None and self._sessions.get(session, (None,))[0] is record:
+            del self._sessions[session]
+        logger.debug("Upstream %s failed: %r", record.address, error)
+
+    # Client connections
+    async def _handle(self, reader, writer):
+        self._clients.add(writer)
+        # Session of rotation="session" requests that do not name one
+        connection = object()
+        try:
+            while True:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), CLIENT_IDLE)
+                request_line, headers = parse_head(head)
+                try:
+                    method, target, version = request_line.split(' ')
+                except ValueError:
+                    await self._reply(writer, 400, "Malformed request line")
+                    return
+                session = session_name(headers)
+                if session is None and self.rotation == "session":
+                    session = connection
+                if method == 'CONNECT':
+                    await self._tunnel(target, reader, writer, session)
+                    return
+                if not await self._forward(method, target, version, headers, reader, writer, session):
+                    return
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            self._sessions.pop(connection, None)
+            writer.close()
+
+    async def _reply(self, writer, status, message, keep_alive=False):
+        body = f"{message}\n".encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                     f"Content-Type: text/plain; charset=utf-8\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                     + body)
+        await writer.drain()
+
+    async def _tunnel(self, target, reader, writer, session):
+        """Answer CONNECT target with a tunnel through the first upstream that opens one"""
+        self.tunnels += 1
+        try:
+            host, port = split_target(target, 443)
+        except ValueError as e:
+            await self._reply(writer, 400, str(e))
+            return
+        types = self.types
+        tried = set()
+        for attempt in range(self.retries + 1):
+            record = self._choose(session, types, tried)
+            if record is None:
+                break
+            if attempt:
+                self.retried += 1
+            started = time.monotonic()
+            try:
+                up_reader, up_writer = await asyncio.wait_for(
+                    _open_tunnel(record, host, port, self.connect_timeout), self.timeout)
+            except UPSTREAM_ERRORS as e:
+                self._failed(record, session, tried, e)
+                continue
+            self.pool.report(record.addr, True, (time.monotonic() - started) * 1000)
+            writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+            try:
+                await asyncio.gather(_pipe(reader, up_writer), _pipe(up_reader, writer))
+            finally:
+                up_writer.transport.abort()
+            return
+        self.unserved += 1
+        await self._reply(writer, 502, "No upstream proxy could open the tunnel")
+
+    async def _forward(self, method, target, version, headers, reader, writer, session):
+        """Send one plain request upstream; returns whether the client connection stays open"""
+        self.requests += 1
+        parts = urlsplit(target)
+        try:
+            if parts.scheme != 'http' or not parts.hostname:
+                raise ValueError("Only absolute http:// URLs and CONNECT are proxied")
+            host, port = parts.hostname, parts.port or 80
+            if (header(headers, 'expect') or '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            body = await read_body(reader, headers)
+        except ValueError as e:
+            await self._reply(writer, 400, str(e))
+            return False
+        client_keep_alive = keeps_alive(version, headers)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        lines = forwardable(headers)
+        if header(lines, 'host') is None:
+            lines.insert(0, ('Host', parts.netloc))
+        if body or method in ('POST', 'PUT', 'PATCH'):
+            lines.append(('Content-Length', str(len(body))))
+        lines.append(('Connection', 'keep-alive'))
+        fields = ''.join(f"{name}: {value}\r\n" for name, value in lines)
+
+        types = self.types
+        tried = set()
+        for attempt in range(self.retries + 1):
+            record = self._choose(session, types, tried)
+            if record is None:
+                break
+            if attempt:
+                self.retried += 1
+            direct = record.type in DIRECT_TYPES
+            # HTTP proxies take the absolute URL; tunnels carry the request as the origin sees it
+            request = (f"{method} {target if direct else path} HTTP/1.1\r\n{fields}\r\n"
+                       .encode('latin-1') + body)
+            key = (record.addr,) if direct else (record.addr, host, port)
+            started = time.monotonic()
+            try:
+                up_reader, up_writer, status, head = await self._exchange(record, key, host, port,
+                                                                         request)
+            except UPSTREAM_ERRORS as e:
+                self._failed(record, session, tried, e)
+                continue
+            self.pool.report(record.addr, True, (time.monotonic() - started) * 1000)
+            return await self._respond(method, status, head, up_reader, up_writer, key, writer,
+                                       client_keep_alive)
+        self.unserved += 1
+        await self._reply(writer, 502, "No upstream proxy could complete the request",
+                          client_keep_alive)
+        return client_keep_alive
+
+    async def _exchange(self, record, key, host, port, request):
+        """Send request on an idle or new connection; returns (reader, writer, status, head)"""
+        idle = self._idle.get(key)
+        if idle is not None:
+            reader, writer = idle
+            try:
+                status, head = await self._send(reader, writer, request)
+                self.reused += 1
+                return reader, writer, status, head
+            except (OSError, asyncio.IncompleteReadError):
+                # Closed by the upstream while idle; not a failure of the proxy
+                writer.transport.abort()
+            except BaseException:
+                writer.transport.abort()
+                raise
+
+        if record.type not in DIRECT_TYPES:
+            opening = _open_tunnel(record, host, port, self.connect_timeout)
+        else:
+            opening = asyncio.wait_for(asyncio.open_connection(record.ip, record.port),
+                                       self.connect_timeout)
+        reader, writer = await asyncio.wait_for(opening, self.timeout)
+        self.opened += 1
+        try:
+            status, head = await self._send(reader, writer, request)
+        except BaseException:
+            writer.transport.abort()
+            raise
+        return reader, writer, status, head
+
+    async def _send(self, reader, writer, request):
+        """Write request and read the final response head; returns (status, head)"""
+        writer.write(request)
+        await writer.drain()
+        while True:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.timeout)
+            status = _status_code(head)
+            if status == 407:
+                raise ProxyProtocolError("Upstream proxy wants authentication")
+            if not 100 <= status < 200:
+                return status, head
+
+    async def _respond(self, method, status, head, up_reader, up_writer, key, writer, client_keep_alive):
+        """Relay the response to the client and keep the upstream connection if possible"""
+        status_line, headers = parse_head(head)
+        try:
+            length = response_length(method, status, headers)
+        except ValueError:
+            length = None
+        keep_alive = client_keep_alive and length is not None
+        lines = [status_line] + [f"{name}: {value}" for name, value in headers
+                                 if name.lower() not in ('connection', 'proxy-connection', 'keep-alive')]
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        try:
+            if length == "chunked":
+                await _relay_chunked(up_reader, writer, self.timeout)
+            elif length is None:
+                await _relay_until_eof(up_reader, writer, self.timeout)
+            else:
+                await _relay_exact(up_reader, writer, length, self.timeout)
+        except RELAY_ERRORS:
+            up_writer.transport.abort()
+            return False
+        if length is not None and keeps_alive(status_line.split(' ', 1)[0], headers):
+            self._idle.put(key, up_reader, up_writer)
+        else:
+            up_writer.transport.abort()
+        return keep_alive
+
+
+def main(argv=None):
+    from .store import ProxyStore
+
+    parser = argparse.ArgumentParser(prog="python -m proxyscraper.gateway",
+                                     description="Rotating HTTP proxy through the proxies stored "
+                                                 "in the database")
+    parser.add_argument("--db", default="proxy_db.sqlite", help="SQLite database (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8888, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--rotation", default="request", choices=GATEWAY_ROTATIONS,
+                        help="new upstream for every request, or per session (default: %(default)s)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="other upstreams to try when one fails (default: %(default)s)")
+    parser.add_argument("--session-ttl", type=float, default=600,
+                        help="seconds a session keeps its upstream after its last request "
+                             "(default: %(default)s)")
+    parser.add_argument("--type", default="",
+                        help="only use these proxy types, comma separated (e.g. socks5,https)")
+    parser.add_argument("--country", default="", help="only use these countries, comma separated")
+    parser.add_argument("--anonymity", default="all",
+                        help="only use these anonymity levels, comma separated")
+    parser.add_argument("--max-latency", type=int, help="maximum response time in ms")
+    parser.add_argument("--reload", type=float, default=60,
+                        help="seconds between database reloads (default: %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        proxy_filter = ProxyFilter.parse(args.country, args.anonymity, "all", None, args.max_latency)
+    except ValueError as e:
+        parser.error(str(e))
+    types = frozenset(value.upper() for value in args.type.replace(',', ' ').split())
+
+    async def serve():
+        store = ProxyStore(args.db)
+        pool = WeightedPool()
+        pool.on_report = lambda addr, ok: None if ok else store.record_failure(addr)
+        gateway = ProxyGateway(pool, proxy_filter, types, args.rotation, args.retries,
+                               session_ttl=args.session_ttl)
+        await gateway.start(args.host, args.port)
+        try:
+            await follow_store(pool, store, args.reload)
+        finally:
+            await gateway.close()
+            store.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
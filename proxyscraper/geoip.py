@@ -0,0 +1,214 @@
+"""Offline IPv4 -> country lookup from a memory-mapped range file
+
+The database is built once from a CSV of IP ranges (DB-IP / IP2Location
+"lite" style: start, end, country code, extra columns ignored; addresses
+dotted or as integers). The ranges are flattened into one sorted array of
+range starts that covers the whole address space, plus an index of where
+each /16 prefix begins in it, so a lookup is a binary search over the few
+ranges of one prefix. Opening the file only maps it; nothing is parsed.
+
+File layout (little endian):
+    8s  magic
+    I   range count (n)
+    I   country count (m)
+    2s  * m   country codes, padded to 4 bytes
+    I   * 65537  prefix index: range holding the first address of each /16
+    I   * n   range starts, ascending, starts[0] == 0
+    H   * n   country index of each range
+"""
+import bisect
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from .export import FILE_MODE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PXGEO\x00\x02\x00'
+PREFIXES = 1 << 16
+HEADER = struct.Struct('<8sII')
+UNKNOWN_COUNTRY = "??"
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "geoip_sample.csv")
+
+
+def _ip_value(text):
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    a, b, c, d = (int(octet) for octet in text.split('.'))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def read_ranges(csv_path):
+    """Yield (start, end, country) for every IPv4 row of a range CSV"""
+    with open(csv_path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 3 or row[0].startswith('#') or ':' in row[0]:
+                continue  # comments, short rows and IPv6 ranges
+            try:
+                start, end = _ip_value(row[0]), _ip_value(row[1])
+            except ValueError:
+                continue  # header line
+            country = row[2].strip().upper()
+            if len(country) != 2 or country == "-":
+                country = UNKNOWN_COUNTRY
+            yield start, end, country
+
+
+def build_database(csv_path, out_path):
+    """Compile a range CSV into out_path (written atomically); returns the range count"""
+    countries = [UNKNOWN_COUNTRY]
+    country_index = {UNKNOWN_COUNTRY: 0}
+    starts = array('I')
+    codes = array('H')
+
+    def add(start, country):
+        code = country_index.get(country)
+        if code is None:
+            code = country_index[country] = len(countries)
+            countries.append(country)
+        if codes and codes[-1] == code:
+            return  # adjacent range of the same country
+        starts.append(start)
+        codes.append(code)
+
+    cursor = 0  # first address not covered yet
+    for start, end, country in sorted(read_ranges(csv_path)):
+        if end < cursor or start > end:
+            continue
+        start = max(start, cursor)
+        if start > cursor:
+            add(cursor, UNKNOWN_COUNTRY)
+        add(start, country)
+        cursor = end + 1
+    if cursor <= 0xFFFFFFFF:
+        add(cursor, UNKNOWN_COUNTRY)
+
+    prefix_index = array('I', (bisect.bisect_right(starts, prefix << 16) - 1
+                               for prefix in range(PREFIXES)))
+    prefix_index.append(len(starts) - 1)
+
+    if sys.byteorder != 'little':
+        starts.byteswap()
+        codes.byteswap()
+        prefix_index.byteswap()
+    table = b''.join(country.encode('ascii') for country in countries)
+    table += b'\x00' * (-len(table) % 4)
+
+    directory = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.geoip-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(starts), len(countries)))
+            f.write(table)
+            f.write(prefix_index.tobytes())
+            f.write(starts.tobytes())
+            f.write(codes.tobytes())
+            os.fchmod(f.fileno(), FILE_MODE)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(starts)
+
+
+class GeoDatabase:
+    """Read-only view of a compiled database; lookups take 32-bit address values"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, country_count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a GeoIP range database")
+
+        offset = HEADER.size
+        table = self._map[offset:offset + 2 * country_count].decode('ascii')
+        self.countries = [table[i:i + 2] for i in range(0, len(table), 2)]
+        offset += 2 * country_count + (-2 * country_count % 4)
+
+        view = memoryview(self._map)
+        sections = []
+        for typecode, size, length in (('I', 4, PREFIXES + 1), ('I', 4, count), ('H', 2, count)):
+            section = view[offset:offset + size * length]
+            if sys.byteorder == 'little':
+                sections.append(section.cast(typecode))
+            else:
+                swapped = array(typecode, section.tobytes())
+                swapped.byteswap()
+                sections.append(swapped)
+            offset += size * length
+        self._prefixes, self._starts, self._codes = sections
+        view.release()
+
+    @classmethod
+    def open(cls, path, csv_path=None):
+        """Open path, (re)building it from csv_path first if it is missing or older
+
+        Returns None, with a warning, when there is no usable database.
+        """
+        try:
+            stale = csv_path and (not os.path.exists(path)
+                                  or os.path.getmtime(path) < os.path.getmtime(csv_path))
+            if stale:
+                count = build_database(csv_path, path)
+                logger.info("Built GeoIP database %s from %s (%d ranges)", path, csv_path, count)
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning("No GeoIP database, countries will be unknown: %s", e)
+            return None
+
+    def __len__(self):
+        return len(self._starts)
+
+    def country(self, ip_value):
+        """Country code of one address, UNKNOWN_COUNTRY if not covered"""
+        prefix = ip_value >> 16
+        index = bisect.bisect_right(self._starts, ip_value, self._prefixes[prefix],
+                                    self._prefixes[prefix + 1] + 1)
+        return self.countries[self._codes[index - 1]]
+
+    def lookup_many(self, ip_values):
+        """Country codes of a batch of addresses, in input order"""
+        search = bisect.bisect_right
+        starts = self._starts
+        prefixes = self._prefixes
+        codes = self._codes
+        countries = self.countries
+        return [countries[codes[search(starts, ip, prefixes[ip >> 16], prefixes[(ip >> 16) + 1] + 1) - 1]]
+                for ip in ip_values]
+
+    def close(self):
+        for section in (self._prefixes, self._starts, self._codes):
+            if isinstance(section, memoryview):
+                section.release()
+        self._map.close()
+
+
+def main(argv=None):
+    """python -m proxyscraper.geoip build RANGES.csv OUT.bin | lookup DB.bin IP..."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 3 and argv[0] == "build":
+        print(f"{build_database(argv[1], argv[2])} ranges written to {argv[2]}")
+    elif len(argv) >= 2 and argv[0] == "lookup":
+        database = GeoDatabase(argv[1])
+        ips = argv[2:] or [line.strip() for line in sys.stdin if line.strip()]
+        for ip, country in zip(ips, database.lookup_many([_ip_value(ip.split(':')[0]) for ip in ips])):
+            print(f"{ip}\t{country}")
+        database.close()
+    else:
+        print(main.__doc__, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
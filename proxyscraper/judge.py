@@ -0,0 +1,72 @@
+"""Local proxy judge: python -m proxyscraper.judge [--host H] [--port P]
+
+A minimal httpbin-compatible echo server. /get, /ip and /headers answer
+with the JSON the checker parses: the connecting address as "origin" and
+(except /ip) the request headers exactly as received. Point
+EngineConfig.judge_urls at it to check and benchmark without the network.
+"""
+import argparse
+import asyncio
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+def _echo(include_origin=True, include_headers=True):
+    async def handler(request):
+        data = {}
+        if include_headers:
+            data['headers'] = dict(request.headers)
+        if include_origin:
+            data['origin'] = request.remote or ""
+        return web.json_response(data)
+    return handler
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_get('/get', _echo())
+    app.router.add_get('/ip', _echo(include_headers=False))
+    app.router.add_get('/headers', _echo(include_origin=False))
+    return app
+
+
+async def start_judge(host="127.0.0.1", port=0):
+    """Serve the judge on the running loop; returns (runner, judge URL)
+
+    port=0 picks a free port. Call `await runner.cleanup()` to stop it.
+    """
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/get"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m proxyscraper.judge",
+                                     description="Serve a local header-echo proxy judge")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8089, help="port to listen on (default: %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    async def serve():
+        runner, url = await start_judge(args.host, args.port)
+        logger.info("Judge listening at %s", url)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Pool of judge endpoints with health tracking and failover
+
+Every judge is probed directly (without a proxy) when a check stage starts
+and every probe_interval seconds after that. A probe measures the judge's
+own latency, which is later subtracted from proxy timings, and reports
+our egress address. Checks go to the available judge with the lowest
+expected wait, (in flight + 1) x latency.
+
+A judge's circuit opens, taking it out of rotation, when a direct probe
+fails or when proxied checks keep getting rate limited (HTTP 429). It
+stays open for a cooldown that doubles on every repeated opening, then
+lets traffic through again; the next success closes it.
+"""
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean the judge, not the proxy, refused the request
+JUDGE_ERROR_STATUSES = frozenset((429,))
+
+# Assumed latency of a judge that has not answered a probe yet (ms)
+UNKNOWN_LATENCY = 1000
+
+
+class Judge:
+    __slots__ = ('url', 'in_flight', 'latency', 'requests', 'errors', 'consecutive_errors',
+                 'open_until', 'cooldown', 'origin')
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.origin = None
+
+    def available(self, now):
+        return self.open_until <= now
+
+    @property
+    def latency_ms(self):
+        return int(self.latency) if self.latency is not None else 0
+
+    def __repr__(self):
+        return f"Judge({self.url}, {self.latency_ms}ms, {self.errors}/{self.requests} errors)"
+
+
+class JudgePool:
+    """Load-balanced judges with per-judge latency, errors and circuit breaking"""
+
+    def __init__(self, urls, failure_threshold=5, cooldown=30.0, max_cooldown=600.0,
+                 probe_interval=60.0, probe_timeout=10.0):
+        if not urls:
+            raise ValueError("At least one judge URL is required")
+        self.judges = [Judge(url) for url in dict.fromkeys(urls)]
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+
+    def acquire(self, exclude=None):
+        """Pick the judge for one check, preferably not exclude; hand it back with release()"""
+        now = time.monotonic()
+        candidates = [judge for judge in self.judges
+                      if judge.available(now) and judge is not exclude]
+        if not candidates:
+            # Every circuit is open: fail over to the one that reopens first
+            candidates = [min(self.judges, key=lambda judge: judge.open_until)]
+        judge = min(candidates, key=lambda judge: (judge.in_flight + 1)
+                    * (judge.latency if judge.latency is not None else UNKNOWN_LATENCY))
+        judge.in_flight += 1
+        return judge
+
+    def release(self, judge, status=None):
+        """Return a judge after a proxied check; status is the HTTP status, if any arrived"""
+        judge.in_flight -= 1
+        if status is None:
+            return  # the proxy failed before the judge answered
+        judge.requests += 1
+        if status in JUDGE_ERROR_STATUSES:
+            self._failure(judge, threshold=self.failure_threshold, reason=f"HTTP {status}")
+        elif status == 200:
+            self._success(judge)
+
+    def origins(self):
+        """Egress addresses reported by direct probes"""
+        return {judge.origin for judge in self.judges if judge.origin}
+
+    async def probe_all(self, parse_origin):
+        """Probe every judge directly; parse_origin(body) returns the origin IPs of a response"""
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(self._probe(session, judge, parse_origin) for judge in self.judges))
+
+    async def run(self, parse_origin):
+        """Re-probe the judges every probe_interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            await self.probe_all(parse_origin)
+
+    async def _probe(self, session, judge, parse_origin):
+        started = time.monotonic()
+        try:
+            async with session.get(judge.url,
+                                   timeout=aiohttp.ClientTimeout(total=self.probe_timeout)) as response:
+                body = await response.read()
+                status = response.status
+        except Exception as e:
+            self._failure(judge, threshold=1, reason=str(e) or type(e).__name__)
+            return
+        if status != 200:
+            self._failure(judge, threshold=1, reason=f"HTTP {status}")
+            return
+        elapsed = (time.monotonic() - started) * 1000
+        judge.latency = elapsed if judge.latency is None else judge.latency * 0.7 + elapsed * 0.3
+        origins = parse_origin(body)
+        judge.origin = next(iter(origins)) if len(origins) == 1 else None
+        self._success(judge)
+
+    def _success(self, judge):
+        if judge.open_until:
+            logger.info("Judge %s is healthy again", judge.url)
+        judge.consecutive_errors = 0
+        judge.open_until = 0.0
+        judge.cooldown = 0.0
+
+    def _failure(self, judge, threshold, reason):
+        judge.errors += 1
+        judge.consecutive_errors += 1
+        if judge.consecutive_errors < threshold or not judge.available(time.monotonic()):
+            return
+        judge.cooldown = min(self.max_cooldown, judge.cooldown * 2 or self.base_cooldown)
+        judge.open_until = time.monotonic() + judge.cooldown
+        judge.consecutive_errors = 0
+        logger.warning("Judge %s taken out of rotation for %.0fs: %s",
+                       judge.url, judge.cooldown, reason)
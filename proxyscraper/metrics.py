@@ -0,0 +1,254 @@
+"""Pipeline counters, latency histograms and gauges, with two exporters
+
+A Metrics object is owned by the engine and only updated from its event
+loop. It can be read from any thread: snapshot() returns plain data for
+JSON, render_prometheus() the Prometheus text exposition format.
+serve_metrics() exposes both over HTTP (/metrics and /metrics.json) and
+write_snapshots() rewrites a JSON file every interval.
+
+Histograms are log-linear (HDR style): exact below 2**PRECISION_BITS,
+then 2**(PRECISION_BITS - 1) buckets per power of two, so any quantile
+is within about 1.6% of the true value whatever the range, in a few
+hundred counters.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+
+from aiohttp import web
+
+from .export import FILE_MODE
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in order:
+#   fetched    sources downloaded (or revalidated from the cache)
+#   parsed     addresses parsed from source lists, duplicates included
+#   deduped    addresses left after de-duplication
+#   checked    checks completed
+#   valid      checks that passed
+#   timed_out  checks or connect probes that timed out
+#   refused    checks or connect probes whose connection was refused
+#   failed     checks that failed any other way
+#   stored     valid proxies committed to the database
+STAGES = ("fetched", "parsed", "deduped", "checked", "valid", "timed_out", "refused", "failed",
+          "stored")
+
+HISTOGRAMS = {
+    'check_latency_ms': "Response time of valid proxies, judge latency excluded",
+    'source_fetch_ms': "Time to download and parse one source",
+    'loop_lag_ms': "Event loop scheduling delay",
+}
+QUANTILES = (0.5, 0.9, 0.99)
+PRECISION_BITS = 7
+PREFIX = "proxyscraper"
+
+
+def failure_stage(error):
+    """Stage a failed check or probe counts under: timed_out, refused or failed"""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timed_out"
+    # aiohttp connection errors wrap the OSError
+    if isinstance(getattr(error, 'os_error', error), ConnectionRefusedError):
+        return "refused"
+    return "failed"
+
+
+class Histogram:
+    """Log-linear histogram of non-negative integers"""
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value):
+        if value < (1 << PRECISION_BITS):
+            return value
+        shift = value.bit_length() - PRECISION_BITS
+        half = 1 << (PRECISION_BITS - 1)
+        return (1 << PRECISION_BITS) + (shift - 1) * half + (value >> shift) - half
+
+    @staticmethod
+    def _value(index):
+        """Midpoint of the values that fall into bucket index"""
+        if index < (1 << PRECISION_BITS):
+            return index
+        half = 1 << (PRECISION_BITS - 1)
+        shift, offset = divmod(index - (1 << PRECISION_BITS), half)
+        shift += 1
+        return ((half + offset) << shift) + ((1 << shift) - 1) // 2
+
+    def record(self, value):
+        value = max(0, int(value))
+        index = self._index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        """Value at fraction of the recorded count, None while empty"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self):
+        data = {'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max}
+        for fraction in QUANTILES:
+            data[f"p{round(fraction * 100)}"] = self.quantile(fraction)
+        return data
+
+
+class Metrics:
+    """Stage counters, histograms and sampled gauges of one engine"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = dict.fromkeys(STAGES, 0)
+        self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        self._gauges = {}
+
+    def inc(self, stage, amount=1):
+        self.counters[stage] += amount
+
+    def observe(self, name, value):
+        self.histograms[name].record(value)
+
+    def set_gauge(self, name, read, **labels):
+        """Report read() as gauge name (with labels) on every export"""
+        self._gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def remove_gauge(self, name, **labels):
+        self._gauges.pop((name, tuple(sorted(labels.items()))), None)
+
+    def _gauge_values(self):
+        values = []
+        for (name, labels), read in list(self._gauges.items()):
+            try:
+                values.append((name, labels, read()))
+            except Exception as e:
+                logger.debug("Gauge %s failed: %s", name, e)
+        return values
+
+    def snapshot(self):
+        """Everything as plain JSON-serialisable data"""
+        gauges = {}
+        for name, labels, value in self._gauge_values():
+            key = name + ''.join(f"[{label}={text}]" for label, text in labels)
+            gauges[key] = value
+        return {
+            'time': time.time(),
+            'uptime': round(time.time() - self.started_at, 3),
+            'counters': dict(self.counters),
+            'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+            'gauges': gauges,
+        }
+
+    def render_prometheus(self):
+        lines = [f"# HELP {PREFIX}_stage_total Items through each pipeline stage",
+                 f"# TYPE {PREFIX}_stage_total counter"]
+        for stage, value in list(self.counters.items()):
+            lines.append(f'{PREFIX}_stage_total{{stage="{stage}"}} {value}')
+
+        for name, histogram in self.histograms.items():
+            metric = f"{PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {HISTOGRAMS[name]}")
+            lines.append(f"# TYPE {metric} summary")
+            for fraction in QUANTILES:
+                value = histogram.quantile(fraction)
+                lines.append(f'{metric}{{quantile="{fraction}"}} {"NaN" if value is None else value}')
+            lines.append(f"{metric}_sum {histogram.total}")
+            lines.append(f"{metric}_count {histogram.count}")
+
+        typed = set()
+        for name, labels, value in sorted(self._gauge_values(), key=lambda item: item[:2]):
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            label_text = ','.join(f'{label}="{text}"' for label, text in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        lines.append(f"# TYPE {PREFIX}_uptime_seconds gauge")
+        lines.append(f"{PREFIX}_uptime_seconds {time.time() - self.started_at:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    async def watch_loop(self, interval=0.5):
+        """Record event loop lag every interval seconds until cancelled"""
+        loop = asyncio.get_running_loop()
+        lag = 0.0
+        self.set_gauge('loop_lag_seconds', lambda: lag)
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            self.observe('loop_lag_ms', lag * 1000)
+
+
+async def serve_metrics(metrics, host="127.0.0.1", port=9464):
+    """Serve /metrics (Prometheus) and /metrics.json on the running loop; returns the runner"""
+    async def prometheus(request):
+        return web.Response(text=metrics.render_prometheus(),
+                            content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def snapshot(request):
+        return web.json_response(metrics.snapshot())
+
+    app = web.Application()
+    app.router.add_get('/metrics', prometheus)
+    app.router.add_get('/metrics.json', snapshot)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics at http://%s:%d/metrics", host, port)
+    return runner
+
+
+def write_snapshot(metrics, path):
+    """Write metrics.snapshot() to path atomically"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.metrics-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(metrics.snapshot(), f)
+            os.fchmod(f.fileno(), FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+async def write_snapshots(metrics, path, interval):
+    """Rewrite the JSON snapshot at path every interval seconds until cancelled"""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(write_snapshot, metrics, path)
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", path, e)
+    finally:
+        # Leave the final numbers behind
+        try:
+            write_snapshot(metrics, path)
+        except OSError:
+            pass
@@ -0,0 +1,392 @@
+"""Weighted proxy pool with O(1) picks, and its local query API
+
+WeightedPool keeps the valid proxies with a weight that favours reliable,
+fast ones. Picks for a filter use a Walker/Vose alias table over the
+matching proxies that are not suspended: one random number, one table
+lookup. Tables are built on the first pick for a filter and, while the
+pool changes or suspensions end, rebuilt at most every rebuild_interval
+seconds (less often for tables that are slow to build). In between,
+removed proxies and proxies suspended after a failure report are skipped
+when picked, and a pick whose draws come up short scans the live
+matches instead, so reports take effect immediately.
+
+serve_pool() exposes a pool over HTTP, on a TCP port and/or a Unix
+socket:
+
+    GET  /proxy?country=US,DE&anonymity=elite&speed=fast&type=socks5
+               &min_latency=&max_latency=800&n=10&format=json|text
+    POST /report?proxy=IP:PORT&ok=0    (or the same fields as a JSON body)
+    GET  /stats
+
+Run `python -m proxyscraper.pool` to serve the proxies stored in the
+database; `python -m proxyscraper --daemon --api-port P` serves the
+daemon's live pool.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from aiohttp import web
+
+from .filters import ProxyFilter
+from .records import parse_address
+
+logger = logging.getLogger(__name__)
+
+# Filters with a cached alias table
+MAX_TABLES = 64
+# Tables are rebuilt no sooner than this many times their build time, so that a pool
+# that changes constantly spends at most about 5% of its time rebuilding
+REBUILD_FACTOR = 20
+MAX_PICK = 1000
+
+
+def selection_weight(latency, success):
+    """Relative chance of being picked: reliability squared over latency (ms)"""
+    return success * success * 1000.0 / (latency + 50)
+
+
+class PoolItem:
+    __slots__ = ('record', 'success', 'latency', 'weight', 'suspended_until', 'removed')
+
+    def __init__(self, record, success):
+        self.record = record
+        self.success = success
+        self.latency = record.response_time
+        self.weight = selection_weight(self.latency, success)
+        self.suspended_until = 0.0
+        self.removed = False
+
+
+class AliasTable:
+    """Walker/Vose alias table: weighted sampling in O(1) after an O(n) build"""
+    __slots__ = ('items', 'prob', 'alias', 'version', 'built_at', 'build_time', 'expires')
+
+    def __init__(self, items, version, expires=float('inf')):
+        started = time.monotonic()
+        self.items = items
+        self.version = version
+        # When the first proxy left out for being suspended comes back
+        self.expires = expires
+        count = len(items)
+        total = sum(item.weight for item in items)
+        self.prob = array('d', bytes(8 * count))
+        self.alias = array('L', bytes(array('L').itemsize * count))
+        if not count:
+            self.built_at = started
+            self.build_time = 0.0
+            return
+        scaled = [item.weight * count / total if total > 0 else 1.0 for item in items]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        for i in small + large:
+            self.prob[i] = 1.0
+        self.built_at = time.monotonic()
+        self.build_time = self.built_at - started
+
+    def __len__(self):
+        return len(self.items)
+
+    def pick(self, rand=random.random):
+        spot = rand() * len(self.items)
+        index = int(spot)
+        if spot - index >= self.prob[index]:
+            index = self.alias[index]
+        return self.items[index]
+
+
+class WeightedPool:
+    """Valid proxies keyed by packed address, sampled by selection_weight"""
+
+    def __init__(self, rebuild_interval=1.0, suspend=60.0):
+        self.rebuild_interval = rebuild_interval
+        self.suspend = suspend
+        self.items = {}
+        self.version = 0
+        self.picks = 0
+        self.reports = 0
+        # Called with (addr, ok) for every report, e.g. to schedule a re-check
+        self.on_report = None
+        self._tables = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def upsert(self, record, success=1.0):
+        item = self.items.get(record.addr)
+        if item is None:
+            self.items[record.addr] = PoolItem(record, success)
+        else:
+            item.record = record
+            item.success = success
+            item.latency = record.response_time
+            item.weight = selection_weight(item.latency, success)
+        self.version += 1
+
+    def remove(self, addr):
+        item = self.items.pop(addr, None)
+        if item is not None:
+            item.removed = True
+            self.version += 1
+
+    def replace(self, records):
+        """Make records the pool's proxies, keeping the feedback of those already in it
+
+        Proxies still listed keep their success score and suspension (and
+        their measured latency, unless the record comes from a newer check);
+        new ones are added and the rest removed.
+        """
+        old = self.items
+        items = {}
+        for record in records:
+            item = old.pop(record.addr, None)
+            if item is None:
+                item = PoolItem(record, 1.0)
+            else:
+                if record.last_checked != item.record.last_checked:
+                    item.latency = record.response_time
+                item.record = record
+                item.weight = selection_weight(item.latency, item.success)
+            items[record.addr] = item
+        for item in old.values():
+            item.removed = True
+        self.items = items
+        self.version += 1
+
+    def on_daemon_event(self, event, entry):
+        """ProxyDaemon listener keeping the pool in step with the daemon's"""
+        if event == "evicted":
+            self.remove(entry.record.addr)
+        else:
+            self.upsert(entry.record, entry.success)
+
+    def available(self, addr):
+        """Whether addr is in the pool and not suspended"""
+        item = self.items.get(addr)
+        return item is not None and item.suspended_until <= time.monotonic()
+
+    def report(self, addr, ok, latency=None):
+        """Feedback from a caller that used addr (latency in ms, if measured)
+
+        A failure suspends the proxy right away.
+        """
+        self.reports += 1
+        item = self.items.get(addr)
+        if item is not None:
+            if ok:
+                item.success = item.success * 0.8 + 0.2
+                item.suspended_until = 0.0
+            else:
+                item.success *= 0.8
+                item.suspended_until = time.monotonic() + self.suspend
+            if latency is not None:
+                item.latency = item.latency * 0.7 + latency * 0.3
+            item.weight = selection_weight(item.latency, item.success)
+            self.version += 1
+        if self.on_report is not None:
+            self.on_report(addr, ok)
+
+    def pick(self, proxy_filter=None, types=frozenset(), count=1):
+        """Up to count distinct proxies matching the filter and types, heavier ones more likely"""
+        proxy_filter = proxy_filter or ProxyFilter()
+        table = self._table(proxy_filter, types)
+        if not len(table):
+            return []
+        now = time.monotonic()
+        # Proxies re-checked since the table was built may no longer match
+        recheck = table.version != self.version
+        current = not recheck and now < table.expires
+        picked = {}
+        for _ in range(count * 4 + 8):
+            item = table.pick()
+            if item.removed or item.suspended_until > now:
+                continue
+            if recheck and not proxy_filter.matches(item.record):
+                continue
+            picked[item.record.addr] = item.record
+            if len(picked) >= count:
+                break
+        if len(picked) < count:
+            # The draws came up short: fall back to every live match, best first. A
+            # current table holds exactly those; otherwise the whole pool is scanned.
+            candidates = table.items if current else self._matching(proxy_filter, types)
+            live = sorted((item for item in candidates
+                           if not item.removed and item.suspended_until <= now
+                           and proxy_filter.matches(item.record)),
+                          key=lambda item: -item.weight)
+            for item in live:
+                picked.setdefault(item.record.addr, item.record)
+                if len(picked) >= count:
+                    break
+        self.picks += len(picked)
+        return list(picked.values())
+
+    def _table(self, proxy_filter, types):
+        key = (proxy_filter, types)
+        table = self._tables.get(key)
+        now = time.monotonic()
+        if table is not None:
+            self._tables.move_to_end(key)
+            stale = table.version != self.version or now >= table.expires
+            wait = max(self.rebuild_interval, table.build_time * REBUILD_FACTOR)
+            if not stale or now - table.built_at < wait:
+                return table
+        # Suspended proxies are left out until their suspension ends
+        live = []
+        expires = float('inf')
+        for item in self._matching(proxy_filter, types):
+            if item.suspended_until <= now:
+                live.append(item)
+            else:
+                expires = min(expires, item.suspended_until)
+        table = self._tables[key] = AliasTable(live, self.version, expires)
+        if len(self._tables) > MAX_TABLES:
+            self._tables.popitem(last=False)
+        return table
+
+    def _matching(self, proxy_filter, types):
+        items = list(self.items.values())
+        if not proxy_filter.is_empty():
+            items = [item for item in items if proxy_filter.matches(item.record)]
+        if types:
+            items = [item for item in items if item.record.type in types]
+        return items
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'size': len(self.items),
+            'suspended': sum(1 for item in self.items.values() if item.suspended_until > now),
+            'picks': self.picks,
+            'reports': self.reports,
+            'tables': len(self._tables),
+        }
+
+
+def _query_filter(query):
+    """(ProxyFilter, types, count) from request parameters; raises ValueError"""
+    proxy_filter = ProxyFilter.parse(query.get('country', ''), query.get('anonymity', 'all'),
+                                     query.get('speed', 'all'), query.get('min_latency'),
+                                     query.get('max_latency'))
+    types = frozenset(value.upper() for value in query.get('type', '').replace(',', ' ').split()
+                      if value.lower() != 'all')
+    count = int(query.get('n', 1))
+    if not 1 <= count <= MAX_PICK:
+        raise ValueError(f"n must be between 1 and {MAX_PICK}")
+    return proxy_filter, types, count
+
+
+def create_app(pool):
+    async def get_proxy(request):
+        try:
+            proxy_filter, types, count = _query_filter(request.query)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        records = pool.pick(proxy_filter, types, count)
+        if request.query.get('format') == 'text':
+            return web.Response(text=''.join(f"{record.address}\n" for record in records),
+                                status=200 if records else 404)
+        return web.json_response({'proxies': [{
+            'proxy': record.address,
+            'type': record.type,
+            'country': record.country,
+            'anonymity': record.anonymity,
+            'response_time': record.response_time,
+        } for record in records]}, status=200 if records else 404)
+
+    async def report(request):
+        data = dict(request.query)
+        if request.can_read_body:
+            try:
+                body = await request.json()
+            except ValueError:
+                body = await request.post()
+            if not isinstance(body, Mapping):
+                return web.json_response({'error': "body must be a JSON object or form"}, status=400)
+            data.update(body)
+        try:
+            addr = parse_address(str(data['proxy']))
+        except (KeyError, ValueError):
+            return web.json_response({'error': "proxy must be IP:PORT"}, status=400)
+        ok = str(data.get('ok', '0')).lower() in ('1', 'true', 'yes')
+        pool.report(addr, ok)
+        return web.Response(status=204)
+
+    async def stats(request):
+        return web.json_response(pool.stats())
+
+    app = web.Application()
+    app.router.add_get('/proxy', get_proxy)
+    app.router.add_post('/report', report)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+async def serve_pool(pool, host="127.0.0.1", port=0, unix_socket=""):
+    """Serve pool on the running loop (TCP if port, a Unix socket if unix_socket); returns the runner"""
+    runner = web.AppRunner(create_app(pool), access_log=None)
+    await runner.setup()
+    if port:
+        await web.TCPSite(runner, host, port).start()
+        logger.info("Proxy pool API at http://%s:%d/proxy", host, port)
+    if unix_socket:
+        await web.UnixSite(runner, unix_socket).start()
+        logger.info("Proxy pool API on unix socket %s", unix_socket)
+    return runner
+
+
+async def follow_store(pool, store, interval):
+    """Merge the store's last-known-good proxies into pool every interval seconds until cancelled"""
+    while True:
+        records = await asyncio.to_thread(
+            lambda: [record for batch in store.known_good() for record in batch])
+        pool.replace(records)
+        logger.info("Serving %d proxies from %s", len(pool), store.path)
+        await asyncio.sleep(interval)
+
+
+def main(argv=None):
+    from .store import ProxyStore
+
+    parser = argparse.ArgumentParser(prog="python -m proxyscraper.pool",
+                                     description="Serve the proxies stored in the database")
+    parser.add_argument("--db", default="proxy_db.sqlite", help="SQLite database (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8899, help="TCP port, 0 for none (default: %(default)s)")
+    parser.add_argument("--socket", default="", help="also listen on this Unix socket")
+    parser.add_argument("--reload", type=float, default=60,
+                        help="seconds between database reloads (default: %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    async def serve():
+        store = ProxyStore(args.db)
+        pool = WeightedPool()
+        # Suspended proxies are also reported to the database as failures
+        pool.on_report = lambda addr, ok: None if ok else store.record_failure(addr)
+        runner = await serve_pool(pool, args.host, args.port, args.socket)
+        try:
+            await follow_store(pool, store, args.reload)
+        finally:
+            await runner.cleanup()
+            store.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Raw asyncio proxy handshakes and protocol detection
+
+Tunnels are opened with plain asyncio streams: SOCKS4a, SOCKS5 (no
+authentication) and HTTP CONNECT. detect_protocol classifies an address
+from the first bytes it answers to a single probe.
+"""
+import asyncio
+import ipaddress
+import ssl
+import struct
+from urllib.parse import urlsplit
+
+PROTOCOLS = ("http", "https", "socks4", "socks5")
+
+# SOCKS5 greeting offering "no authentication", followed by an empty HTTP
+# request terminator so HTTP proxies answer instead of waiting for headers.
+DETECT_PROBE = b'\x05\x01\x00\r\n\r\n'
+MAX_RESPONSE_BYTES = 64 * 1024
+
+
+class ProxyProtocolError(Exception):
+    """The proxy answered, but not with a usable handshake"""
+
+
+async def detect_protocol(ip, port, connect_timeout, read_timeout):
+    """Return "socks5", "socks4", "http" or None after one probe on one connection
+
+    Connection errors and timeouts propagate, so callers can tell an
+    unreachable address from one that speaks no known protocol.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), connect_timeout)
+    try:
+        writer.write(DETECT_PROBE)
+        await writer.drain()
+        head = await asyncio.wait_for(reader.read(8), read_timeout)
+    finally:
+        writer.transport.abort()
+    return classify_response(head)
+
+
+def classify_response(head):
+    """Protocol implied by the first bytes answered to DETECT_PROBE"""
+    if len(head) >= 2 and head[0] == 0x05:
+        # 0xFF means every offered auth method was refused - unusable without credentials
+        return "socks5" if head[1] == 0x00 else None
+    if head.startswith(b'HTTP/'):
+        return "http"
+    if len(head) >= 2 and head[0] == 0x00 and 0x5A <= head[1] <= 0x5D:
+        return "socks4"
+    return None
+
+
+async def socks5_handshake(reader, writer, host, port):
+    writer.write(b'\x05\x01\x00')
+    reply = await reader.readexactly(2)
+    if reply != b'\x05\x00':
+        raise ProxyProtocolError(f"SOCKS5 greeting refused: {reply!r}")
+
+    writer.write(b'\x05\x01\x00' + _socks5_address(host) + struct.pack('>H', port))
+    reply = await reader.readexactly(4)
+    if reply[0] != 0x05 or reply[1] != 0x00:
+        raise ProxyProtocolError(f"SOCKS5 connect failed with code {reply[1]}")
+    # Skip the bound address
+    if reply[3] == 0x01:
+        await reader.readexactly(4 + 2)
+    elif reply[3] == 0x04:
+        await reader.readexactly(16 + 2)
+    elif reply[3] == 0x03:
+        length = (await reader.readexactly(1))[0]
+        await reader.readexactly(length + 2)
+    else:
+        raise ProxyProtocolError(f"SOCKS5 reply has unknown address type {reply[3]}")
+
+
+def _socks5_address(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        encoded = host.encode('idna')
+        return b'\x03' + bytes([len(encoded)]) + encoded
+    return (b'\x01' if address.version == 4 else b'\x04') + address.packed
+
+
+async def socks4_handshake(reader, writer, host, port):
+    try:
+        request = b'\x04\x01' + struct.pack('>H', port) + ipaddress.IPv4Address(host).packed + b'\x00'
+    except ValueError:
+        # SOCKS4a: 0.0.0.x tells the proxy to resolve the trailing host name
+        request = (b'\x04\x01' + struct.pack('>H', port) + b'\x00\x00\x00\x01\x00'
+                   + host.encode('idna') + b'\x00')
+    writer.write(request)
+    reply = await reader.readexactly(8)
+    if reply[0] != 0x00 or reply[1] != 0x5A:
+        raise ProxyProtocolError(f"SOCKS4 request rejected with code {reply[1]:#x}")
+
+
+async def http_connect_handshake(reader, writer, host, port):
+    target = f"{host}:{port}"
+    writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode('ascii'))
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = _status_code(head)
+    if status != 200:
+        raise ProxyProtocolError(f"CONNECT answered {status}")
+
+
+HANDSHAKES = {
+    "https": http_connect_handshake,
+    "socks4": socks4_handshake,
+    "socks5": socks5_handshake,
+}
+
+
+async def open_tunnel(protocol, ip, port, host, dest_port, connect_timeout):
+    """Connect to the proxy and open a tunnel to host:dest_port"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), connect_timeout)
+    try:
+        await HANDSHAKES[protocol](reader, writer, host, dest_port)
+    except BaseException:
+        writer.transport.abort()
+        raise
+    return reader, writer
+
+
+async def fetch_through_tunnel(protocol, ip, port, url, connect_timeout, headers=None):
+    """GET url through the proxy; returns (status, response headers, body)"""
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    host = parts.hostname
+    dest_port = parts.port or (443 if secure else 80)
+    reader, writer = await open_tunnel(protocol, ip, port, host, dest_port, connect_timeout)
+    try:
+        if secure:
+            await writer.start_tls(ssl.create_default_context(), server_hostname=host)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close"]
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('ascii'))
+        await writer.drain()
+        return await read_http_response(reader)
+    finally:
+        writer.transport.abort()
+
+
+async def read_http_response(reader):
+    """Read one HTTP/1.x response (bounded to MAX_RESPONSE_BYTES)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = _status_code(head)
+    response_headers = {}
+    for line in head.split(b'\r\n')[1:]:
+        if b':' in line:
+            name, _, value = line.partition(b':')
+            response_headers[name.decode('latin-1').strip().lower()] = value.decode('latin-1').strip()
+
+    length = response_headers.get('content-length')
+    if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = await _read_chunked(reader)
+    elif length is not None and length.isdigit():
+        body = await reader.readexactly(min(int(length), MAX_RESPONSE_BYTES))
+    else:
+        body = await reader.read(MAX_RESPONSE_BYTES)
+    return status, response_headers, body
+
+
+async def _read_chunked(reader):
+    body = b''
+    while len(body) < MAX_RESPONSE_BYTES:
+        size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+        if size == 0:
+            break
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+    return body
+
+
+def _status_code(head):
+    parts = head.split(b' ', 2)
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/') or not parts[1].isdigit():
+        raise ProxyProtocolError(f"Not an HTTP response: {head[:32]!r}")
+    return int(parts[1])
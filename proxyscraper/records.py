@@ -0,0 +1,219 @@
+"""Compact proxy records
+
+An IPv4 address and port are packed into one 48-bit integer
+(ip << 16 | port). Validated proxies are __slots__ records whose
+repeated string fields are stored as small codes from a CodeTable, with
+the check time kept as a float timestamp.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+def pack_address(ip, port):
+    """Pack a dotted IPv4 address and a port into one int; ValueError if out of range"""
+    a, b, c, d = (int(octet) for octet in ip.split('.'))
+    port = int(port)
+    if max(a, b, c, d) > 255 or not 0 < port <= 0xFFFF:
+        raise ValueError(f"Invalid proxy address {ip}:{port}")
+    return (a << 40) | (b << 32) | (c << 24) | (d << 16) | port
+
+
+def unpack_address(addr):
+    """Return (ip, port) for a packed address"""
+    ip = addr >> 16
+    return f"{ip >> 24}.{(ip >> 16) & 255}.{(ip >> 8) & 255}.{ip & 255}", addr & 0xFFFF
+
+
+def parse_address(text):
+    """Pack an "ip:port" string"""
+    ip, port = text.split(':')
+    return pack_address(ip, port)
+
+
+def format_address(addr):
+    ip, port = unpack_address(addr)
+    return f"{ip}:{port}"
+
+
+def address_array(addresses=()):
+    """Unsigned 64-bit array of packed addresses"""
+    return array('Q', addresses)
+
+
+ADDRESS_BUCKETS = 1 << 16
+
+
+class AddressSet:
+    """Set of packed addresses kept as sorted array('Q') buckets
+
+    Costs about 8 bytes per address where a set of ints costs about 60, for
+    de-duplicating harvests of millions of addresses. Addresses are spread
+    over the buckets by their low IP bits and port, so buckets stay short
+    and an insert moves little memory.
+    """
+    __slots__ = ('_buckets', '_count')
+
+    def __init__(self):
+        self._buckets = [None] * ADDRESS_BUCKETS
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, addr):
+        bucket = self._buckets[(addr ^ (addr >> 16)) & (ADDRESS_BUCKETS - 1)]
+        if bucket is None:
+            return False
+        index = bisect_left(bucket, addr)
+        return index < len(bucket) and bucket[index] == addr
+
+    def add(self, addr):
+        """Add addr; returns whether it was new"""
+        return bool(self.add_new((addr,)))
+
+    def add_new(self, addresses):
+        """Add every address; returns the ones that were not in the set yet, in order"""
+        buckets = self._buckets
+        mask = ADDRESS_BUCKETS - 1
+        new = []
+        for addr in addresses:
+            key = (addr ^ (addr >> 16)) & mask
+            bucket = buckets[key]
+            if bucket is None:
+                buckets[key] = address_array((addr,))
+            else:
+                index = bisect_left(bucket, addr)
+                if index < len(bucket) and bucket[index] == addr:
+                    continue
+                bucket.insert(index, addr)
+            new.append(addr)
+        self._count += len(new)
+        return new
+
+    def pop_array(self):
+        """The addresses as one address_array, emptying the set
+
+        Each bucket is freed as soon as it is copied, so the addresses are
+        never held twice.
+        """
+        addresses = address_array()
+        buckets = self._buckets
+        for key in range(ADDRESS_BUCKETS):
+            if buckets[key] is not None:
+                addresses.extend(buckets[key])
+                buckets[key] = None
+        self._count = 0
+        return addresses
+
+
+class CodeTable:
+    """Interns strings as small integer codes"""
+
+    def __init__(self, values=()):
+        self._lock = threading.Lock()
+        self._values = []
+        self._codes = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def value(self, code):
+        return self._values[code]
+
+
+TYPES = CodeTable(["HTTP", "HTTPS", "SOCKS4", "SOCKS5", "ALL"])
+CATEGORIES = CodeTable(["fast", "medium", "slow", "unknown"])
+ANONYMITY = CodeTable(["elite", "anonymous", "transparent", "unknown"])
+COUNTRIES = CodeTable()
+
+
+class ProxyRecord:
+    """A validated proxy; also readable like the dicts older code expects"""
+    __slots__ = ('addr', 'response_time', 'judge_time', 'checked_at',
+                 'type_code', 'category_code', 'anonymity_code', 'country_code')
+
+    FIELDS = ('ip', 'port', 'response_time', 'category', 'country',
+              'anonymity', 'type', 'last_checked', 'judge_time')
+
+    def __init__(self, addr, response_time, category, country, anonymity, proxy_type,
+                 checked_at, judge_time=0):
+        self.addr = addr
+        self.response_time = response_time
+        self.judge_time = judge_time
+        self.checked_at = checked_at
+        self.type_code = TYPES.code(proxy_type)
+        self.category_code = CATEGORIES.code(category)
+        self.anonymity_code = ANONYMITY.code(anonymity)
+        self.country_code = COUNTRIES.code(country)
+
+    @classmethod
+    def from_dict(cls, data):
+        checked = data.get('last_checked')
+        if isinstance(checked, str):
+            checked = datetime.fromisoformat(checked).timestamp()
+        return cls(pack_address(data['ip'], data['port']), int(data['response_time']),
+                   data.get('category', 'unknown'), data.get('country', ''),
+                   data.get('anonymity', 'unknown'), data.get('type', 'HTTP'),
+                   checked or 0.0, int(data.get('judge_time') or 0))
+
+    @property
+    def ip(self):
+        return unpack_address(self.addr)[0]
+
+    @property
+    def port(self):
+        return self.addr & 0xFFFF
+
+    @property
+    def address(self):
+        return format_address(self.addr)
+
+    @property
+    def category(self):
+        return CATEGORIES.value(self.category_code)
+
+    @property
+    def country(self):
+        return COUNTRIES.value(self.country_code)
+
+    @property
+    def anonymity(self):
+        return ANONYMITY.value(self.anonymity_code)
+
+    @property
+    def type(self):
+        return TYPES.value(self.type_code)
+
+    @property
+    def last_checked(self):
+        return datetime.fromtimestamp(self.checked_at).isoformat()
+
+    # Mapping-style access
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"ProxyRecord({self.address}, {self.response_time}ms, {self.category}, {self.country})"
@@ -0,0 +1,71 @@
+"""Entry point of a checking shard: python -m proxyscraper.shard_worker
+
+Reads an EngineConfig as one JSON line, then packed addresses until EOF,
+from stdin, and writes sharding.RESULT records to stdout. Logging goes to
+stderr.
+"""
+import asyncio
+import json
+import logging
+import sys
+from array import array
+
+from .config import EngineConfig
+from .engine import ProxyEngine
+from .sharding import ResultWriter, use_uvloop
+
+FLUSH_INTERVAL = 0.05
+READ_SIZE = 64 * 1024
+
+
+async def serve(config, stdin, stdout):
+    writer = ResultWriter(stdout)
+    engine = ProxyEngine(config, store=writer)
+    engine.is_running = True
+    queue = asyncio.Queue(maxsize=config.queue_size)
+
+    async def feed():
+        pending = b''
+        while True:
+            data = await asyncio.to_thread(stdin.read1, READ_SIZE)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % 8
+            addresses = array('Q')
+            addresses.frombytes(data[:usable])
+            pending = data[usable:]
+            for addr in addresses:
+                await queue.put(addr)
+        await queue.put(None)
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            writer.flush()
+
+    tasks = [asyncio.create_task(feed()), asyncio.create_task(flush_periodically())]
+    try:
+        # Results stream to the parent as they come, so the child keeps none of them
+        await engine.check_stream(queue, collect=False)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    writer.finish(engine.unreachable_count, engine.metrics.counters)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s shard: %(message)s")
+    stdin = sys.stdin.buffer
+    config = EngineConfig(**json.loads(stdin.readline())).validate()
+    use_uvloop()
+    try:
+        asyncio.run(serve(config, stdin, sys.stdout.buffer))
+    except KeyboardInterrupt:
+        # The parent got the same Ctrl-C and will clean up
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Checking across several worker processes
+
+Each shard is a `python -m proxyscraper.shard_worker` child with its own
+event loop and connector. The parent writes packed addresses (native
+8-byte integers) to the child's stdin; the child answers every address
+with one fixed-size RESULT record on stdout. Closing stdin ends a shard,
+which then sends a STATUS_DONE summary and exits.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import struct
+import sys
+from dataclasses import asdict, replace
+
+from .records import ANONYMITY, CATEGORIES, TYPES, ProxyRecord
+
+logger = logging.getLogger(__name__)
+
+# addr, status, response_time, type code, category code, anonymity code, country, checked_at,
+# judge_time
+RESULT = struct.Struct('<QBIBBB2sdI')
+STATUS_FAILED = 0
+STATUS_VALID = 1
+# Summary sent once at the end, laid out as SUMMARY: a RESULT-sized record with the
+# status byte at the same offset, carrying the shard's failure counts
+STATUS_DONE = 2
+# timed_out, refused, status, failed, unreachable
+SUMMARY = struct.Struct('<IIBII13x')
+SUMMARY_STAGES = ('timed_out', 'refused', 'failed')
+STATUS_OFFSET = 8
+
+# Addresses written to a shard at a time
+SHARD_BATCH = 256
+
+
+def use_uvloop():
+    """Switch asyncio to uvloop when it is installed; returns whether it was"""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def shard_config(config, processes):
+    """Copy of config for one of processes shards, splitting the concurrency between them"""
+    return replace(
+        config,
+        processes=1,
+        min_threads=math.ceil(config.min_threads / processes),
+        max_threads=math.ceil(config.max_threads / processes),
+        prefilter_concurrency=math.ceil(config.prefilter_concurrency / processes),
+        db_path="",
+        cache_file="",
+        sources=[],
+    )
+
+
+async def spawn_shard(config):
+    """Start a shard worker process and send it its config"""
+    # The child must import this copy of the package even when it is not installed
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "proxyscraper.shard_worker",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=env)
+    process.stdin.write(json.dumps(asdict(config)).encode('utf-8') + b'\n')
+    await process.stdin.drain()
+    return process
+
+
+def encode_result(addr, record):
+    if record is None:
+        return RESULT.pack(addr, STATUS_FAILED, 0, 0, 0, 0, b'', 0.0, 0)
+    return RESULT.pack(addr, STATUS_VALID, record.response_time, record.type_code,
+                       record.category_code, record.anonymity_code,
+                       record.country.encode('ascii', 'replace')[:2], record.checked_at,
+                       record.judge_time)
+
+
+def encode_summary(unreachable, counters):
+    """STATUS_DONE record for a shard's unreachable count and Metrics.counters"""
+    timed_out, refused, failed = (counters.get(stage, 0) for stage in SUMMARY_STAGES)
+    return SUMMARY.pack(timed_out, refused, STATUS_DONE, failed, unreachable)
+
+
+def decode_result(data):
+    """Return (status, addr, ProxyRecord or None, summary or None)
+
+    The summary of a STATUS_DONE record maps 'unreachable' and each of
+    SUMMARY_STAGES to its count.
+    """
+    if data[STATUS_OFFSET] == STATUS_DONE:
+        timed_out, refused, _, failed, unreachable = SUMMARY.unpack(data)
+        return STATUS_DONE, 0, None, {'unreachable': unreachable, 'timed_out': timed_out,
+                                      'refused': refused, 'failed': failed}
+    (addr, status, response_time, type_code, category_code, anonymity_code, country, checked_at,
+     judge_time) = RESULT.unpack(data)
+    if status != STATUS_VALID:
+        return status, addr, None, None
+    record = ProxyRecord(addr, response_time, CATEGORIES.value(category_code),
+                         country.rstrip(b'\0').decode('ascii'), ANONYMITY.value(anonymity_code),
+                         TYPES.value(type_code), checked_at, judge_time)
+    return status, addr, record, None
+
+
+class ResultWriter:
+    """ProxyStore stand-in used inside a shard: encodes every result onto a binary stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._buffer = bytearray()
+
+    def store_proxy(self, record):
+        self._buffer += encode_result(record.addr, record)
+
+    def record_failure(self, addr):
+        self._buffer += encode_result(addr, None)
+
+    def finish(self, unreachable, counters):
+        self._buffer += encode_summary(unreachable, counters)
+        self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write(self._buffer)
+            self.stream.flush()
+            self._buffer.clear()
@@ -0,0 +1,144 @@
+"""On-disk cache of parsed source lists for conditional re-fetching
+
+Each source URL keeps its ETag / Last-Modified validators and the packed
+addresses parsed from the last full download. A 304 answer reuses the
+cached addresses without downloading or parsing anything.
+"""
+import base64
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from array import array
+
+from .export import FILE_MODE
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class CacheEntry:
+    __slots__ = ('etag', 'last_modified', 'fetched_at', 'used_at', 'addresses')
+
+    def __init__(self, etag, last_modified, fetched_at, used_at, addresses):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.used_at = used_at
+        self.addresses = addresses
+
+
+class SourceCache:
+    """Per-URL validators and parse results, persisted as JSON
+
+    Entries older than ttl seconds are dropped. When the cached address
+    count exceeds max_addresses, least recently used entries are evicted.
+    """
+
+    def __init__(self, path="proxy_cache.json", ttl=3600, max_addresses=2_000_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_addresses = max_addresses
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Read the cache file; a missing or unreadable file just means an empty cache"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable source cache %s: %s", self.path, e)
+            return self
+        if data.get('version') != CACHE_VERSION:
+            return self
+
+        now = time.time()
+        for url, raw in data.get('sources', {}).items():
+            if now - raw['fetched_at'] > self.ttl:
+                continue
+            addresses = array('Q')
+            addresses.frombytes(base64.b64decode(raw['addresses']))
+            self._entries[url] = CacheEntry(raw.get('etag'), raw.get('last_modified'),
+                                            raw['fetched_at'], raw.get('used_at', raw['fetched_at']),
+                                            addresses)
+        return self
+
+    def save(self):
+        """Write the cache atomically (temp file + rename)"""
+        with self._lock:
+            self._evict()
+            sources = {
+                url: {
+                    'etag': entry.etag,
+                    'last_modified': entry.last_modified,
+                    'fetched_at': entry.fetched_at,
+                    'used_at': entry.used_at,
+                    'addresses': base64.b64encode(entry.addresses.tobytes()).decode('ascii'),
+                }
+                for url, entry in self._entries.items()
+            }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.proxy_cache-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'sources': sources}, f)
+                os.fchmod(f.fileno(), FILE_MODE)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, url):
+        """Cached entry for url, or None if absent or older than ttl"""
+        entry = self._entries.get(url)
+        if entry is not None and time.time() - entry.fetched_at > self.ttl:
+            with self._lock:
+                self._entries.pop(url, None)
+            return None
+        return entry
+
+    def conditional_headers(self, url):
+        """Request headers that let the server answer 304 Not Modified"""
+        entry = self.get(url)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def revalidated(self, url):
+        """Record a 304 for url and return its cached addresses"""
+        entry = self._entries[url]
+        entry.fetched_at = entry.used_at = time.time()
+        self.hits += 1
+        return entry.addresses
+
+    def put(self, url, etag, last_modified, addresses):
+        """Store a fresh parse result; sources without validators are not cached"""
+        self.misses += 1
+        if not etag and not last_modified:
+            self._entries.pop(url, None)
+            return
+        now = time.time()
+        with self._lock:
+            self._entries[url] = CacheEntry(etag, last_modified, now, now, array('Q', addresses))
+
+    def _evict(self):
+        total = sum(len(entry.addresses) for entry in self._entries.values())
+        if total <= self.max_addresses:
+            return
+        for url, entry in sorted(self._entries.items(), key=lambda item: item[1].used_at):
+            del self._entries[url]
+            total -= len(entry.addresses)
+            if total <= self.max_addresses:
+                break
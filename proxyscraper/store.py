@@ -0,0 +1,321 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from .protocols import PROTOCOLS
+from .records import ProxyRecord, address_array, pack_address, unpack_address
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 5
+# Types a stored proxy can have; anything else cannot be used without a new check
+STORED_TYPES = tuple(protocol.upper() for protocol in PROTOCOLS)
+
+# success_rate is an exponential moving average over checks
+SUCCESS_DECAY = 0.8
+
+UPSERT_PROXY = '''
+    INSERT INTO proxies
+    (ip, port, type, response_time, anonymity_level, country, last_checked, category, judge_time, addr)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ip, port) DO UPDATE SET
+        addr = excluded.addr,
+        type = excluded.type,
+        response_time = excluded.response_time,
+        judge_time = excluded.judge_time,
+        anonymity_level = excluded.anonymity_level,
+        country = excluded.country,
+        last_checked = excluded.last_checked,
+        category = excluded.category,
+        success_rate = proxies.success_rate * {decay} + {gain}
+'''.format(decay=SUCCESS_DECAY, gain=1 - SUCCESS_DECAY)
+
+CLEAR_FAILURES = "DELETE FROM check_history WHERE addr = ?"
+
+# The exponent is clamped: SQLite shifts are 64-bit, so long-dead hosts would wrap to 0
+RECORD_FAILURE = '''
+    INSERT INTO check_history (addr, failures, last_checked, next_check)
+    VALUES (?, 1, ?, ? + ?)
+    ON CONFLICT(addr) DO UPDATE SET
+        failures = check_history.failures + 1,
+        last_checked = excluded.last_checked,
+        next_check = excluded.last_checked + min(? << min(check_history.failures, 30), ?)
+'''
+
+# Best first: the most reliable, then the fastest. A failure since the last
+# success leaves a check_history row, which hides the proxy.
+SELECT_KNOWN = '''
+    SELECT ip, port, response_time, category, country, anonymity_level, type, last_checked, judge_time
+    FROM proxies
+    WHERE NOT EXISTS (SELECT 1 FROM check_history WHERE check_history.addr = proxies.addr)
+    ORDER BY success_rate DESC, response_time
+'''
+KNOWN_FIELDS = ('ip', 'port', 'response_time', 'category', 'country', 'anonymity', 'type',
+                'last_checked', 'judge_time')
+
+DELETE_PROXY = "DELETE FROM proxies WHERE ip = ? AND port = ?"
+
+DECAY_SUCCESS_RATE = f"UPDATE proxies SET success_rate = success_rate * {SUCCESS_DECAY} WHERE ip = ? AND port = ?"
+
+# History of addresses not checked for this long after their backoff ended is
+# pruned, along with their (failed) proxy rows
+HISTORY_RETENTION = 7 * 86400
+PRUNE_INTERVAL = 3600
+PRUNE_PROXIES = "DELETE FROM proxies WHERE addr IN (SELECT addr FROM check_history WHERE next_check < ?)"
+PRUNE_HISTORY = "DELETE FROM check_history WHERE next_check < ?"
+
+_STOP = object()
+
+
+class ProxyStore:
+    """SQLite storage for validated proxies and the failure history of checked addresses
+
+    Writes are queued and committed by a background thread in batches of
+    up to batch_size rows, or every flush_interval seconds, whichever
+    comes first.
+
+    Every failed check doubles an address's backoff, starting at
+    backoff_base seconds and capped at backoff_max; a successful check
+    clears it. Addresses left unchecked for HISTORY_RETENTION after their
+    backoff ended are forgotten, at startup and then hourly.
+    """
+
+    def __init__(self, path="proxy_db.sqlite", batch_size=500, flush_interval=0.5,
+                 backoff_base=600, backoff_max=86400):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.setup()
+        # Called on the writer thread with the number of proxies each committed batch stored
+        self.on_commit = None
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="proxy-db-writer",
+                                        daemon=True)
+        self._writer.start()
+
+    def setup(self):
+        """Create the proxies table and migrate older databases"""
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS proxies (
+                id INTEGER PRIMARY KEY,
+                ip TEXT,
+                port TEXT,
+                type TEXT,
+                response_time INTEGER,
+                anonymity_level TEXT,
+                country TEXT,
+                last_checked TIMESTAMP,
+                success_rate REAL DEFAULT 1.0,
+                category TEXT DEFAULT 'unknown'
+            )
+        ''')
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Older databases have no uniqueness key and collected a row per check;
+            # keep the newest row for each address before adding the index.
+            removed = cursor.execute('''
+                DELETE FROM proxies WHERE id NOT IN (
+                    SELECT MAX(id) FROM proxies GROUP BY ip, port
+                )
+            ''').rowcount
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_proxies_ip_port ON proxies(ip, port)")
+            if removed:
+                logger.info("Removed %d duplicate proxy rows from %s", removed, self.path)
+        if version < 2:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS check_history (
+                    addr INTEGER PRIMARY KEY,
+                    failures INTEGER NOT NULL,
+                    last_checked REAL NOT NULL,
+                    next_check REAL NOT NULL
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_check_history_next ON check_history(next_check)")
+        if version < 3:
+            # Judge latency, kept apart from the proxy's response_time
+            cursor.execute("ALTER TABLE proxies ADD COLUMN judge_time INTEGER DEFAULT 0")
+        if version < 4:
+            # Older versions stored lowercase types and "ALL" for proxies of unknown protocol
+            cursor.execute("UPDATE proxies SET type = UPPER(type)")
+            placeholders = ", ".join("?" * len(STORED_TYPES))
+            removed = cursor.execute(
+                f"DELETE FROM proxies WHERE type IS NULL OR type NOT IN ({placeholders})",
+                STORED_TYPES).rowcount
+            if removed:
+                logger.info("Removed %d proxy rows of unknown type from %s", removed, self.path)
+        if version < 5:
+            # The packed address lets known_good() filter on check_history in SQL
+            cursor.execute("ALTER TABLE proxies ADD COLUMN addr INTEGER")
+            updates = []
+            for row_id, ip, port in cursor.execute("SELECT id, ip, port FROM proxies").fetchall():
+                try:
+                    updates.append((pack_address(ip, port), row_id))
+                except (TypeError, ValueError):
+                    continue  # rows written by very old versions; known_good() skips them
+            cursor.executemany("UPDATE proxies SET addr = ? WHERE id = ?", updates)
+        self._prune(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def store_proxy(self, proxy_data):
+        """Queue a validated proxy for writing; returns immediately"""
+        addr = getattr(proxy_data, 'addr', None)
+        if addr is None:
+            addr = pack_address(proxy_data['ip'], proxy_data['port'])
+        self._queue.put(('proxy', addr, (
+            proxy_data['ip'], str(proxy_data['port']), proxy_data['type'],
+            proxy_data['response_time'], proxy_data['anonymity'],
+            proxy_data['country'], proxy_data['last_checked'], proxy_data['category'],
+            proxy_data.get('judge_time') or 0, addr
+        )))
+
+    def record_failure(self, addr):
+        """Queue a failed check of a packed address; returns immediately"""
+        self._queue.put(('failure', addr, time.time()))
+
+    def remove_proxy(self, addr):
+        """Queue the removal of a packed address from the valid proxies; returns immediately"""
+        self._queue.put(('remove', addr, None))
+
+    def backed_off_addresses(self, now=None):
+        """Packed addresses whose backoff has not expired yet"""
+        now = time.time() if now is None else now
+        rows = self.conn.execute("SELECT addr FROM check_history WHERE next_check > ?", (now,))
+        return {addr for (addr,) in rows}
+
+    def known_good(self, batch_size=1000):
+        """Yield lists of the ProxyRecords that passed their last check, best first
+
+        Reads through a connection of its own, so it can stream from any
+        thread while check results are being written.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(SELECT_KNOWN)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch = []
+                for row in rows:
+                    try:
+                        batch.append(ProxyRecord.from_dict(dict(zip(KNOWN_FIELDS, row))))
+                    except (TypeError, ValueError):
+                        continue  # rows written by very old versions
+                if batch:
+                    yield batch
+        finally:
+            conn.close()
+
+    def count_proxies(self):
+        """Rows in the proxies table: an upper bound for known_good()"""
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM proxies").fetchone()[0]
+        finally:
+            conn.close()
+
+    def known_good_addresses(self):
+        """Packed addresses of known_good(), best first"""
+        return address_array(record.addr for batch in self.known_good() for record in batch)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been committed"""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self.conn.close()
+
+    def _writer_loop(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        pending = []
+        deadline = None
+        next_prune = time.monotonic() + PRUNE_INTERVAL
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if isinstance(item, tuple):
+                    pending.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    if len(pending) < self.batch_size and time.monotonic() < deadline:
+                        continue
+
+                if pending:
+                    self._write_batch(conn, pending)
+                    pending = []
+                deadline = None
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+                    try:
+                        with conn:
+                            self._prune(conn)
+                    except sqlite3.Error as e:
+                        logger.error("Failed to prune the check history: %s", e)
+
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is _STOP:
+                    break
+        finally:
+            conn.close()
+
+    def _prune(self, conn, now=None):
+        """Forget addresses whose backoff ended more than HISTORY_RETENTION ago"""
+        cutoff = (time.time() if now is None else now) - HISTORY_RETENTION
+        conn.execute(PRUNE_PROXIES, (cutoff,))
+        removed = conn.execute(PRUNE_HISTORY, (cutoff,)).rowcount
+        if removed:
+            logger.info("Pruned %d addresses from the check history of %s", removed, self.path)
+
+    def _write_batch(self, conn, items):
+        # The statements below run grouped by kind, not in queue order, so only the
+        # outcomes that still matter are kept: an address's last store or removal, and
+        # the failures that came after it
+        last = {addr: index for index, (kind, addr, _) in enumerate(items) if kind != 'failure'}
+        items = [(kind, addr, payload) for index, (kind, addr, payload) in enumerate(items)
+                 if index == last.get(addr) or (kind == 'failure' and index > last.get(addr, -1))]
+        proxies = [item[2] for item in items if item[0] == 'proxy']
+        cleared = [(item[1],) for item in items if item[0] == 'proxy']
+        failures = []
+        decayed = []
+        removed = []
+        for kind, addr, checked_at in items:
+            if kind == 'failure':
+                failures.append((addr, checked_at, checked_at, self.backoff_base,
+                                 self.backoff_base, self.backoff_max))
+                ip, port = unpack_address(addr)
+                decayed.append((ip, str(port)))
+            elif kind == 'remove':
+                ip, port = unpack_address(addr)
+                removed.append((ip, str(port)))
+        try:
+            with conn:
+                conn.executemany(UPSERT_PROXY, proxies)
+                conn.executemany(CLEAR_FAILURES, cleared)
+                conn.executemany(RECORD_FAILURE, failures)
+                conn.executemany(DECAY_SUCCESS_RATE, decayed)
+                conn.executemany(DELETE_PROXY, removed)
+        except sqlite3.Error as e:
+            logger.error("Failed to store %d check results: %s", len(items), e)
+            return
+        if self.on_commit is not None and proxies:
+            self.on_commit(len(proxies))
@@ -0,0 +1,55 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+
+@dataclass
+class UpdateBatch:
+    """Everything posted to an UpdateChannel since the last drain"""
+    progress: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    rows: List[dict] = field(default_factory=list)
+    events: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.progress or self.counters or self.rows or self.events)
+
+
+class UpdateChannel:
+    """Thread-safe mailbox between the engine thread and a UI
+
+    Producers post as often as they like; progress and counters keep only
+    their latest value, so a consumer that drains on a fixed tick does
+    work proportional to elapsed time rather than to the number of posts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batch = UpdateBatch()
+
+    def post_progress(self, phase, completed, total):
+        with self._lock:
+            self._batch.progress[phase] = (completed, total)
+
+    def post_counters(self, **counters):
+        with self._lock:
+            self._batch.counters.update(counters)
+
+    def post_row(self, row):
+        with self._lock:
+            self._batch.rows.append(row)
+
+    def post_event(self, name):
+        with self._lock:
+            self._batch.events.append(name)
+
+    def discard_rows(self):
+        """Drop the rows posted so far, e.g. because the view was rebuilt from the results"""
+        with self._lock:
+            self._batch.rows.clear()
+
+    def drain(self):
+        """Return and reset everything posted so far"""
+        with self._lock:
+            batch, self._batch = self._batch, UpdateBatch()
+        return batch
@@ -1,20 +1,30 @@
 
+import time
+LAUNCHED_AT = time.perf_counter()  # startup is timed from before the imports
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
-import threading
-import time
-import requests
-import random
-from datetime import datetime
-import json
-import re
-import asyncio
-import aiohttp
 import os
 import sqlite3
+import threading
+import asyncio
+import bisect
+import logging
 from collections import defaultdict
 from itertools import cycle
 
+# The engine (and aiohttp with it) is only imported once a run starts
+from proxyscraper.config import EngineConfig
+from proxyscraper.export import check_export_path, export_proxies, export_store
+from proxyscraper.filters import ProxyFilter, ResultIndex
+from proxyscraper.store import ProxyStore
+from proxyscraper.updates import UpdateChannel
+
+logger = logging.getLogger(__name__)
+
+UI_TICK_MS = 50  # engine updates are applied at most 20 times per second
+CATEGORY_ORDER = {'fast': 0, 'medium': 1, 'slow': 2}
+
 class AnimatedProgressbar(ttk.Progressbar):
     """Animated progressbar with purple color cycling"""
     def __init__(self, master, **kwargs):
@@ -39,6 +49,128 @@ class AnimatedProgressbar(ttk.Progressbar):
         if self._animate_id:
             self.after_cancel(self._animate_id)
 
+class VirtualResultView(ttk.Frame):
+    """Treeview over an in-memory row list that only creates items for the visible rows"""
+    def __init__(self, master, columns, formatter, sort_keys, height=20, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columns = columns
+        self.formatter = formatter      # row -> tuple of column values
+        self.sort_keys = sort_keys      # column -> key function
+        self.page_size = height
+        self.rows = []                  # kept in ascending sort_key order when sorted
+        self.offset = 0
+        self.sort_column = None
+        self.sort_reverse = False
+        self._items = []
+        
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=height,
+                                 style="Treeview")
+        for col in columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=150, anchor=tk.CENTER)
+            
+        self.v_scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar,
+                                         style="Vertical.TScrollbar")
+        h_scrollbar = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview,
+                                    style="Horizontal.TScrollbar")
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        
+        self.tree.bind("<MouseWheel>", lambda e: self._scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self._scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll(3))
+        self.tree.bind("<Configure>", self._on_resize)
+        self._render()
+        
+    def __len__(self):
+        return len(self.rows)
+        
+    def set_rows(self, rows):
+        """Replace all rows; costs one sort, no widget work beyond the visible page"""
+        self.rows = list(rows)
+        if self.sort_column:
+            self.rows.sort(key=self.sort_keys[self.sort_column])
+        self.offset = 0
+        self._render()
+        
+    def append_rows(self, rows):
+        if self.sort_column:
+            key = self.sort_keys[self.sort_column]
+            for row in rows:
+                bisect.insort(self.rows, row, key=key)
+        else:
+            self.rows.extend(rows)
+        self._render()
+        
+    def clear(self):
+        self.set_rows([])
+        
+    def sort_by(self, column):
+        """Sort by column; clicking the same heading again reverses the order"""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+            self.rows.sort(key=self.sort_keys[column])
+        for col in self.columns:
+            arrow = (" ▼" if self.sort_reverse else " ▲") if col == column else ""
+            self.tree.heading(col, text=col + arrow)
+        self.offset = 0
+        self._render()
+        
+    def _visible_rows(self):
+        total = len(self.rows)
+        end = min(self.offset + self.page_size, total)
+        if self.sort_reverse:
+            return [self.rows[total - 1 - i] for i in range(self.offset, end)]
+        return self.rows[self.offset:end]
+        
+    def _render(self):
+        visible = self._visible_rows()
+        while len(self._items) < len(visible):
+            self._items.append(self.tree.insert('', tk.END))
+        while len(self._items) > len(visible):
+            self.tree.delete(self._items.pop())
+        for item, row in zip(self._items, visible):
+            self.tree.item(item, values=self.formatter(row))
+            
+        total = len(self.rows)
+        if total:
+            self.v_scrollbar.set(self.offset / total, (self.offset + len(visible)) / total)
+        else:
+            self.v_scrollbar.set(0, 1)
+            
+    def _scroll_to(self, offset):
+        offset = max(0, min(int(offset), len(self.rows) - self.page_size))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+            
+    def _scroll(self, units):
+        self._scroll_to(self.offset + units)
+        
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(float(amount) * len(self.rows))
+        elif unit == "pages":
+            self._scroll(int(amount) * self.page_size)
+        else:
+            self._scroll(int(amount))
+            
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        page_size = max(1, (event.height - row_height) // row_height)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self._scroll_to(self.offset)
+            self._render()
+
 class ProxyListCreator:
     def __init__(self, root):
         self.root = root
@@ -52,30 +184,41 @@ class ProxyListCreator:
         self.is_running = False
         self.is_paused = False
         self.proxy_list = []
-        self.checked_proxies = []
+        self.results = ResultIndex()  # Indexed by country, anonymity, speed and latency
+        self.checked_proxies = self.results.records
         self.filtered_proxies = []  # NEW: Filtered results
+        # Held while a result is added and posted, and while the view is re-filtered,
+        # so that no posted row is both in a new filter's query and still queued
+        self.filter_lock = threading.Lock()
+        # Bumped (under filter_lock) whenever the results are cleared
+        self.results_generation = 0
         self.scraped_count = 0
         self.checked_count = 0
         self.cache_file = "proxy_cache.json"
         self.start_time = None
+        self.check_start_time = None
+        self.engine = None
+        self.export_thread = None
+        self.updates = UpdateChannel()
         
         # Settings variables
         self.proxy_type = tk.StringVar(value="HTTP")
         self.timeout = tk.StringVar(value="5")
-        self.max_threads = tk.StringVar(value="50")
+        self.max_threads = tk.StringVar(value="500")
         self.batch_size = tk.StringVar(value="10")
         self.rate_limit = tk.StringVar(value="5")
+        self.connect_timeout = tk.StringVar(value="3")
+        self.prefilter = tk.BooleanVar(value=False)
+        self.processes = tk.StringVar(value="1")
         self.country_filter = tk.StringVar(value="")
         self.anonymity_filter = tk.StringVar(value="all")
         self.speed_filter = tk.StringVar(value="all")
+        self.min_latency_filter = tk.StringVar(value="")
+        self.max_latency_filter = tk.StringVar(value="")
         self.dark_mode = tk.BooleanVar(value=True)
         
         # NEW: Saved filter settings - FIX: Initialize properly
-        self.saved_filters = {
-            'country': "",
-            'anonymity': "all",
-            'speed': "all"
-        }
+        self.saved_filters = ProxyFilter()
         
         # Advanced features
         self.proxy_categories = defaultdict(list)
@@ -83,9 +226,13 @@ class ProxyListCreator:
         self.anonymity_stats = defaultdict(int)
         
         # Setup styles and GUI
+        started = time.perf_counter()
         self.setup_purple_black_styles()
+        self.theme_seconds = time.perf_counter() - started
         self.setup_gui()
         self.setup_database()
+        self.root.after(UI_TICK_MS, self.process_updates)
+        self.root.after_idle(self.on_interactive)
         
     def setup_purple_black_styles(self):
         """Modern purple-black transparent design with glassmorphism effects"""
@@ -105,8 +252,6 @@ class ProxyListCreator:
             "TCombobox": {"configure": {"fieldbackground": "#2C1B47", "background": "#2C1B47", 
                                        "foreground": "#F8F9FA", "bordercolor": "#8E44AD", "borderwidth": 2,
                                        "arrowcolor": "#BB8FCE", "relief": "flat"}},
-            "TCheckbutton": {"configure": {"background": "#1A0E2E", "foreground": "#E8DAEF", 
-                                          "focuscolor": "#9B59B6", "font": ("Segoe UI", 11)}},
             "TNotebook": {"configure": {"background": "#0F0A1A", "borderwidth": 0, "relief": "flat"}},
             "TNotebook.Tab": {"configure": {"background": "#2C1B47", "foreground": "#E8DAEF", 
                                            "padding": [18, 10], "font": ("Segoe UI", 11, "bold")},
@@ -132,25 +277,48 @@ class ProxyListCreator:
         })
         self.style.theme_use("purple_black_glass")
         
+    def setup_deferred_styles(self):
+        """Styles only the hidden tabs use, configured once the window is interactive"""
+        self.style.theme_settings("purple_black_glass", {
+            "TCheckbutton": {"configure": {"background": "#1A0E2E", "foreground": "#E8DAEF", 
+                                          "focuscolor": "#9B59B6", "font": ("Segoe UI", 11)}},
+        })
+        
     def setup_database(self):
         """Initialize SQLite database for proxy storage"""
-        self.db_conn = sqlite3.connect("proxy_db.sqlite", check_same_thread=False)
-        cursor = self.db_conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS proxies (
-                id INTEGER PRIMARY KEY,
-                ip TEXT,
-                port TEXT,
-                type TEXT,
-                response_time INTEGER,
-                anonymity_level TEXT,
-                country TEXT,
-                last_checked TIMESTAMP,
-                success_rate REAL DEFAULT 1.0,
-                category TEXT DEFAULT 'unknown'
-            )
-        ''')
-        self.db_conn.commit()
+        self.store = ProxyStore("proxy_db.sqlite")
+        
+    def on_interactive(self):
+        """First idle moment of the event loop: the window is up and responding"""
+        self.interactive_seconds = time.perf_counter() - LAUNCHED_AT
+        self.startup_label.config(text=f"🚀 Ready in {self.interactive_seconds:.2f}s")
+        threading.Thread(target=self.load_stored_proxies, daemon=True).start()
+        started = time.perf_counter()
+        self.setup_deferred_styles()
+        self.setup_settings_tab()
+        self.setup_stats_tab()
+        logger.info("Startup: interactive after %.3fs (theme %.3fs), hidden tabs built in %.3fs",
+                    self.interactive_seconds, self.theme_seconds, time.perf_counter() - started)
+        
+    def load_stored_proxies(self):
+        """Stream the last run's valid proxies from the database into the table (loader thread)"""
+        loaded = 0
+        generation = self.results_generation
+        try:
+            for batch in self.store.known_good():
+                for record in batch:
+                    with self.filter_lock:
+                        if self.is_running or self.results_generation != generation:
+                            return  # a run has started or the data was cleared
+                        self.results.add(record)
+                        if self.saved_filters.matches(record):
+                            self.filtered_proxies.append(record)
+                            self.updates.post_row(record)
+                loaded += len(batch)
+        except sqlite3.Error as e:
+            logger.warning("Could not load stored proxies: %s", e)
+            self.updates.post_counters(stored_error=str(e))
+        self.updates.post_counters(stored=loaded, stored_seconds=time.perf_counter() - LAUNCHED_AT)
         
     def setup_gui(self):
         # Main container
@@ -182,9 +350,8 @@ class ProxyListCreator:
         self.stats_tab = ttk.Frame(self.notebook, padding="20", style="TFrame")
         self.notebook.add(self.stats_tab, text="📊  ANALYTICS")
         
+        # Only the main tab is built before the window shows; the others wait for on_interactive
         self.setup_main_tab()
-        self.setup_settings_tab()
-        self.setup_stats_tab()
         
     def setup_main_tab(self):
         # Quick settings - more compact
@@ -202,7 +369,7 @@ class ProxyListCreator:
         
         ttk.Label(left_settings, text="Type:", font=('Segoe UI', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
         proxy_combo = ttk.Combobox(left_settings, textvariable=self.proxy_type, 
-                                  values=["HTTP", "HTTPS", "SOCKS4", "SOCKS5", "All"], 
+                                  values=["HTTP", "HTTPS", "SOCKS4", "SOCKS5", "Auto", "All"], 
                                   state="readonly", width=8, font=('Segoe UI', 10))
         proxy_combo.grid(row=0, column=1, padx=(0, 15))
         
@@ -210,7 +377,7 @@ class ProxyListCreator:
         timeout_entry = ttk.Entry(left_settings, textvariable=self.timeout, width=6, font=('Segoe UI', 10))
         timeout_entry.grid(row=0, column=3, padx=(0, 15))
         
-        ttk.Label(left_settings, text="Threads:", font=('Segoe UI', 10, 'bold')).grid(row=0, column=4, sticky=tk.W, padx=(0, 5))
+        ttk.Label(left_settings, text="Max threads:", font=('Segoe UI', 10, 'bold')).grid(row=0, column=4, sticky=tk.W, padx=(0, 5))
         threads_entry = ttk.Entry(left_settings, textvariable=self.max_threads, width=6, font=('Segoe UI', 10))
         threads_entry.grid(row=0, column=5)
         
@@ -245,6 +412,9 @@ class ProxyListCreator:
         self.export_button = ttk.Button(right_buttons, text="📁 EXPORT", command=self.export_proxies, style="TButton")
         self.export_button.pack(side=tk.LEFT, padx=(0, 8))
         
+        self.export_db_button = ttk.Button(right_buttons, text="🗄️ EXPORT DB", command=self.export_database, style="TButton")
+        self.export_db_button.pack(side=tk.LEFT, padx=(0, 8))
+        
         self.clear_button = ttk.Button(right_buttons, text="🗑️ CLEAR", command=self.clear_log, style="TButton")
         self.clear_button.pack(side=tk.LEFT)
         
@@ -270,6 +440,9 @@ class ProxyListCreator:
         self.scrape_speed_label = ttk.Label(scrape_info_frame, text="⚡ Speed: 0/s", font=('Segoe UI', 9))
         self.scrape_speed_label.pack(side=tk.RIGHT)
         
+        self.startup_label = ttk.Label(scrape_info_frame, text="🚀 Starting...", font=('Segoe UI', 9))
+        self.startup_label.pack(side=tk.RIGHT, padx=(0, 20))
+        
         # Checking progress
         check_header = ttk.Label(progress_frame, text="🛡️ VALIDATION", 
                                 font=('Segoe UI', 11, 'bold'), foreground="#D2B4DE")
@@ -287,6 +460,9 @@ class ProxyListCreator:
         self.check_speed_label = ttk.Label(check_info_frame, text="⚡ Speed: 0/s", font=('Segoe UI', 9))
         self.check_speed_label.pack(side=tk.RIGHT)
         
+        self.concurrency_label = ttk.Label(check_info_frame, text="🔀 Concurrency: --", font=('Segoe UI', 9))
+        self.concurrency_label.pack(side=tk.RIGHT, padx=(0, 20))
+        
         # Statistics compact
         stats_grid = ttk.Frame(progress_frame, style="TFrame")
         stats_grid.pack(fill=tk.X)
@@ -316,26 +492,19 @@ class ProxyListCreator:
                                       padding="15", style="TLabelframe")
         results_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Create treeview with INCREASED HEIGHT
+        # Virtual table: only the visible page of results exists as Treeview items
         columns = ('🌐 IP:Port', '🔧 Type', '⚡ Speed', '🏆 Category', '🌍 Country', '🔒 Anonymity')
-        self.result_tree = ttk.Treeview(results_frame, columns=columns, show='headings', height=20,  # INCREASED from 14 to 20
-                                       style="Treeview")
-        
-        for col in columns:
-            self.result_tree.heading(col, text=col)
-            self.result_tree.column(col, width=150, anchor=tk.CENTER)
-        
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.result_tree.yview,
-                                   style="Vertical.TScrollbar")
-        h_scrollbar = ttk.Scrollbar(results_frame, orient=tk.HORIZONTAL, command=self.result_tree.xview,
-                                   style="Horizontal.TScrollbar")
-        self.result_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        
-        # Grid layout
-        self.result_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        sort_keys = {
+            '🌐 IP:Port': lambda p: p.addr,
+            '🔧 Type': lambda p: p['type'],
+            '⚡ Speed': lambda p: p['response_time'],
+            '🏆 Category': lambda p: CATEGORY_ORDER.get(p['category'], len(CATEGORY_ORDER)),
+            '🌍 Country': lambda p: p['country'],
+            '🔒 Anonymity': lambda p: p['anonymity'],
+        }
+        self.result_view = VirtualResultView(results_frame, columns, self.format_proxy_row,
+                                             sort_keys, height=20)  # INCREASED from 14 to 20
+        self.result_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         results_frame.grid_rowconfigure(0, weight=1)
         results_frame.grid_columnconfigure(0, weight=1)
@@ -358,31 +527,43 @@ class ProxyListCreator:
         filter_frame.pack(fill=tk.X, pady=(0, 20))
         
         # Country filter
-        ttk.Label(filter_frame, text="🌍 Country Filter (e.g., US, DE, UK):", 
+        ttk.Label(filter_frame, text="🌍 Country Filter (e.g., US, DE, GB):", 
                  font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
         country_entry = ttk.Entry(filter_frame, textvariable=self.country_filter, 
                                  font=('Segoe UI', 12), width=50)
         country_entry.pack(fill=tk.X, pady=(0, 15))
         
         # Anonymity filter
-        ttk.Label(filter_frame, text="🔒 Anonymity Level:", 
+        ttk.Label(filter_frame, text="🔒 Anonymity Level (e.g., elite, anonymous):", 
                  font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
         anon_combo = ttk.Combobox(filter_frame, textvariable=self.anonymity_filter,
-                                 values=["all", "elite", "anonymous", "transparent"], 
-                                 state="readonly", font=('Segoe UI', 12))
+                                 values=["all", "elite", "anonymous", "transparent", "elite, anonymous"], 
+                                 font=('Segoe UI', 12))
         anon_combo.pack(fill=tk.X, pady=(0, 15))
         
         # Speed filter - MAIN FEATURE
         ttk.Label(filter_frame, text="⚡ Speed Category (IMPORTANT):", 
                  font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
         speed_combo = ttk.Combobox(filter_frame, textvariable=self.speed_filter,
-                                  values=["all", "fast", "medium", "slow"], 
-                                  state="readonly", font=('Segoe UI', 12))
+                                  values=["all", "fast", "medium", "slow", "fast, medium"], 
+                                  font=('Segoe UI', 12))
         speed_combo.pack(fill=tk.X, pady=(0, 15))
         
+        # Latency range filter
+        ttk.Label(filter_frame, text="⏱️ Latency Range (ms, leave empty for no limit):", 
+                 font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        latency_row = ttk.Frame(filter_frame, style="TFrame")
+        latency_row.pack(fill=tk.X, pady=(0, 15))
+        ttk.Label(latency_row, text="Min:", font=('Segoe UI', 10, 'bold')).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Entry(latency_row, textvariable=self.min_latency_filter, width=8, 
+                  font=('Segoe UI', 12)).pack(side=tk.LEFT, padx=(0, 15))
+        ttk.Label(latency_row, text="Max:", font=('Segoe UI', 10, 'bold')).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Entry(latency_row, textvariable=self.max_latency_filter, width=8, 
+                  font=('Segoe UI', 12)).pack(side=tk.LEFT)
+        
         # Filter explanation
         filter_note = ttk.Label(filter_frame, 
-                               text="📌 Note: Set 'fast' to show only fast proxies, 'medium' for medium, etc.",
+                               text="📌 Note: Set 'fast' to show only fast proxies; separate several values with commas.",
                                font=('Segoe UI', 10), foreground="#F39C12")
         filter_note.pack(anchor=tk.W)
         
@@ -403,7 +584,25 @@ class ProxyListCreator:
                  font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
         rate_entry = ttk.Entry(perf_frame, textvariable=self.rate_limit, 
                               font=('Segoe UI', 12))
-        rate_entry.pack(fill=tk.X)
+        rate_entry.pack(fill=tk.X, pady=(0, 15))
+        
+        # Sharded checking
+        ttk.Label(perf_frame, text="🧮 Worker Processes (0 = one per CPU core):", 
+                 font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        processes_entry = ttk.Entry(perf_frame, textvariable=self.processes, 
+                                   font=('Segoe UI', 12))
+        processes_entry.pack(fill=tk.X, pady=(0, 15))
+        
+        # Two-stage validation
+        ttk.Label(perf_frame, text="🔌 Connect Timeout (sec):", 
+                 font=('Segoe UI', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        connect_entry = ttk.Entry(perf_frame, textvariable=self.connect_timeout, 
+                                 font=('Segoe UI', 12))
+        connect_entry.pack(fill=tk.X, pady=(0, 15))
+        
+        prefilter_check = ttk.Checkbutton(perf_frame, variable=self.prefilter, style="TCheckbutton",
+                                          text="🧹 TCP prefilter: only HTTP-check hosts that accept a connection")
+        prefilter_check.pack(anchor=tk.W)
         
     def setup_stats_tab(self):
         # Analytics title
@@ -444,75 +643,44 @@ class ProxyListCreator:
     def save_and_apply_filters(self):
         """Save current filter settings and apply them to the proxy list - FIXED VERSION"""
         # Save current filter values
-        self.saved_filters['country'] = self.country_filter.get().strip().upper()
-        self.saved_filters['anonymity'] = self.anonymity_filter.get()
-        self.saved_filters['speed'] = self.speed_filter.get()
-        
-        print(f"DEBUG: Saved filters: {self.saved_filters}")  # Debug output
+        try:
+            self.saved_filters = ProxyFilter.parse(
+                country=self.country_filter.get(),
+                anonymity=self.anonymity_filter.get(),
+                speed=self.speed_filter.get(),
+                min_latency=self.min_latency_filter.get(),
+                max_latency=self.max_latency_filter.get(),
+            )
+        except ValueError:
+            messagebox.showerror("Filter Error", "⚠️ Latency limits must be whole, non-negative numbers.")
+            return
         
         # Apply filters to existing proxies
         self.apply_filters_to_results()
         
         # Show success message
+        summary = self.saved_filters.describe()
         messagebox.showinfo("Filters Applied", 
                            f"✅ Filters applied successfully!\n\n"
-                           f"🌍 Country: {self.saved_filters['country'] or 'All'}\n"
-                           f"🔒 Anonymity: {self.saved_filters['anonymity']}\n"
-                           f"⚡ Speed: {self.saved_filters['speed']}\n\n"
+                           f"🌍 Country: {summary['country']}\n"
+                           f"🔒 Anonymity: {summary['anonymity']}\n"
+                           f"⚡ Speed: {summary['speed']}\n"
+                           f"⏱️ Latency: {summary['latency']}\n\n"
                            f"📊 Showing: {len(self.filtered_proxies)} proxies")
         
     def apply_filters_to_results(self):
-        """Filter existing proxy results based on saved filters - FIXED VERSION"""
-        # Clear current table
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
-        
-        # Clear filtered proxies
-        self.filtered_proxies.clear()
-        
-        print(f"DEBUG: Total proxies to filter: {len(self.checked_proxies)}")  # Debug
-        
-        # Apply filters to checked proxies
-        for proxy in self.checked_proxies:
-            if self.proxy_matches_filters(proxy):
-                self.filtered_proxies.append(proxy)
-                self.add_proxy_to_table(proxy)
-        
-        print(f"DEBUG: Filtered proxies: {len(self.filtered_proxies)}")  # Debug
+        """Filter existing proxy results based on saved filters - index lookup, no full scan"""
+        with self.filter_lock:
+            self.filtered_proxies = self.results.query(self.saved_filters)
+            # Rows queued under the previous filter are in the query already, or do not match
+            self.updates.discard_rows()
+        self.result_view.set_rows(self.filtered_proxies)
         
         # Update filtered count
         self.update_stats()
         
-    # FIX: Corrected proxy matching logic
-    def proxy_matches_filters(self, proxy):
-        """Check if a proxy matches the current filter criteria - FIXED VERSION"""
-        
-        # Debug output
-        print(f"DEBUG: Checking proxy {proxy['ip']}:{proxy['port']} - category: '{proxy['category']}' vs filter: '{self.saved_filters['speed']}'")
-        
-        # Country filter
-        if (self.saved_filters['country'] and 
-            proxy.get('country', '').upper() != self.saved_filters['country']):
-            print(f"DEBUG: Country filter failed: {proxy.get('country', '')} != {self.saved_filters['country']}")
-            return False
-        
-        # Anonymity filter
-        if (self.saved_filters['anonymity'] != 'all' and 
-            proxy.get('anonymity', '') != self.saved_filters['anonymity']):
-            print(f"DEBUG: Anonymity filter failed: {proxy.get('anonymity', '')} != {self.saved_filters['anonymity']}")
-            return False
-        
-        # Speed filter - MAIN FIX: Ensure exact matching
-        if (self.saved_filters['speed'] != 'all' and 
-            proxy.get('category', '').lower() != self.saved_filters['speed'].lower()):
-            print(f"DEBUG: Speed filter failed: '{proxy.get('category', '').lower()}' != '{self.saved_filters['speed'].lower()}'")
-            return False
-        
-        print(f"DEBUG: Proxy {proxy['ip']} PASSED all filters")
-        return True
-        
-    def add_proxy_to_table(self, proxy_data):
-        """Add a single proxy to the results table"""
+    def format_proxy_row(self, proxy_data):
+        """Table values for a single proxy"""
         category_icons = {
             'fast': '🚄',
             'medium': '🚗', 
@@ -521,30 +689,37 @@ class ProxyListCreator:
         
         icon = category_icons.get(proxy_data['category'], '❓')
         
-        self.result_tree.insert('', tk.END, values=(
+        return (
             f"{proxy_data['ip']}:{proxy_data['port']}",
             proxy_data['type'],
             f"{proxy_data['response_time']}ms",
             f"{icon} {proxy_data['category'].title()}",
             f"🌍 {proxy_data['country']}",
             f"🔒 {proxy_data['anonymity'].title()}"
-        ))
+        )
         
     # Core functionality methods (keep existing logic)
+    def build_engine_config(self):
+        """Read the settings widgets into an EngineConfig"""
+        return EngineConfig(
+            proxy_type=self.proxy_type.get(),
+            timeout=float(self.timeout.get()),
+            connect_timeout=float(self.connect_timeout.get()),
+            prefilter=self.prefilter.get(),
+            max_threads=int(self.max_threads.get()),
+            processes=int(self.processes.get()) or os.cpu_count() or 1,
+            batch_size=int(self.batch_size.get()),
+            rate_limit=int(self.rate_limit.get()),
+            cache_file=self.cache_file,
+        ).validate()
+        
     def start_scraping(self):
         """Start scraping with validation"""
         if self.is_running:
             return
             
         try:
-            timeout_val = int(self.timeout.get())
-            threads_val = int(self.max_threads.get())
-            batch_val = int(self.batch_size.get())
-            rate_val = int(self.rate_limit.get())
-            
-            if timeout_val <= 0 or threads_val <= 0 or batch_val <= 0 or rate_val <= 0:
-                raise ValueError("All values must be positive")
-                
+            config = self.build_engine_config()
         except ValueError:
             messagebox.showerror("Configuration Error", 
                                "⚠️ Please check your settings!\nAll values must be positive numbers.")
@@ -559,16 +734,33 @@ class ProxyListCreator:
         self.pause_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.NORMAL)
         
-        # Clear previous results
-        self.checked_proxies.clear()
-        self.filtered_proxies.clear()
+        # Clear previous results and table
+        self.clear_results()
         self.proxy_list.clear()
         self.scraped_count = 0
         self.checked_count = 0
         
-        # Clear table
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
+        # Drop the previous run's queued updates, but keep those of an export still running
+        stale = self.updates.drain()
+        if "exporting" in stale.progress:
+            self.updates.post_progress("exporting", *stale.progress["exporting"])
+        export_counters = {name: value for name, value in stale.counters.items() if name.startswith("export")}
+        if export_counters:
+            self.updates.post_counters(**export_counters)
+        self.progress_scraping.config(value=0)
+        self.progress_checking.config(value=0)
+            
+        from proxyscraper.engine import EngineCallbacks, ProxyEngine
+        
+        callbacks = EngineCallbacks(
+            on_harvest_progress=self.on_harvest_progress,
+            on_check_started=self.on_check_started,
+            on_check_progress=self.on_check_progress,
+            on_proxy=self.on_proxy_checked,
+            on_concurrency=self.on_concurrency,
+            on_finished=self.on_engine_finished,
+        )
+        self.engine = ProxyEngine(config, callbacks, self.store)
             
         # Start async operations
         threading.Thread(target=self.async_wrapper, daemon=True).start()
@@ -576,6 +768,11 @@ class ProxyListCreator:
     def pause_resume(self):
         """Pause or resume"""
         self.is_paused = not self.is_paused
+        if self.engine:
+            if self.is_paused:
+                self.engine.pause()
+            else:
+                self.engine.resume()
         if self.is_paused:
             self.pause_button.config(text="▶️ RESUME")
         else:
@@ -585,214 +782,93 @@ class ProxyListCreator:
         """Stop scraping"""
         self.is_running = False
         self.is_paused = False
+        if self.engine:
+            self.engine.stop()
         self.start_button.config(state=tk.NORMAL)
         self.pause_button.config(state=tk.DISABLED, text="⏸️ PAUSE")
         self.stop_button.config(state=tk.DISABLED)
         
     def async_wrapper(self):
         """Async wrapper"""
+        from proxyscraper.sharding import use_uvloop
+        use_uvloop()
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
-            loop.run_until_complete(self.enhanced_async_scrape())
+            loop.run_until_complete(self.engine.run())
         except Exception as e:
-            print(f"Async error: {e}")
+            logger.exception("Engine run failed: %s", e)
         finally:
             loop.close()
             
-    async def enhanced_async_scrape(self):
-        """Enhanced async scraping"""
-        proxy_sources = [
-            "https://raw.githubusercontent.com/oxylabs/free-proxy-list/master/list.txt",
-            "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt",
-            "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/https.txt",
-            "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks4.txt",
-            "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/socks5.txt",
-            "https://raw.githubusercontent.com/clarketm/proxy-list/master/proxy-list-raw.txt",
-            "https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/http.txt",
-            "https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks4.txt",
-            "https://raw.githubusercontent.com/monosans/proxy-list/main/proxies/socks5.txt",
-            "https://raw.githubusercontent.com/proxifly/free-proxy-list/main/proxies/all/data.txt",
-            "https://raw.githubusercontent.com/ShiftyTR/Proxy-List/master/proxy.txt",
-            "https://raw.githubusercontent.com/vakhov/fresh-proxy-list/master/http.txt",
-            "https://raw.githubusercontent.com/vakhov/fresh-proxy-list/master/https.txt",
-            "https://raw.githubusercontent.com/vakhov/fresh-proxy-list/master/socks5.txt",
-            "https://api.proxyscrape.com/v2/?request=getproxies&protocol=http&timeout=10000&country=all",
-            "https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks4&timeout=10000&country=all",
-            "https://api.proxyscrape.com/v2/?request=getproxies&protocol=socks5&timeout=10000&country=all",
-            "https://www.proxy-list.download/api/v1/get?type=http",
-            "https://www.proxy-list.download/api/v1/get?type=https",
-            "https://www.proxy-list.download/api/v1/get?type=socks4",
-            "https://www.proxy-list.download/api/v1/get?type=socks5",
-        ]
-        
-        total_sources = len(proxy_sources)
-        scraped_proxies = set()
-        
-        batch_size = int(self.batch_size.get())
-        rate_limit = int(self.rate_limit.get())
-        selected_type = self.proxy_type.get().lower()
-        
-        self.root.after(0, lambda: self.progress_scraping.config(maximum=total_sources, value=0))
-        
-        semaphore = asyncio.Semaphore(rate_limit)
-        
-        connector = aiohttp.TCPConnector(limit=int(self.max_threads.get()), ttl_dns_cache=300)
-        async with aiohttp.ClientSession(connector=connector) as session:
+    # Engine callbacks - these run on the engine thread and only post to self.updates
+    def on_harvest_progress(self, completed_sources, total_sources, harvested):
+        self.scraped_count = harvested
+        self.updates.post_progress("scraping", completed_sources, total_sources)
+        
+    def on_check_started(self, total_proxies):
+        self.check_start_time = time.time()
+        self.updates.post_progress("checking", 0, total_proxies)
+        
+    def on_check_progress(self, completed, total_proxies):
+        # The total keeps growing while sources are still being harvested
+        self.checked_count = completed
+        self.updates.post_progress("checking", completed, total_proxies)
+        
+    def on_proxy_checked(self, result):
+        with self.filter_lock:
+            self.results.add(result)
             
-            for i in range(0, len(proxy_sources), batch_size):
-                if not self.is_running:
-                    break
-                    
-                while self.is_paused:
-                    await asyncio.sleep(0.1)
-                    
-                batch = proxy_sources[i:i+batch_size]
-                tasks = [self.fetch_with_semaphore(semaphore, session, url) for url in batch]
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for result in results:
-                    if isinstance(result, list):
-                        for proxy in result:
-                            proxy_type = self.determine_proxy_type_from_source(proxy, selected_type)
-                            if selected_type == "all" or proxy_type == selected_type:
-                                scraped_proxies.add(proxy)
-                        
-                completed_sources = min(i + batch_size, total_sources)
-                self.scraped_count = len(scraped_proxies)
-                
-                self.root.after(0, lambda: self.update_progress_with_eta(
-                    "scraping", completed_sources, total_sources, self.start_time))
-                self.root.after(0, self.update_stats)
-                
-                await asyncio.sleep(1.0 / rate_limit)
-        
-        self.proxy_list = list(scraped_proxies)
-        
-        if self.is_running and self.proxy_list:
-            await self.enhanced_async_check()
-        else:
-            self.stop_scraping()
-            
-    async def fetch_with_semaphore(self, semaphore, session, url):
-        """Fetch URL with rate limiting"""
-        async with semaphore:
-            try:
-                async with session.get(url, timeout=10) as response:
-                    if response.status == 200:
-                        text = await response.text()
-                        proxies = re.findall(r'\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:\d{1,5}\b', text)
-                        return proxies
-            except Exception:
-                pass
-            return []
+            # FIX: Only add to table if it matches current filters OR if no filters are set
+            if self.saved_filters.matches(result):
+                self.filtered_proxies.append(result)
+                self.updates.post_row(result)
             
-    def determine_proxy_type_from_source(self, proxy, selected_type):
-        """Determine proxy type"""
-        if selected_type != "all":
-            return selected_type
-        return "http"
-            
-    async def enhanced_async_check(self):
-        """Enhanced async checking"""
-        total_proxies = len(self.proxy_list)
-        if total_proxies == 0:
-            self.stop_scraping()
-            return
-            
-        check_start_time = time.time()
-        timeout_val = int(self.timeout.get())
-        threads_val = int(self.max_threads.get())
-        
-        self.root.after(0, lambda: self.progress_checking.config(maximum=total_proxies, value=0))
+    def on_concurrency(self, limit, ceiling):
+        self.updates.post_counters(concurrency=limit, concurrency_ceiling=ceiling)
         
-        semaphore = asyncio.Semaphore(threads_val)
+    def on_engine_finished(self, valid_proxies):
+        self.updates.post_event("finished")
         
-        connector = aiohttp.TCPConnector(limit=threads_val)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            
-            tasks = [self.check_proxy_enhanced(semaphore, session, proxy, timeout_val) 
-                    for proxy in self.proxy_list]
-            
-            completed = 0
-            for coro in asyncio.as_completed(tasks):
-                if not self.is_running:
-                    break
-                    
-                while self.is_paused:
-                    await asyncio.sleep(0.1)
+    def process_updates(self):
+        """Apply everything the engine posted since the last tick (Tk thread)"""
+        try:
+            batch = self.updates.drain()
+            if batch:
+                start_times = {"scraping": self.start_time, "checking": self.check_start_time}
+                for phase, (completed, total) in batch.progress.items():
+                    if phase == "exporting":
+                        self.export_button.config(text=f"📁 {min(100, completed * 100 // max(total, 1))}%")
+                        continue
+                    self.update_progress_with_eta(phase, completed, total, start_times[phase])
                     
-                result = await coro
-                if result:
-                    self.checked_proxies.append(result)
+                if "export_file" in batch.counters:
+                    self.finish_export(batch.counters)
                     
-                    # FIX: Only add to table if it matches current filters OR if no filters are set
-                    if (self.saved_filters['speed'] == 'all' and 
-                        self.saved_filters['country'] == '' and 
-                        self.saved_filters['anonymity'] == 'all') or self.proxy_matches_filters(result):
-                        self.filtered_proxies.append(result)
-                        self.root.after(0, lambda r=result: self.add_proxy_to_table(r))
+                if "stored" in batch.counters:
+                    stored, stored_seconds = batch.counters['stored'], batch.counters['stored_seconds']
+                    if "stored_error" in batch.counters:
+                        self.startup_label.config(text="⚠️ Could not load stored proxies")
+                    else:
+                        self.startup_label.config(
+                            text=f"🚀 Ready in {self.interactive_seconds:.2f}s, {stored} stored in {stored_seconds:.2f}s")
+                    logger.info("Startup: %d stored proxies loaded after %.3fs", stored, stored_seconds)
+                    self.update_statistics()
                     
-                    self.store_proxy_in_db(result)
+                if "concurrency" in batch.counters:
+                    self.concurrency_label.config(
+                        text=f"🔀 Concurrency: {batch.counters['concurrency']}/{batch.counters['concurrency_ceiling']}")
                     
-                completed += 1
-                self.checked_count = completed
-                
-                self.root.after(0, lambda: self.update_progress_with_eta(
-                    "checking", completed, total_proxies, check_start_time))
-                self.root.after(0, self.update_stats)
+                if batch.rows:
+                    self.result_view.append_rows(batch.rows)
+                self.update_stats()
                 
-        if self.is_running:
-            self.update_statistics()
-            self.stop_scraping()
-            
-    async def check_proxy_enhanced(self, semaphore, session, proxy_str, timeout):
-        """Enhanced proxy checking"""
-        async with semaphore:
-            try:
-                ip, port = proxy_str.split(':')
-                proxy_url = f"http://{ip}:{port}"
-                
-                start_time = time.time()
-                async with session.get("http://httpbin.org/ip", 
-                                     proxy=proxy_url, 
-                                     timeout=timeout) as response:
-                    if response.status == 200:
-                        response_time = int((time.time() - start_time) * 1000)
-                        
-                        return {
-                            'ip': ip,
-                            'port': port,
-                            'response_time': response_time,
-                            'category': self.categorize_proxy_by_speed(response_time),
-                            'country': self.detect_country(ip),
-                            'anonymity': self.detect_anonymity_level({}),
-                            'type': self.proxy_type.get().upper(),
-                            'last_checked': datetime.now().isoformat()
-                        }
-            except Exception:
-                pass
-            return None
-            
-    def categorize_proxy_by_speed(self, response_time):
-        """Categorize by speed"""
-        if response_time < 500:
-            return "fast"
-        elif response_time < 2000:
-            return "medium"
-        else:
-            return "slow"
+                if "finished" in batch.events and self.is_running:
+                    self.update_statistics()
+                    self.stop_scraping()
+        finally:
+            self.root.after(UI_TICK_MS, self.process_updates)
             
-    def detect_anonymity_level(self, proxy_data):
-        """Detect anonymity level"""
-        return random.choice(["elite", "anonymous", "transparent"])
-        
-    def detect_country(self, ip):
-        """Detect country"""
-        countries = ["US", "DE", "UK", "FR", "CA", "JP", "RU", "CN", "IN", "BR"]
-        return random.choice(countries)
-        
     def calculate_eta(self, completed, total, elapsed_time):
         """Calculate ETA"""
         if completed == 0 or elapsed_time == 0:
@@ -818,56 +894,39 @@ class ProxyListCreator:
             speed = completed / elapsed if elapsed > 0 else 0
             
             if phase == "scraping":
+                self.progress_scraping.config(maximum=max(total, 1))
                 self.scrape_eta_label.config(text=f"🕐 ETA: {eta}")
                 self.scrape_speed_label.config(text=f"⚡ Speed: {speed:.1f}/s")
                 self.progress_scraping.config(value=completed)
             elif phase == "checking":
+                self.progress_checking.config(maximum=max(total, 1))
                 self.check_eta_label.config(text=f"🕐 ETA: {eta}")
                 self.check_speed_label.config(text=f"⚡ Speed: {speed:.1f}/s")
                 self.progress_checking.config(value=completed)
                 
-    def store_proxy_in_db(self, proxy_data):
-        """Store in database"""
-        cursor = self.db_conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO proxies 
-            (ip, port, type, response_time, anonymity_level, country, last_checked, category)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            proxy_data['ip'], proxy_data['port'], proxy_data['type'],
-            proxy_data['response_time'], proxy_data['anonymity'],
-            proxy_data['country'], proxy_data['last_checked'], proxy_data['category']
-        ))
-        self.db_conn.commit()
-        
     def update_stats(self):
-        """Update statistics"""
-        def safe_update():
-            self.scraped_label.config(text=f"🔍 Harvested: {self.scraped_count}")
-            self.checked_label.config(text=f"🔄 Validated: {self.checked_count}")
-            self.valid_label.config(text=f"✅ Active: {len(self.checked_proxies)}")
-            self.filtered_label.config(text=f"🎯 Filtered: {len(self.filtered_proxies)}")
-            
-            if self.checked_count > 0:
-                success_rate = (len(self.checked_proxies) / self.checked_count) * 100
-                self.success_rate_label.config(text=f"📊 Success: {success_rate:.1f}%")
-                
-        self.root.after(0, safe_update)
+        """Update statistics (Tk thread)"""
+        self.scraped_label.config(text=f"🔍 Harvested: {self.scraped_count}")
+        self.checked_label.config(text=f"🔄 Validated: {self.checked_count}")
+        self.valid_label.config(text=f"✅ Active: {len(self.checked_proxies)}")
+        self.filtered_label.config(text=f"🎯 Filtered: {len(self.filtered_proxies)}")
+        
+        if self.checked_count > 0:
+            success_rate = (len(self.checked_proxies) / self.checked_count) * 100
+            self.success_rate_label.config(text=f"📊 Success: {success_rate:.1f}%")
         
     def update_statistics(self):
         """Update detailed statistics"""
-        fast_count = len([p for p in self.checked_proxies if p['category'] == 'fast'])
-        medium_count = len([p for p in self.checked_proxies if p['category'] == 'medium'])
-        slow_count = len([p for p in self.checked_proxies if p['category'] == 'slow'])
+        fast_count = self.results.count('category', 'fast')
+        medium_count = self.results.count('category', 'medium')
+        slow_count = self.results.count('category', 'slow')
         
         self.fast_count_label.config(text=f"🚄 Fast (< 500ms): {fast_count}")
         self.medium_count_label.config(text=f"🚗 Medium (500-2000ms): {medium_count}")
         self.slow_count_label.config(text=f"🐌 Slow (> 2000ms): {slow_count}")
         
         # Geographic distribution
-        geo_stats = defaultdict(int)
-        for proxy in self.checked_proxies:
-            geo_stats[proxy['country']] += 1
+        geo_stats = self.results.value_counts('country')
             
         geo_text = "🌍 GLOBAL PROXY DISTRIBUTION\n" + "="*50 + "\n\n"
         for country, count in sorted(geo_stats.items(), key=lambda x: x[1], reverse=True):
@@ -879,60 +938,103 @@ class ProxyListCreator:
         self.geo_stats_text.insert(tk.END, geo_text)
         
     def export_proxies(self):
-        """Export filtered proxies"""
+        """Export the filtered proxies (or all results) on a background thread"""
         proxies_to_export = self.filtered_proxies if self.filtered_proxies else self.checked_proxies
         
         if not proxies_to_export:
             messagebox.showwarning("Export Warning", "🚫 No proxies to export!")
             return
             
+        # Snapshot: the engine thread keeps appending while the export runs
+        self.start_export(list(proxies_to_export))
+        
+    def export_database(self):
+        """Export every valid proxy in the database matching the saved filters, streamed from disk"""
+        try:
+            stored = self.store.count_proxies()
+        except sqlite3.Error as e:
+            messagebox.showerror("Export Error", f"❌ Could not read the database: {str(e)}")
+            return
+        if not stored:
+            messagebox.showwarning("Export Warning", "🚫 No proxies in the database!")
+            return
+        self.start_export(None)
+        
+    def start_export(self, proxies):
+        """Ask for a file and write proxies to it (the database when None) on the export thread"""
+        if self.export_thread is not None and self.export_thread.is_alive():
+            messagebox.showwarning("Export Warning", "⏳ An export is already running!")
+            return
+            
         file_path = filedialog.asksaveasfilename(
             title="💾 Export Proxies",
             defaultextension=".txt",
             filetypes=[
                 ("Text files", "*.txt"),
                 ("JSON files", "*.json"), 
+                ("NDJSON files", "*.ndjson"),
                 ("CSV files", "*.csv"),
+                ("Packed binary", "*.bin"),
+                ("Compressed", "*.gz *.zst"),
                 ("All files", "*.*")
             ]
         )
         
-        if file_path:
-            try:
-                if file_path.endswith('.json'):
-                    with open(file_path, 'w') as f:
-                        json.dump(proxies_to_export, f, indent=2)
-                elif file_path.endswith('.csv'):
-                    import csv
-                    with open(file_path, 'w', newline='') as f:
-                        if proxies_to_export:
-                            writer = csv.DictWriter(f, fieldnames=proxies_to_export[0].keys())
-                            writer.writeheader()
-                            writer.writerows(proxies_to_export)
-                else:
-                    with open(file_path, 'w') as f:
-                        for proxy in proxies_to_export:
-                            f.write(f"{proxy['ip']}:{proxy['port']}\n")
-                            
-                messagebox.showinfo("Export Success", 
-                                   f"✅ {len(proxies_to_export)} proxies exported!\n📁 File: {file_path}")
-                
-            except Exception as e:
-                messagebox.showerror("Export Error", f"❌ Export failed: {str(e)}")
+        if not file_path:
+            return
+        try:
+            check_export_path(file_path)
+        except ValueError as e:
+            messagebox.showerror("Export Error", f"❌ {str(e)}")
+            return
+            
+        self.export_button.config(state=tk.DISABLED, text="📁 0%")
+        self.export_db_button.config(state=tk.DISABLED)
+        self.export_thread = threading.Thread(target=self.run_export, args=(proxies, file_path), daemon=True)
+        self.export_thread.start()
+        
+    def run_export(self, proxies, file_path):
+        """Write the export file, posting progress and the outcome to the UI (export thread)"""
+        def progress(done, total):
+            self.updates.post_progress("exporting", done, total or done)
+            
+        try:
+            if proxies is None:
+                count = export_store(self.store, file_path, self.saved_filters, progress)
+            else:
+                count = export_proxies(proxies, file_path, progress)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.updates.post_counters(export_file=file_path, export_error=str(e))
+        else:
+            self.updates.post_counters(export_file=file_path, exported=count)
+            
+    def finish_export(self, counters):
+        """Re-enable the export buttons and report how the export went (Tk thread)"""
+        self.export_button.config(state=tk.NORMAL, text="📁 EXPORT")
+        self.export_db_button.config(state=tk.NORMAL)
+        if "export_error" in counters:
+            messagebox.showerror("Export Error", f"❌ Export failed: {counters['export_error']}")
+        else:
+            messagebox.showinfo("Export Success", 
+                               f"✅ {counters['exported']} proxies exported!\n📁 File: {counters['export_file']}")
                 
+    def clear_results(self):
+        """Forget every result, including rows still queued for the table"""
+        with self.filter_lock:
+            self.results_generation += 1
+            self.results.clear()
+            self.filtered_proxies.clear()
+            self.updates.discard_rows()
+        self.result_view.clear()
+        
     def clear_log(self):
         """Clear all data"""
         result = messagebox.askyesno("Confirm Clear", "🗑️ Clear all data and reset?")
         if not result:
             return
             
-        # Clear treeview
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
-            
+        self.clear_results()
         self.proxy_list.clear()
-        self.checked_proxies.clear()
-        self.filtered_proxies.clear()
         self.scraped_count = 0
         self.checked_count = 0
         
@@ -945,6 +1047,7 @@ class ProxyListCreator:
         self.check_eta_label.config(text="🕐 ETA: --:--")
         self.scrape_speed_label.config(text="⚡ Speed: 0/s")
         self.check_speed_label.config(text="⚡ Speed: 0/s")
+        self.concurrency_label.config(text="🔀 Concurrency: --")
         
         # Clear statistics
         self.fast_count_label.config(text="🚄 Fast (< 500ms): 0")
@@ -955,13 +1058,16 @@ class ProxyListCreator:
         self.update_stats()
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     root = tk.Tk()
     app = ProxyListCreator(root)
     
     def on_closing():
         app.is_running = False
-        if hasattr(app, 'db_conn'):
-            app.db_conn.close()
+        if app.engine:
+            app.engine.stop()
+        if hasattr(app, 'store'):
+            app.store.close()
         root.destroy()
         
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -0,0 +1,95 @@
+import asyncio
+import errno
+
+from proxyscraper.concurrency import AdaptiveLimiter
+
+
+def _window(limiter, successes=20, latency=100, connect_errors=0, saturated=True):
+    """Feed one interval of outcomes, then take the AIMD step"""
+    async def fill():
+        for _ in range(limiter.limit):
+            await limiter.acquire()
+        for _ in range(limiter.limit):
+            limiter.release()
+
+    if saturated:
+        asyncio.run(fill())
+    for _ in range(successes):
+        limiter.record_success(latency)
+    for _ in range(connect_errors):
+        limiter.record_failure(ConnectionRefusedError(errno.ECONNREFUSED, "refused"))
+    limiter.adjust()
+    return limiter.limit
+
+
+def test_slow_start_doubles_only_while_saturated():
+    limiter = AdaptiveLimiter(10, 1000)
+    assert [_window(limiter) for _ in range(3)] == [20, 40, 80]
+    assert _window(limiter, saturated=False) == 80
+    assert [_window(limiter) for _ in range(4)] == [160, 320, 640, 1000]
+
+
+def test_connect_errors_above_baseline_cut_then_growth_is_additive():
+    limiter = AdaptiveLimiter(10, 1000)
+    # Dead proxies fail steadily: 25% errors is the baseline, not congestion
+    assert [_window(limiter, 15, connect_errors=5) for _ in range(3)] == [20, 40, 80]
+    assert _window(limiter, 8, connect_errors=12) == 56
+    assert limiter.decreases == 1
+    assert [_window(limiter, 15, connect_errors=5) for _ in range(2)] == [61, 66]
+
+
+def test_latency_drift_cuts():
+    limiter = AdaptiveLimiter(10, 1000)
+    _window(limiter, latency=100)
+    _window(limiter, latency=120)
+    assert limiter.limit == 40
+    assert _window(limiter, latency=400) == 28
+    assert _window(limiter, latency=110) == 33
+
+
+def test_descriptor_exhaustion_lowers_the_ceiling():
+    limiter = AdaptiveLimiter(10, 1000)
+    _window(limiter)
+    _window(limiter)
+    assert limiter.limit == 40
+
+    async def exhaust():
+        for _ in range(40):
+            await limiter.acquire()
+        limiter.record_failure(OSError(errno.EMFILE, "Too many open files"))
+        for _ in range(40):
+            limiter.release()
+
+    asyncio.run(exhaust())
+    limiter.adjust()
+    assert (limiter.limit, limiter.ceiling) == (28, 36)
+    assert [_window(limiter) for _ in range(3)] == [33, 36, 36]
+
+
+def test_floor_and_loop_lag():
+    limiter = AdaptiveLimiter(10, 1000)
+    limiter.loop_lag = 1.0
+    assert _window(limiter) == 10  # never below the floor
+    limiter.loop_lag = 0.0
+    assert _window(limiter) == 15  # slow start ended with the cut
+
+
+def test_fixed_limiter_is_a_semaphore_at_the_ceiling():
+    async def main():
+        limiter = AdaptiveLimiter(1, 3, adaptive=False)
+        running = 0
+        peak = 0
+
+        async def task():
+            nonlocal running, peak
+            async with limiter:
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(task() for _ in range(10)))
+        await limiter.run()  # returns at once when not adaptive
+        return peak, limiter.in_flight
+
+    assert asyncio.run(main()) == (3, 0)
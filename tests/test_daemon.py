@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import aiohttp
+
+from proxyscraper.bench import base_config, start_sources
+from proxyscraper.daemon import (SOURCE_BACKOFF, PoolEntry, ProxyDaemon, SourceState,
+                                 recheck_delay)
+from proxyscraper.records import ProxyRecord, pack_address
+from proxyscraper.store import ProxyStore
+
+
+def _record(last_octet, response_time=100, checked_at=None):
+    return ProxyRecord(pack_address(f"45.76.12.{last_octet}", 8080), response_time, "fast", "US",
+                       "elite", "HTTP", time.time() if checked_at is None else checked_at)
+
+
+def test_recheck_delay_stretches_for_slow_flaky_proxies_and_is_capped():
+    fast = PoolEntry(_record(1, response_time=0))
+    assert recheck_delay(fast, 300, 21600) == 300
+    slow = PoolEntry(_record(2, response_time=1000))
+    assert recheck_delay(slow, 300, 21600) == 600
+    flaky = PoolEntry(_record(3, response_time=0), success=0.5)
+    assert recheck_delay(flaky, 300, 21600) == 600
+    # A success rate near zero is floored, so the proxy is still looked at again
+    assert recheck_delay(PoolEntry(_record(4, response_time=0), success=0.0), 300, 1e9) == 3000
+    failing = PoolEntry(_record(5, response_time=0))
+    failing.failures = 2
+    assert recheck_delay(failing, 300, 21600) == 1200
+    failing.failures = 1000
+    assert recheck_delay(failing, 300, 21600) == 21600
+
+
+def test_proxy_is_evicted_after_failures_in_a_row(tmp_path):
+    store = ProxyStore(str(tmp_path / "proxies.sqlite"))
+    daemon = ProxyDaemon(base_config(str(tmp_path), evict_failures=3), store=store)
+    events = []
+    daemon.listeners.append(lambda event, entry: events.append((event, entry.failures)))
+    record = _record(1)
+
+    async def main():
+        daemon._wakeup = asyncio.Event()
+        store.store_proxy(record)
+        await daemon._on_checked(record.addr, record)
+        await daemon._on_checked(record.addr, None)
+        await daemon._on_checked(record.addr, None)
+        # A success in between starts the count again
+        await daemon._on_checked(record.addr, record)
+        for _ in range(3):
+            await daemon._on_checked(record.addr, None)
+
+    try:
+        asyncio.run(main())
+        assert store.flush(timeout=5)
+        assert [r for batch in store.known_good() for r in batch] == []
+    finally:
+        store.close()
+    assert events == [("added", 0), ("updated", 1), ("updated", 2), ("updated", 0),
+                      ("updated", 1), ("updated", 2), ("evicted", 3)]
+    assert record.addr not in daemon.pool
+    assert (daemon.added, daemon.updated, daemon.evicted) == (1, 1, 1)
+
+
+def test_failures_push_the_next_check_back(tmp_path):
+    daemon = ProxyDaemon(base_config(str(tmp_path), recheck_interval=100, evict_failures=5))
+    record = _record(1, response_time=0)
+
+    async def main():
+        daemon._wakeup = asyncio.Event()
+        await daemon._on_checked(record.addr, record)
+        delays = [daemon.pool[record.addr].due - record.checked_at]
+        for _ in range(3):
+            before = time.time()
+            await daemon._on_checked(record.addr, None)
+            delays.append(daemon.pool[record.addr].due - before)
+        return delays
+
+    delays = asyncio.run(main())
+    assert delays[0] == 100
+    assert all(later > 2 * earlier * 0.99 for earlier, later in zip(delays, delays[1:]))
+
+
+def test_entries_are_queued_as_they_fall_due(tmp_path):
+    daemon = ProxyDaemon(base_config(str(tmp_path), recheck_interval=0.2, recheck_max=0.2))
+    now = time.time()
+    soon = _record(1, checked_at=now)
+    late = _record(2, checked_at=now + 3600)
+    moved = _record(3, checked_at=now + 3600)
+
+    async def main():
+        daemon._wakeup = asyncio.Event()
+        queue = asyncio.Queue()
+        for record in (late, moved, soon):
+            daemon.pool[record.addr] = entry = PoolEntry(record)
+            daemon._schedule(entry, record.checked_at)
+        task = asyncio.create_task(daemon._schedule_checks(queue))
+        try:
+            first = await asyncio.wait_for(queue.get(), 5)
+            assert queue.empty()
+            daemon.recheck_soon(moved.addr)
+            second = await asyncio.wait_for(queue.get(), 5)
+            # Pending addresses are not queued again
+            daemon.recheck_soon(soon.addr)
+            await asyncio.sleep(0.1)
+            return first, second, queue.qsize()
+        finally:
+            task.cancel()
+
+    first, second, left = asyncio.run(main())
+    assert (first, second, left) == (soon.addr, moved.addr, 0)
+    assert daemon._pending == {soon.addr, moved.addr}
+
+
+def test_source_interval_halves_with_new_addresses_and_doubles_without(tmp_path):
+    async def main():
+        runner, urls = await start_sources(1, 500)
+        daemon = ProxyDaemon(base_config(str(tmp_path), source_interval=60))
+        state = daemon._source_state[urls[0]] = SourceState(240)
+        try:
+            queue = asyncio.Queue()
+            intervals = []
+            async with aiohttp.ClientSession() as session:
+                semaphore = asyncio.Semaphore(1)
+                for _ in range(6):
+                    await daemon._refresh_source(session, semaphore, None, urls[0], queue)
+                    intervals.append(state.interval)
+            return intervals, queue.qsize(), daemon
+        finally:
+            await runner.cleanup()
+
+    intervals, queued, daemon = asyncio.run(main())
+    assert intervals == [120, 240, 480, 960, 60 * SOURCE_BACKOFF, 60 * SOURCE_BACKOFF]
+    assert queued == daemon.engine.scraped_count == len(daemon._pending) > 0
+    assert len(daemon._sources) == 6
@@ -0,0 +1,31 @@
+import asyncio
+import tempfile
+
+from proxyscraper.bench import base_config, start_sources, synthetic_list
+from proxyscraper.engine import ProxyEngine
+from proxyscraper.extract import extract_proxies
+
+
+def test_harvest_deduplicates_across_sources():
+    async def main(workdir):
+        runner, urls = await start_sources(3, 2000)
+        try:
+            # Every list is served twice
+            config = base_config(workdir, sources=urls + urls, batch_size=6, rate_limit=1000)
+            engine = ProxyEngine(config)
+            engine.is_running = True
+            streamed = []
+
+            async def on_proxies(addresses):
+                streamed.extend(addresses)
+
+            return await engine.harvest(on_proxies), streamed, engine
+        finally:
+            await runner.cleanup()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        harvested, streamed, engine = asyncio.run(main(workdir))
+    expected = {addr for seed in (1, 2, 3) for addr in extract_proxies(synthetic_list(2000, seed))}
+    assert sorted(harvested) == sorted(streamed) == sorted(expected)
+    assert engine.scraped_count == len(expected) == engine.metrics.counters['deduped']
+    assert engine.metrics.counters['parsed'] == 2 * 3 * 2000
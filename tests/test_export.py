@@ -0,0 +1,137 @@
+import csv
+import gzip
+import io
+import json
+import os
+import time
+
+import pytest
+
+from proxyscraper import export
+from proxyscraper.export import (check_export_path, export_format, export_proxies, export_store,
+                                 load_packed, main)
+from proxyscraper.filters import ProxyFilter
+from proxyscraper.records import ProxyRecord, format_address, pack_address
+from proxyscraper.store import ProxyStore
+
+
+def _records(count):
+    now = time.time()
+    return [ProxyRecord(pack_address(f"45.76.{i // 250}.{i % 250 + 1}", 8080 + i % 3), 100 + i,
+                        "fast" if i % 2 else "slow", "US" if i % 3 else "DE", "elite", "HTTP", now)
+            for i in range(count)]
+
+
+def _read(path):
+    data = open(path, 'rb').read()
+    return gzip.decompress(data) if path.endswith('.gz') else data
+
+
+def test_format_follows_the_extension():
+    assert export_format("out.TXT") == ("txt", None)
+    assert export_format("out.jsonl.gz") == ("ndjson", "gzip")
+    assert export_format("out.bin.zst") == ("bin", "zstd")
+    assert export_format("out.list") == ("txt", None)
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz"])
+def test_every_format_holds_every_proxy(tmp_path, monkeypatch, suffix):
+    monkeypatch.setattr(export, "BATCH_SIZE", 7)
+    records = _records(50)
+    addresses = [record.address for record in records]
+    paths = {fmt: str(tmp_path / f"proxies.{fmt}{suffix}")
+             for fmt in ("txt", "json", "ndjson", "csv", "bin")}
+    for path in paths.values():
+        assert export_proxies(records, path) == 50
+
+    assert _read(paths["txt"]).decode().splitlines() == addresses
+    dicts = [record.to_dict() for record in records]
+    assert json.loads(_read(paths["json"])) == dicts
+    assert [json.loads(line) for line in _read(paths["ndjson"]).splitlines()] == dicts
+    rows = list(csv.DictReader(io.StringIO(_read(paths["csv"]).decode())))
+    assert [ProxyRecord.from_dict(row).addr for row in rows] == [record.addr for record in records]
+    assert [format_address(addr) for addr in load_packed(paths["bin"])] == addresses
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_file_mode_follows_the_umask():
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert export.FILE_MODE == 0o666 & ~umask
+
+
+def test_empty_exports_are_valid(tmp_path):
+    for name in ("empty.json", "empty.csv", "empty.bin"):
+        assert export_proxies([], str(tmp_path / name)) == 0
+    assert json.loads(open(tmp_path / "empty.json").read()) == []
+    assert os.path.getsize(tmp_path / "empty.csv") == os.path.getsize(tmp_path / "empty.bin") == 0
+
+
+def test_failed_export_leaves_the_old_file(tmp_path):
+    path = tmp_path / "proxies.txt"
+    path.write_text("old\n")
+
+    def proxies():
+        yield from _records(3)
+        raise RuntimeError("source went away")
+
+    with pytest.raises(RuntimeError):
+        export_proxies(proxies(), str(path))
+    assert path.read_text() == "old\n"
+    assert os.listdir(tmp_path) == ["proxies.txt"]
+
+
+def test_zstd_needs_zstandard(tmp_path):
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        with pytest.raises(ValueError):
+            check_export_path("proxies.bin.zst")
+        return
+    path = str(tmp_path / "proxies.bin.zst")
+    records = _records(20)
+    export_proxies(records, path)
+    assert list(load_packed(path)) == [record.addr for record in records]
+
+
+def test_load_packed_rejects_other_files(tmp_path):
+    path = tmp_path / "proxies.bin"
+    path.write_bytes(b"12345")
+    with pytest.raises(ValueError):
+        load_packed(str(path))
+
+
+def _store_with(path, records):
+    store = ProxyStore(path)
+    for record in records:
+        store.store_proxy(record)
+    assert store.flush(timeout=5)
+    return store
+
+
+def test_export_store_filters_and_reports_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "BATCH_SIZE", 10)
+    records = _records(45)
+    store = _store_with(str(tmp_path / "proxies.sqlite"), records)
+    progress = []
+    try:
+        count = export_store(store, str(tmp_path / "de.txt"), ProxyFilter.parse("DE"),
+                             lambda read, total: progress.append((read, total)))
+    finally:
+        store.close()
+    expected = {record.address for record in records if record.country == "DE"}
+    assert count == len(expected)
+    assert set((tmp_path / "de.txt").read_text().splitlines()) == expected
+    assert progress == [(10, 45), (20, 45), (30, 45), (40, 45), (45, 45)]
+
+
+def test_cli_exports_the_database(tmp_path):
+    db = str(tmp_path / "proxies.sqlite")
+    records = _records(12)
+    _store_with(db, records).close()
+    output = str(tmp_path / "fast.bin.gz")
+    assert main([output, "--db", db, "--speed", "fast"]) == 0
+    assert sorted(load_packed(output)) == sorted(record.addr for record in records
+                                                 if record.category == "fast")
+    with pytest.raises(SystemExit):
+        main([output, "--db", str(tmp_path / "missing.sqlite")])
@@ -0,0 +1,72 @@
+from proxyscraper.extract import MAX_MATCH, ProxyExtractor, extract_proxies
+from proxyscraper.records import format_address
+
+SOURCE = (
+    b'8.8.8.8:80\n'
+    b'1.1.1.1,3128\n'
+    b'"45.76.12.9","8080"\n'
+    b'[{"ip": "91.121.8.3", "port": 1080}, {"port": "9050", "host": "5.9.144.2"}]\n'
+    b'77.88.55.60\t443\n'
+)
+EXPECTED = ["8.8.8.8:80", "1.1.1.1:3128", "45.76.12.9:8080", "91.121.8.3:1080",
+            "5.9.144.2:9050", "77.88.55.60:443"]
+
+
+def _formatted(addresses):
+    return [format_address(addr) for addr in addresses]
+
+
+def _stream(chunks, allow_private=False):
+    extractor = ProxyExtractor(allow_private)
+    addresses = []
+    for chunk in chunks:
+        addresses += extractor.feed(chunk)
+    return addresses + extractor.close(), extractor
+
+
+def test_extracts_every_layout():
+    assert _formatted(extract_proxies(SOURCE)) == EXPECTED
+    assert _formatted(extract_proxies(SOURCE.decode())) == EXPECTED
+
+
+def test_matches_straddling_chunks_are_carried_over():
+    # Pad past MAX_MATCH so feed() completes matches before close() sees them
+    data = SOURCE + b' ' * MAX_MATCH + SOURCE
+    for split in range(1, len(data)):
+        addresses, _ = _stream([data[:split], data[split:]])
+        assert _formatted(addresses) == EXPECTED * 2, split
+
+
+def test_byte_at_a_time_feed():
+    addresses, _ = _stream(SOURCE[i:i + 1] for i in range(len(SOURCE)))
+    assert _formatted(addresses) == EXPECTED
+
+
+def test_split_does_not_shorten_an_address():
+    # "18.8.8.8:8080" cut after "1" must not yield "8.8.8.8:8080" or "18.8.8.8:80"
+    addresses, _ = _stream([b'x 1', b'8.8.8.8:80', b'80 y'])
+    assert _formatted(addresses) == ["18.8.8.8:8080"]
+
+
+def test_rejects_invalid_octets_and_ports():
+    data = b'\n'.join((
+        b'256.1.1.1:80',      # octet out of range
+        b'8.8.8.999:80',
+        b'08.8.8.8:80',       # leading zero
+        b'8.8.8.8:0',         # port out of range
+        b'8.8.8.8:65536',
+        b'8.8.8.8:08080',     # leading zero
+        b'8.8.4.4:65535',
+    ))
+    addresses, extractor = _stream([data])
+    assert _formatted(addresses) == ["8.8.4.4:65535"]
+    assert extractor.rejected == 6
+
+
+def test_rejects_reserved_ranges_unless_allowed():
+    data = b'10.0.0.1:80 127.0.0.1:8080 192.168.1.1:3128 172.16.5.4:1080 ' \
+           b'100.64.0.1:80 169.254.1.1:80 224.0.0.1:80 0.1.2.3:80 172.32.0.1:80'
+    addresses, extractor = _stream([data])
+    assert _formatted(addresses) == ["172.32.0.1:80"]
+    assert extractor.rejected == 8
+    assert len(extract_proxies(data, allow_private=True)) == 9
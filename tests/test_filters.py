@@ -0,0 +1,36 @@
+import random
+import time
+
+from proxyscraper.filters import ProxyFilter, ResultIndex
+from proxyscraper.records import ProxyRecord
+
+
+def _index(count=500, seed=5):
+    rng = random.Random(seed)
+    index = ResultIndex()
+    for i in range(count):
+        latency = rng.randrange(5000)
+        index.add(ProxyRecord((0x2D000000 + i) << 16 | 8080, latency,
+                              "fast" if latency < 500 else "medium" if latency < 2000 else "slow",
+                              rng.choice(("US", "DE", "FR")), rng.choice(("elite", "anonymous")),
+                              "HTTP", time.time()))
+    return index
+
+
+def test_query_matches_a_scan():
+    index = _index()
+    for arguments in (("US,DE", "all", "all", None, None),
+                      ("", "elite", "fast,slow", None, None),
+                      ("FR", "anonymous", "all", 120, 3200),
+                      ("", "all", "all", None, 999),
+                      ("", "all", "all", 4000, None)):
+        proxy_filter = ProxyFilter.parse(*arguments)
+        assert index.query(proxy_filter) == [p for p in index if proxy_filter.matches(p)], arguments
+
+
+def test_huge_latency_bounds_are_cheap():
+    index = _index()
+    started = time.perf_counter()
+    assert len(index.query(ProxyFilter.parse(max_latency=10 ** 15))) == len(index)
+    assert index.query(ProxyFilter.parse(min_latency=10 ** 15)) == []
+    assert time.perf_counter() - started < 1
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+
+from proxyscraper.bench import start_farm
+from proxyscraper.gateway import ProxyGateway
+from proxyscraper.pool import WeightedPool
+from proxyscraper.records import ProxyRecord
+
+FARM_TYPES = {"http": "HTTP", "socks4": "SOCKS4", "socks5": "SOCKS5"}
+
+
+async def _request(reader, writer, head):
+    writer.write(head)
+    await writer.drain()
+    status_line, _, rest = (await reader.readuntil(b'\r\n\r\n')).partition(b'\r\n')
+    headers = dict(line.split(b': ', 1) for line in rest.strip().split(b'\r\n') if line)
+    body = await reader.readexactly(int(headers[b'Content-Length']))
+    return int(status_line.split()[1]), json.loads(body) if body.startswith(b'{') else body
+
+
+def _run_with_gateway(check, types=frozenset(), **options):
+    """Run check(gateway, port, farm) against a keep-alive farm where half the proxies fail"""
+    async def main():
+        servers, farm = await start_farm(4, latency_ms=1, fail_rate=0.5, blackhole_rate=0,
+                                         seed=3, keep_alive=True)
+        pool = WeightedPool(rebuild_interval=0)
+        for kind, entries in farm.items():
+            for addr, _, _ in entries:
+                pool.upsert(ProxyRecord(addr, 100, "fast", "US", "elite", FARM_TYPES[kind],
+                                        time.time()))
+        gateway = ProxyGateway(pool, types=types, retries=len(pool), connect_timeout=1,
+                               timeout=2, **options)
+        server = await gateway.start("127.0.0.1", 0)
+        try:
+            await check(gateway, server.sockets[0].getsockname()[1], farm)
+        finally:
+            await gateway.close()
+            for server in servers:
+                server.close()
+            await asyncio.sleep(0.05)  # let the farm see the upstream connections close
+
+    asyncio.run(main())
+
+
+def _ok_proxies(farm, kinds=None):
+    # A list: fake proxies pick their origin at random, so two may share one
+    return [proxy for kind, entries in farm.items() if kinds is None or kind in kinds
+            for _, behavior, proxy in entries if behavior == "ok"]
+
+
+def test_rotation_retries_and_keep_alive():
+    async def check(gateway, port, farm):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        origins = []
+        for _ in range(40):
+            status, body = await _request(reader, writer,
+                                          b"GET http://example.test/get HTTP/1.1\r\n"
+                                          b"Host: example.test\r\n\r\n")
+            assert status == 200
+            origins.append(body['origin'])
+        writer.close()
+
+        ok = _ok_proxies(farm)
+        # Every request was answered by a working proxy, failed picks were retried
+        assert set(origins) <= {proxy.origin for proxy in ok}
+        assert len(set(origins)) > 1
+        assert gateway.unserved == 0
+        assert gateway.upstream_failures == gateway.retried > 0
+        # Each failing proxy was reported once and is suspended
+        failed = [addr for entries in farm.values() for addr, behavior, _ in entries
+                  if behavior == "fail" and gateway.pool.items[addr].success < 1]
+        assert len(failed) == gateway.upstream_failures
+        assert not any(gateway.pool.available(addr) for addr in failed)
+        # Keep-alive: the farm saw fewer connections than requests
+        served = [proxy for proxy in ok if proxy.requests]
+        assert sum(proxy.requests for proxy in served) == 40
+        assert sum(proxy.connections for proxy in served) < 40
+        assert gateway.reused == 40 - sum(proxy.connections for proxy in served) > 0
+
+    _run_with_gateway(check)
+
+
+def test_named_session_keeps_its_upstream():
+    async def check(gateway, port, farm):
+        origins = set()
+        for _ in range(5):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            status, body = await _request(reader, writer,
+                                          b"GET http://example.test/get HTTP/1.1\r\n"
+                                          b"Host: example.test\r\nX-Proxy-Session: alice\r\n"
+                                          b"Connection: close\r\n\r\n")
+            writer.close()
+            assert status == 200
+            assert 'X-Proxy-Session' not in body['headers']
+            origins.add(body['origin'])
+        assert len(origins) == 1
+
+    _run_with_gateway(check)
+
+
+def test_connect_through_http_proxies():
+    async def check(gateway, port, farm):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"CONNECT example.test:443 HTTP/1.1\r\nHost: example.test:443\r\n\r\n")
+        assert (await reader.readuntil(b'\r\n\r\n')).startswith(b'HTTP/1.1 200')
+        status, body = await _request(reader, writer,
+                                      b"GET /get HTTP/1.1\r\nHost: example.test\r\n"
+                                      b"Connection: close\r\n\r\n")
+        writer.close()
+        assert status == 200
+        assert body['origin'] in {proxy.origin for proxy in _ok_proxies(farm, ("http",))}
+        assert gateway.tunnels == 1
+
+    _run_with_gateway(check, types=frozenset(("HTTP",)))
+
+
+def test_proxies_of_unknown_type_count_as_upstream_failures():
+    async def check(gateway, port, farm):
+        # Old databases hold "ALL" rows; only one proxy keeps a usable type
+        keep = next(addr for addr, behavior, _ in farm["socks5"] if behavior == "ok")
+        for addr, item in list(gateway.pool.items.items()):
+            if addr != keep:
+                gateway.pool.upsert(ProxyRecord(addr, 100, "fast", "US", "elite", "ALL", time.time()))
+        for head in (b"GET http://example.test/get HTTP/1.1\r\nHost: example.test\r\n\r\n",
+                     b"CONNECT example.test:443 HTTP/1.1\r\nHost: example.test:443\r\n\r\n"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(head)
+            assert (await reader.readuntil(b'\r\n\r\n')).startswith(b'HTTP/1.1 200')
+            writer.close()
+        assert gateway.unserved == 0
+        failed = [item for item in gateway.pool.items.values() if item.success < 1]
+        assert 0 < len(failed) == gateway.upstream_failures
+        assert all(item.record.type == "ALL" for item in failed)
+
+    _run_with_gateway(check)
@@ -0,0 +1,97 @@
+import os
+import random
+import stat
+
+from proxyscraper.export import FILE_MODE
+from proxyscraper.geoip import SAMPLE_CSV, UNKNOWN_COUNTRY, GeoDatabase, build_database, read_ranges
+
+RANGES_CSV = """\
+ip_start,ip_end,country,region
+# comment line
+0.0.0.0,0.255.255.255,ZZ
+1.0.0.0,1.0.0.255,AU
+1.0.1.0,1.0.3.255,CN
+1.0.4.0,1.0.7.255,AU
+8.8.4.0,8.8.8.255,US
+8.8.8.0,8.8.9.255,DE
+16843264,16843519,JP
+23.0.0.0,23.15.255.255,US,extra,columns
+23.16.0.0,23.16.0.0,CA
+100.0.0.0,101.255.255.255,-
+2001:db8::,2001:db8::ffff,NL
+200.1.2.3,200.1.2.2,BR
+255.255.255.0,255.255.255.255,GB
+"""
+
+
+def _naive_country(ranges, ip_value):
+    for start, end, country in ranges:
+        if start <= ip_value <= end:
+            return country
+    return UNKNOWN_COUNTRY
+
+
+def _probes(ranges, count=2000, seed=7):
+    probes = {0, 0xFFFFFFFF}
+    for start, end, _ in ranges:
+        for edge in (start, end):
+            probes.update(value for value in (edge - 1, edge, edge + 1) if 0 <= value <= 0xFFFFFFFF)
+    rng = random.Random(seed)
+    probes.update(rng.randrange(1 << 32) for _ in range(count))
+    return sorted(probes)
+
+
+def _check_against_scan(csv_path, db_path):
+    # The first range (by start) covering an address wins, as in build_database
+    ranges = sorted(read_ranges(csv_path))
+    build_database(csv_path, db_path)
+    database = GeoDatabase(db_path)
+    try:
+        probes = _probes(ranges)
+        expected = [_naive_country(ranges, ip_value) for ip_value in probes]
+        assert [database.country(ip_value) for ip_value in probes] == expected
+        assert database.lookup_many(probes) == expected
+    finally:
+        database.close()
+
+
+def test_lookups_match_a_naive_scan(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(RANGES_CSV)
+    _check_against_scan(str(csv_path), str(tmp_path / "geo.bin"))
+
+
+def test_sample_database_matches_a_naive_scan(tmp_path):
+    _check_against_scan(SAMPLE_CSV, str(tmp_path / "geo.bin"))
+
+
+def test_edge_cases(tmp_path):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(RANGES_CSV)
+    db_path = str(tmp_path / "geo.bin")
+    build_database(str(csv_path), db_path)
+    database = GeoDatabase(db_path)
+    try:
+        assert database.lookup_many([0, 0x01010200, 0x08080800, 0x64000000, 0xC8010203, 0xFFFFFFFF]) \
+            == ["ZZ", "JP", "US", UNKNOWN_COUNTRY, UNKNOWN_COUNTRY, "GB"]
+        assert database.lookup_many([]) == []
+    finally:
+        database.close()
+
+
+def test_open_rebuilds_and_rejects_garbage(tmp_path):
+    db_path = str(tmp_path / "geo.bin")
+    database = GeoDatabase.open(db_path, SAMPLE_CSV)
+    assert database is not None and len(database) > 1
+    database.close()
+
+    garbage = tmp_path / "garbage.bin"
+    garbage.write_bytes(b'not a database' * 10)
+    assert GeoDatabase.open(str(garbage)) is None
+
+
+def test_database_gets_the_usual_file_mode(tmp_path):
+    db_path = tmp_path / "geo.bin"
+    build_database(SAMPLE_CSV, str(db_path))
+    assert stat.S_IMODE(db_path.stat().st_mode) == FILE_MODE
+    assert os.listdir(tmp_path) == ["geo.bin"]
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from proxyscraper.engine import detect_anonymity_level, parse_judge_response
+
+REAL_IP = "198.51.100.23"
+PROXY_IP = "45.76.12.9"
+
+
+def _httpbin(origin, headers=None):
+    data = {"origin": origin}
+    if headers is not None:
+        data["headers"] = headers
+    return json.dumps(data).encode()
+
+
+def _azenv(remote_addr, headers):
+    lines = [f"REMOTE_ADDR = {remote_addr}", "REQUEST_METHOD = GET"]
+    lines += [f"HTTP_{name.upper().replace('-', '_')} = {value}" for name, value in headers.items()]
+    return ("<pre>\n" + "\n".join(lines) + "\n</pre>").encode()
+
+
+BASE_HEADERS = {"Host": "judge.example", "User-Agent": "Mozilla/5.0", "Accept": "*/*"}
+ECHOES = {
+    # real address forwarded in a header
+    "transparent": (PROXY_IP, dict(BASE_HEADERS, **{"X-Forwarded-For": REAL_IP, "Via": "1.1 squid"})),
+    # real address hidden, proxy announces itself
+    "anonymous": (PROXY_IP, dict(BASE_HEADERS, **{"Via": "1.1 squid", "Proxy-Connection": "keep-alive"})),
+    # nothing points at a proxy
+    "elite": (PROXY_IP, BASE_HEADERS),
+}
+
+
+@pytest.mark.parametrize("encode", [_httpbin, _azenv], ids=["httpbin", "azenv"])
+@pytest.mark.parametrize("level", sorted(ECHOES))
+def test_classifies_each_echo_format(encode, level):
+    origin, headers = ECHOES[level]
+    assert detect_anonymity_level(encode(origin, headers), REAL_IP) == level
+
+
+@pytest.mark.parametrize("encode", [_httpbin, _azenv], ids=["httpbin", "azenv"])
+def test_real_address_as_origin_is_transparent(encode):
+    assert detect_anonymity_level(encode(REAL_IP, BASE_HEADERS), REAL_IP) == "transparent"
+    assert detect_anonymity_level(encode(f"{REAL_IP}, {PROXY_IP}", BASE_HEADERS), REAL_IP) == "transparent"
+
+
+def test_parse_httpbin_response():
+    origins, headers = parse_judge_response(_httpbin(f"{PROXY_IP}, {REAL_IP}", {"X-Real-IP": REAL_IP}))
+    assert origins == {PROXY_IP, REAL_IP}
+    assert headers == {"x-real-ip": REAL_IP}
+    assert parse_judge_response(_httpbin(PROXY_IP).decode()) == ({PROXY_IP}, None)
+
+
+def test_parse_azenv_response():
+    origins, headers = parse_judge_response(_azenv(PROXY_IP, {"Via": "1.1 squid", "X-Forwarded-For": REAL_IP}))
+    assert origins == {PROXY_IP}
+    assert headers == {"via": "1.1 squid", "x-forwarded-for": REAL_IP}
+    assert parse_judge_response(b"REMOTE_ADDR = " + PROXY_IP.encode()) == ({PROXY_IP}, None)
+
+
+def test_judges_without_headers_or_origin():
+    # An origin-only judge cannot rule out proxy headers
+    assert detect_anonymity_level(_httpbin(PROXY_IP), REAL_IP) == "anonymous"
+    assert detect_anonymity_level(_httpbin(REAL_IP), REAL_IP) == "transparent"
+    assert detect_anonymity_level(b"<html>blocked</html>", REAL_IP) == "unknown"
+    assert detect_anonymity_level(b"[1, 2]", REAL_IP) == "unknown"
+    # Without our real address only the headers can be judged
+    assert detect_anonymity_level(_httpbin(PROXY_IP, BASE_HEADERS)) == "elite"
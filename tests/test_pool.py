@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from proxyscraper.filters import ProxyFilter
+from proxyscraper.pool import WeightedPool, create_app
+from proxyscraper.records import ProxyRecord, pack_address
+
+ADDRESS = "45.76.12.9:8080"
+
+
+def _pool_of(count, **options):
+    pool = WeightedPool(**options)
+    for i in range(count):
+        pool.upsert(ProxyRecord((0x2D000000 + i) << 16 | 8080, 100 + i % 7, "fast", "US", "elite",
+                                "HTTP", time.time()))
+    return pool
+
+
+def test_mostly_suspended_pool_still_serves_live_proxies():
+    pool = _pool_of(1000)
+    addresses = list(pool.items)
+    assert len(pool.pick()) == 1  # builds the table before the reports
+    for addr in addresses[:950]:
+        pool.report(addr, False)
+    live = set(addresses[950:])
+    for _ in range(2000):
+        picked = pool.pick()
+        assert len(picked) == 1 and picked[0].addr in live
+    assert {record.addr for record in pool.pick(count=100)} == live
+
+
+def test_table_is_rebuilt_when_suspensions_end():
+    pool = _pool_of(100, rebuild_interval=0, suspend=0.05)
+    addresses = list(pool.items)
+    for addr in addresses[:99]:
+        pool.report(addr, False)
+    assert [record.addr for record in pool.pick()] == [addresses[99]]
+    assert len(pool._tables[(ProxyFilter(), frozenset())]) == 1
+    time.sleep(0.06)
+    assert len(pool.pick(count=100)) == 100
+    assert len(pool._tables[(ProxyFilter(), frozenset())]) == 100
+
+
+def test_replace_keeps_feedback_of_known_proxies():
+    pool = _pool_of(3)
+    first, second, third = (item.record for item in pool.items.values())
+    pool.report(first.addr, False)
+    pool.report(second.addr, True, latency=400)
+    success, latency = pool.items[second.addr].success, pool.items[second.addr].latency
+    newcomer = ProxyRecord(pack_address("45.76.13.1", 3128), 100, "fast", "US", "elite", "HTTP",
+                           time.time())
+    pool.replace([first, second, newcomer])
+    assert set(pool.items) == {first.addr, second.addr, newcomer.addr}
+    assert not pool.available(first.addr)
+    assert pool.items[first.addr].success < 1
+    assert (pool.items[second.addr].success, pool.items[second.addr].latency) == (success, latency)
+    assert pool.available(newcomer.addr)
+    assert {record.addr for record in pool.pick(count=10)} == {second.addr, newcomer.addr}
+
+
+def _with_client(check):
+    async def main():
+        pool = WeightedPool(rebuild_interval=0)
+        pool.upsert(ProxyRecord(pack_address("45.76.12.9", 8080), 100, "fast", "US", "elite",
+                                "HTTP", time.time()))
+        async with TestClient(TestServer(create_app(pool))) as client:
+            await check(client, pool)
+    asyncio.run(main())
+
+
+def test_report_accepts_query_json_and_form():
+    async def check(client, pool):
+        response = await client.post("/report", params={"proxy": ADDRESS, "ok": "0"})
+        assert response.status == 204
+        assert not pool.available(pack_address("45.76.12.9", 8080))
+        response = await client.post("/report", json={"proxy": ADDRESS, "ok": True})
+        assert response.status == 204
+        assert pool.available(pack_address("45.76.12.9", 8080))
+        response = await client.post("/report", data={"proxy": ADDRESS, "ok": "1"})
+        assert response.status == 204
+        assert pool.reports == 3
+    _with_client(check)
+
+
+def test_report_rejects_bad_requests():
+    async def check(client, pool):
+        for body in ([1], "x", 5, None):
+            response = await client.post("/report", json=body)
+            assert response.status == 400, body
+        response = await client.post("/report", json={"proxy": "not-an-address"})
+        assert response.status == 400
+        response = await client.post("/report", json={"ok": "1"})
+        assert response.status == 400
+        # Reports change state, so they are POST only
+        response = await client.get("/report", params={"proxy": ADDRESS})
+        assert response.status == 405
+        assert pool.reports == 0
+    _with_client(check)
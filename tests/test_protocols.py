@@ -0,0 +1,117 @@
+import asyncio
+import struct
+
+import pytest
+
+from proxyscraper.bench import start_farm
+from proxyscraper.protocols import ProxyProtocolError, classify_response, detect_protocol, open_tunnel
+from proxyscraper.records import unpack_address
+
+
+def _run_scripted(script, protocol, host, port):
+    """Open a tunnel to host:port through a proxy that plays script
+
+    script is a list of (bytes expected from the client, reply). Returns
+    what the proxy received; raises what open_tunnel raised.
+    """
+    received = []
+
+    async def handle(reader, writer):
+        try:
+            for expected, reply in script:
+                received.append(await reader.readexactly(len(expected)))
+                writer.write(reply)
+            await writer.drain()
+            await reader.read()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        try:
+            proxy_port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.wait_for(
+                open_tunnel(protocol, "127.0.0.1", proxy_port, host, port, 2), 5)
+            writer.close()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(main())
+    finally:
+        assert received == [expected for expected, _ in script][:len(received)]
+    return received
+
+
+def test_socks5_ipv4_and_domain_targets():
+    _run_scripted([(b'\x05\x01\x00', b'\x05\x00'),
+                   (b'\x05\x01\x00\x01' + bytes((45, 76, 12, 9)) + struct.pack('>H', 443),
+                    b'\x05\x00\x00\x01' + bytes(6))],
+                  "socks5", "45.76.12.9", 443)
+    # A bound address given as a domain name is skipped too
+    _run_scripted([(b'\x05\x01\x00', b'\x05\x00'),
+                   (b'\x05\x01\x00\x03\x0cexample.test' + struct.pack('>H', 80),
+                    b'\x05\x00\x00\x03\x04host' + bytes(2))],
+                  "socks5", "example.test", 80)
+
+
+@pytest.mark.parametrize("script", [
+    [(b'\x05\x01\x00', b'\x05\xff')],                                       # no usable auth method
+    [(b'\x05\x01\x00', b'\x05\x00'), (b'\x05\x01\x00\x01' + bytes(6), b'\x05\x05\x00\x01' + bytes(6))],
+], ids=["greeting", "connect"])
+def test_socks5_refusals(script):
+    with pytest.raises(ProxyProtocolError):
+        _run_scripted(script, "socks5", "0.0.0.0", 0)
+
+
+def test_socks4_and_socks4a():
+    _run_scripted([(b'\x04\x01' + struct.pack('>H', 80) + bytes((45, 76, 12, 9)) + b'\x00',
+                    b'\x00\x5a' + bytes(6))],
+                  "socks4", "45.76.12.9", 80)
+    _run_scripted([(b'\x04\x01' + struct.pack('>H', 80) + b'\x00\x00\x00\x01\x00example.test\x00',
+                    b'\x00\x5a' + bytes(6))],
+                  "socks4", "example.test", 80)
+    with pytest.raises(ProxyProtocolError):
+        _run_scripted([(b'\x04\x01' + struct.pack('>H', 80) + bytes((45, 76, 12, 9)) + b'\x00',
+                        b'\x00\x5b' + bytes(6))],
+                      "socks4", "45.76.12.9", 80)
+
+
+def test_http_connect():
+    request = b'CONNECT example.test:443 HTTP/1.1\r\nHost: example.test:443\r\n\r\n'
+    _run_scripted([(request, b'HTTP/1.1 200 Connection established\r\n\r\n')],
+                  "https", "example.test", 443)
+    with pytest.raises(ProxyProtocolError):
+        _run_scripted([(request, b'HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\n\r\n')],
+                      "https", "example.test", 443)
+
+
+@pytest.mark.parametrize("head, protocol", [
+    (b'\x05\x00', "socks5"),
+    (b'\x05\xff', None),
+    (b'\x00\x5a\x00\x00', "socks4"),
+    (b'\x00\x5b\x00\x00', "socks4"),
+    (b'HTTP/1.1 400 Bad Request', "http"),
+    (b'SSH-2.0-OpenSSH', None),
+    (b'', None),
+])
+def test_classify_response(head, protocol):
+    assert classify_response(head) == protocol
+
+
+def test_detect_protocol_against_the_farm():
+    async def main():
+        servers, farm = await start_farm(1, latency_ms=1, fail_rate=0, blackhole_rate=0)
+        try:
+            detected = {}
+            for kind, [(addr, _, _)] in farm.items():
+                ip, port = unpack_address(addr)
+                detected[kind] = await detect_protocol(ip, port, 1, 1)
+            return detected
+        finally:
+            for server in servers:
+                server.close()
+
+    assert asyncio.run(main()) == {"http": "http", "socks4": "socks4", "socks5": "socks5"}
@@ -0,0 +1,37 @@
+import random
+
+from proxyscraper.records import AddressSet, format_address, pack_address, parse_address, unpack_address
+
+
+def test_pack_round_trip():
+    addr = pack_address("45.76.12.9", 8080)
+    assert unpack_address(addr) == ("45.76.12.9", 8080)
+    assert parse_address(format_address(addr)) == addr
+
+
+def test_address_set_matches_a_set():
+    rng = random.Random(4)
+    # Few distinct IPs and ports, so buckets get long and collide
+    addresses = [pack_address(f"45.76.{rng.randrange(4)}.{rng.randrange(256)}", rng.choice((80, 8080, 3128)))
+                 for _ in range(20000)]
+    addresses += [0, (1 << 48) - 1, 0]
+    seen = AddressSet()
+    expected = set()
+    new = []
+    for start in range(0, len(addresses), 1000):
+        chunk = addresses[start:start + 1000]
+        expected_new = []
+        for addr in chunk:
+            if addr not in expected:
+                expected.add(addr)
+                expected_new.append(addr)
+        assert seen.add_new(chunk) == expected_new
+        new += expected_new
+    assert len(seen) == len(expected) == len(new)
+    assert all(addr in seen for addr in addresses)
+    assert pack_address("45.76.200.1", 80) not in seen
+    assert not seen.add(addresses[0]) and seen.add(pack_address("45.76.200.1", 80))
+
+    array = seen.pop_array()
+    assert sorted(array) == sorted(expected | {pack_address("45.76.200.1", 80)})
+    assert len(seen) == 0 and addresses[0] not in seen
@@ -0,0 +1,65 @@
+import asyncio
+import tempfile
+
+from proxyscraper.bench import base_config, start_farm
+from proxyscraper.engine import ProxyEngine
+from proxyscraper.judge import start_judge
+from proxyscraper.config import EngineConfig
+from proxyscraper.records import ProxyRecord, address_array, pack_address
+from proxyscraper.sharding import (RESULT, STATUS_DONE, STATUS_FAILED, STATUS_VALID, decode_result,
+                                   encode_result, encode_summary, shard_config)
+
+
+def test_result_round_trip():
+    addr = pack_address("45.76.12.9", 1080)
+    for proxy_type, category, anonymity in (("SOCKS5", "fast", "elite"), ("HTTP", "slow", "transparent"),
+                                            ("SOCKS4", "medium", "anonymous")):
+        record = ProxyRecord(addr, 1234, category, "DE", anonymity, proxy_type, 1700000000.25, 87)
+        data = encode_result(addr, record)
+        assert len(data) == RESULT.size
+        status, decoded_addr, decoded, summary = decode_result(data)
+        assert (status, decoded_addr, summary) == (STATUS_VALID, addr, None)
+        assert decoded.to_dict() == record.to_dict()
+        assert (decoded.checked_at, decoded.judge_time) == (record.checked_at, record.judge_time)
+    assert decode_result(encode_result(addr, None)) == (STATUS_FAILED, addr, None, None)
+
+
+def test_shard_config_splits_concurrency():
+    config = EngineConfig(max_threads=500, min_threads=20, processes=3, db_path="x.sqlite",
+                          sources=["http://example.test/list.txt"])
+    child = shard_config(config, 3)
+    assert (child.processes, child.max_threads, child.min_threads) == (1, 167, 7)
+    assert (child.db_path, child.cache_file, child.sources) == ("", "", [])
+
+
+def test_summary_round_trip():
+    counters = {'checked': 9, 'timed_out': 3, 'refused': 2, 'failed': 70000}
+    assert decode_result(encode_summary(5, counters)) == (
+        STATUS_DONE, 0, None, {'unreachable': 5, 'timed_out': 3, 'refused': 2, 'failed': 70000})
+
+
+def test_sharded_check_reports_failure_stages():
+    async def main(workdir):
+        servers, farm = await start_farm(20, latency_ms=1, fail_rate=0.25, blackhole_rate=0,
+                                         seed=11)
+        judge, judge_url = await start_judge()
+        try:
+            entries = farm["http"]
+            config = base_config(workdir, proxy_type="http", judge_urls=[judge_url],
+                                 egress_ip="203.0.113.1", timeout=2, connect_timeout=1,
+                                 max_threads=20, processes=2)
+            engine = ProxyEngine(config)
+            engine.is_running = True
+            valid = await engine.check(address_array(addr for addr, _, _ in entries))
+        finally:
+            await judge.cleanup()
+            for server in servers:
+                server.close()
+        counters = engine.metrics.counters
+        failing = sum(1 for _, behavior, _ in entries if behavior != "ok")
+        assert failing and len(valid) == len(entries) - failing
+        assert counters['checked'] == len(entries)
+        assert counters['timed_out'] + counters['refused'] + counters['failed'] == failing
+
+    with tempfile.TemporaryDirectory() as workdir:
+        asyncio.run(main(workdir))
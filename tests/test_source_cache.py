@@ -0,0 +1,109 @@
+import asyncio
+import os
+import stat
+import tempfile
+
+from aiohttp import web
+
+from proxyscraper.bench import base_config, synthetic_list
+from proxyscraper.engine import ProxyEngine
+from proxyscraper.export import FILE_MODE
+from proxyscraper.extract import extract_proxies
+from proxyscraper.metrics import Metrics, write_snapshot
+from proxyscraper.source_cache import SourceCache
+
+BODIES = {'etag': synthetic_list(500, 1), 'modified': synthetic_list(500, 2),
+          'plain': synthetic_list(500, 3)}
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+async def _start_sources(requests):
+    """Sources validated by ETag, by Last-Modified and not at all; requests logs (name, status)"""
+    async def source(request):
+        name = request.match_info['name']
+        headers = {}
+        if name == 'etag':
+            headers['ETag'] = '"v1"'
+            not_modified = request.headers.get('If-None-Match') == '"v1"'
+        elif name == 'modified':
+            headers['Last-Modified'] = LAST_MODIFIED
+            not_modified = request.headers.get('If-Modified-Since') == LAST_MODIFIED
+        else:
+            not_modified = False
+        requests.append((name, 304 if not_modified else 200))
+        if not_modified:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=BODIES[name], headers=headers, content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/{name}.txt', source)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, [f"http://127.0.0.1:{port}/{name}.txt" for name in BODIES]
+
+
+def test_not_modified_sources_replay_their_cached_addresses():
+    async def main(workdir):
+        requests = []
+        runner, urls = await _start_sources(requests)
+        cache_file = os.path.join(workdir, "cache.json")
+        try:
+            harvests = []
+            for _ in range(2):
+                config = base_config(workdir, sources=urls, cache_file=cache_file, rate_limit=1000)
+                engine = ProxyEngine(config)
+                engine.is_running = True
+                harvests.append(sorted(await engine.harvest()))
+            return requests, harvests, cache_file, urls
+        finally:
+            await runner.cleanup()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        requests, (first, second), cache_file, urls = asyncio.run(main(workdir))
+        cache = SourceCache(cache_file).load()
+        assert cache.get(urls[2]) is None  # no validators, not cached
+        assert cache.get(urls[0]).etag == '"v1"'
+        assert cache.get(urls[1]).last_modified == LAST_MODIFIED
+
+    expected = sorted({addr for body in BODIES.values() for addr in extract_proxies(body)})
+    assert first == second == expected
+    assert sorted(requests) == [('etag', 200), ('etag', 304), ('modified', 200), ('modified', 304),
+                                ('plain', 200), ('plain', 200)]
+
+
+def test_expired_and_unreadable_caches_start_empty(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = SourceCache(path, ttl=60)
+    cache.put("http://a/", '"x"', None, [1, 2, 3])
+    cache.save()
+    assert list(SourceCache(path, ttl=60).load().get("http://a/").addresses) == [1, 2, 3]
+    assert SourceCache(path, ttl=-1).load().get("http://a/") is None
+    with open(path, 'w') as f:
+        f.write("{not json")
+    assert SourceCache(path).load().get("http://a/") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = SourceCache(path, max_addresses=4)
+    cache.put("http://old/", '"a"', None, [1, 2])
+    cache.put("http://new/", '"b"', None, [3, 4])
+    cache.put("http://newest/", '"c"', None, [5])
+    cache.revalidated("http://old/")  # used again, so the oldest use is now "new"
+    cache.save()
+    loaded = SourceCache(path).load()
+    assert loaded.get("http://new/") is None
+    assert loaded.get("http://old/") is not None and loaded.get("http://newest/") is not None
+
+
+def test_saved_files_get_the_usual_file_mode(tmp_path):
+    cache = SourceCache(str(tmp_path / "cache.json"))
+    cache.put("http://a/", '"x"', None, [1, 2, 3])
+    cache.save()
+    write_snapshot(Metrics(), str(tmp_path / "metrics.json"))
+    for name in ("cache.json", "metrics.json"):
+        assert stat.S_IMODE(os.stat(tmp_path / name).st_mode) == FILE_MODE
+    assert sorted(os.listdir(tmp_path)) == ["cache.json", "metrics.json"]
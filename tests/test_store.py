@@ -0,0 +1,224 @@
+import sqlite3
+import time
+
+from proxyscraper.engine import ProxyEngine
+from proxyscraper.records import ProxyRecord, pack_address
+from proxyscraper.store import HISTORY_RETENTION, SCHEMA_VERSION, ProxyStore
+
+
+def test_backoff_stays_capped_after_many_failures(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    store = ProxyStore(path, backoff_base=600, backoff_max=86400)
+    addr = pack_address("203.0.113.7", 8080)
+    try:
+        for _ in range(100):
+            store.record_failure(addr)
+            assert store.flush(timeout=5)
+            failures, last_checked, next_check = sqlite3.connect(path).execute(
+                "SELECT failures, last_checked, next_check FROM check_history WHERE addr = ?",
+                (addr,)).fetchone()
+            assert 600 <= next_check - last_checked <= 86400
+        assert failures == 100
+        assert next_check - last_checked == 86400
+        assert addr in store.backed_off_addresses(now=last_checked + 86399)
+    finally:
+        store.close()
+
+
+def test_stored_metric_counts_committed_proxies(tmp_path):
+    # A long flush interval keeps the rows queued until flush() commits them
+    store = ProxyStore(str(tmp_path / "proxies.sqlite"), flush_interval=60)
+    engine = ProxyEngine(store=store)
+    try:
+        for port in range(8080, 8085):
+            store.store_proxy(ProxyRecord(pack_address("45.76.12.9", port), 100, "fast", "US",
+                                          "elite", "HTTP", time.time()))
+        store.record_failure(pack_address("45.76.12.10", 80))
+        assert engine.metrics.counters['stored'] == 0
+        assert store.flush(timeout=5)
+        assert engine.metrics.counters['stored'] == 5
+    finally:
+        store.close()
+
+
+BASELINE_SCHEMA = """
+    CREATE TABLE proxies (
+        id INTEGER PRIMARY KEY, ip TEXT, port TEXT, type TEXT, response_time INTEGER,
+        anonymity_level TEXT, country TEXT, last_checked TIMESTAMP,
+        success_rate REAL DEFAULT 1.0, category TEXT DEFAULT 'unknown'
+    )
+"""
+
+
+def _old_database(path, version, rows):
+    """A database as written by schema version (0 is the original GUI), holding rows of
+    (ip, port, type)"""
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    if version >= 1:
+        conn.execute("CREATE UNIQUE INDEX idx_proxies_ip_port ON proxies(ip, port)")
+    if version >= 2:
+        conn.execute("CREATE TABLE check_history (addr INTEGER PRIMARY KEY, failures INTEGER NOT NULL, "
+                     "last_checked REAL NOT NULL, next_check REAL NOT NULL)")
+    if version >= 3:
+        conn.execute("ALTER TABLE proxies ADD COLUMN judge_time INTEGER DEFAULT 0")
+    conn.executemany("INSERT INTO proxies (ip, port, type, response_time, anonymity_level, country, "
+                     "last_checked, category) VALUES (?, ?, ?, 100, 'elite', 'US', 0, 'fast')", rows)
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+
+
+def _known(store):
+    return [record for batch in store.known_good() for record in batch]
+
+
+def test_migration_drops_rows_of_unknown_type(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    _old_database(path, 3, [("45.76.12.1", "80", "ALL"), ("45.76.12.2", "80", "socks5"),
+                            ("45.76.12.3", "80", "HTTP"), ("45.76.12.4", "80", None)])
+    store = ProxyStore(path)
+    try:
+        assert sorted((record.ip, record.type) for record in _known(store)) == [
+            ("45.76.12.2", "SOCKS5"), ("45.76.12.3", "HTTP")]
+    finally:
+        store.close()
+
+
+def test_known_good_hides_failed_addresses_and_history_is_pruned(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    _old_database(path, 4, [("45.76.12.1", "80", "HTTP"), ("45.76.12.2", "80", "HTTP"),
+                            ("bad", "80", "HTTP")])
+    store = ProxyStore(path, backoff_base=600, backoff_max=600)
+    failed, recovered = pack_address("45.76.12.1", 80), pack_address("45.76.12.2", 80)
+    try:
+        records = {record.addr: record for record in _known(store)}
+        assert set(records) == {failed, recovered}
+        store.record_failure(failed)
+        store.record_failure(recovered)
+        assert store.flush(timeout=5)
+        assert _known(store) == []
+        store.store_proxy(records[recovered])
+        assert store.flush(timeout=5)
+        assert [record.addr for record in _known(store)] == [recovered]
+
+        with store.conn:
+            store._prune(store.conn, now=time.time() + 600 + HISTORY_RETENTION + 1)
+        assert store.conn.execute("SELECT COUNT(*) FROM check_history").fetchone()[0] == 0
+        # The address that never recovered is gone with its history
+        assert store.count_proxies() == 2
+        assert [record.addr for record in _known(store)] == [recovered]
+    finally:
+        store.close()
+
+
+def test_batch_applies_results_in_queue_order(tmp_path):
+    # A long flush interval puts everything below in one batch
+    store = ProxyStore(str(tmp_path / "proxies.sqlite"), flush_interval=60)
+    now = time.time()
+    records = [ProxyRecord(pack_address("45.76.12.9", port), 100, "fast", "US", "elite", "HTTP", now)
+               for port in range(8080, 8085)]
+    recovered, relapsed, removed, readded, failing = (record.addr for record in records)
+    try:
+        store.record_failure(recovered)
+        store.store_proxy(records[0])
+        store.store_proxy(records[1])
+        store.record_failure(relapsed)
+        store.store_proxy(records[2])
+        store.remove_proxy(removed)
+        store.remove_proxy(readded)
+        store.store_proxy(records[3])
+        store.store_proxy(records[4])
+        store.record_failure(failing)
+        store.record_failure(failing)
+        assert store.flush(timeout=5)
+        assert {record.addr for record in _known(store)} == {recovered, readded}
+        failures = dict(store.conn.execute("SELECT addr, failures FROM check_history"))
+        assert failures == {relapsed: 1, failing: 2}
+        assert store.count_proxies() == 4
+    finally:
+        store.close()
+
+
+def test_migration_from_the_original_database(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    # The original GUI appended a row per check
+    _old_database(path, 0, [("45.76.12.1", "80", "HTTP"), ("45.76.12.2", "3128", "HTTP"),
+                            ("45.76.12.1", "80", "SOCKS5")])
+    store = ProxyStore(path)
+    try:
+        assert store.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert store.count_proxies() == 2
+        records = {record.address: record for record in _known(store)}
+        # The newest row of a duplicated address is kept
+        assert records["45.76.12.1:80"].type == "SOCKS5"
+        assert records["45.76.12.2:3128"].judge_time == 0
+        # check_history exists and the unique index makes stores upserts
+        store.record_failure(pack_address("45.76.12.2", 3128))
+        store.store_proxy(records["45.76.12.1:80"])
+        assert store.flush(timeout=5)
+        assert store.count_proxies() == 2
+        assert [record.address for record in _known(store)] == ["45.76.12.1:80"]
+    finally:
+        store.close()
+
+
+def test_migration_from_version_2(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    _old_database(path, 2, [("45.76.12.1", "80", "HTTP")])
+    store = ProxyStore(path)
+    try:
+        columns = {row[1] for row in store.conn.execute("PRAGMA table_info(proxies)")}
+        assert {"judge_time", "addr"} <= columns
+        [record] = _known(store)
+        assert (record.address, record.judge_time) == ("45.76.12.1:80", 0)
+    finally:
+        store.close()
+    # Reopening an up-to-date database changes nothing
+    store = ProxyStore(path)
+    try:
+        assert [record.address for record in _known(store)] == ["45.76.12.1:80"]
+    finally:
+        store.close()
+
+
+def test_upsert_tracks_success_rate_and_latest_check(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    store = ProxyStore(path)
+    addr = pack_address("45.76.12.9", 8080)
+    try:
+        store.store_proxy(ProxyRecord(addr, 300, "fast", "US", "elite", "HTTP", 1000.0))
+        assert store.flush(timeout=5)
+        store.record_failure(addr)
+        assert store.flush(timeout=5)
+        store.store_proxy(ProxyRecord(addr, 900, "medium", "DE", "anonymous", "SOCKS5", 2000.0))
+        assert store.flush(timeout=5)
+        [record] = _known(store)
+        assert (record.response_time, record.country, record.type, record.checked_at) == (
+            900, "DE", "SOCKS5", 2000.0)
+        success_rate = store.conn.execute("SELECT success_rate FROM proxies").fetchone()[0]
+        assert abs(success_rate - (1.0 * 0.8 * 0.8 + 0.2)) < 1e-9
+    finally:
+        store.close()
+
+
+def test_backoff_doubles_until_cleared(tmp_path):
+    path = str(tmp_path / "proxies.sqlite")
+    store = ProxyStore(path, backoff_base=60, backoff_max=1000)
+    addr = pack_address("45.76.12.9", 8080)
+    try:
+        delays = []
+        for _ in range(6):
+            store.record_failure(addr)
+            assert store.flush(timeout=5)
+            last_checked, next_check = store.conn.execute(
+                "SELECT last_checked, next_check FROM check_history").fetchone()
+            delays.append(round(next_check - last_checked))
+        assert delays == [60, 120, 240, 480, 960, 1000]
+        assert store.backed_off_addresses(now=last_checked + 999) == {addr}
+        assert store.backed_off_addresses(now=last_checked + 1000) == set()
+        store.store_proxy(ProxyRecord(addr, 300, "fast", "US", "elite", "HTTP", time.time()))
+        assert store.flush(timeout=5)
+        assert store.backed_off_addresses(now=0) == set()
+    finally:
+        store.close()